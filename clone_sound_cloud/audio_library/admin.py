@@ -66,3 +66,10 @@ class PlayedUserTrackAdmin(admin.ModelAdmin):
         "id",
         "user",
     )
+
+
+@admin.register(models.UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "filename", "size", "updated_at")
+    list_display_links = ("id",)
+    list_filter = ("user",)
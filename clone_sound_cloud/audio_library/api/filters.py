@@ -0,0 +1,33 @@
+import django_filters
+from django.db.models import Exists, OuterRef
+
+from audio_library import models
+from audio_library.facets import DURATION_BUCKETS, duration_bucket_filter
+
+
+class TrackFilter(django_filters.FilterSet):
+    genre__name = django_filters.CharFilter(method="filter_genre")
+    duration_bucket = django_filters.ChoiceFilter(
+        choices=[(name, name) for name, _, _ in DURATION_BUCKETS],
+        method="filter_duration_bucket",
+    )
+
+    class Meta:
+        model = models.Track
+        fields = {
+            "title": ["exact"],
+            "user__user_profile__display_name": ["exact"],
+            "album__name": ["exact"],
+            "license": ["exact"],
+            "duration": ["gte", "lte"],
+        }
+
+    def filter_genre(self, queryset, name, value):
+        # A join on genres would repeat tracks, EXISTS keeps one row per track
+        genres = models.Track.genre.through.objects.filter(
+            track=OuterRef("pk"), genre__name=value
+        )
+        return queryset.filter(Exists(genres))
+
+    def filter_duration_bucket(self, queryset, name, value):
+        return queryset.filter(duration_bucket_filter(value))
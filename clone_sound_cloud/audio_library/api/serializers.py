@@ -1,11 +1,13 @@
+from django.conf import settings
 from rest_framework import serializers
 
 from audio_library import models
-from base.services import delete_old_file
-from oauth.api.serializers import AuthorSerializer
+from audio_library.uploads import missing_chunks
+from base.serializers import DynamicFieldsMixin, FragmentCacheListSerializer
+from oauth.api.serializers import AuthorSummarySerializer
 
 
-class BaseSerializer(serializers.ModelSerializer):
+class BaseSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     id = serializers.IntegerField(read_only=True)
 
 
@@ -28,6 +30,8 @@ class LicenseSerializer(BaseSerializer):
 
 
 class AlbumSerializer(BaseSerializer):
+    total_duration = serializers.FloatField(read_only=True)
+
     class Meta:
         model = models.Album
         fields = (
@@ -36,17 +40,14 @@ class AlbumSerializer(BaseSerializer):
             "description",
             "cover",
             "private",
+            "total_duration",
         )
 
-    def update(self, instance, validated_data):
-        delete_old_file(instance.cover.path)
-        return super().update(instance, validated_data)
-
 
 class CreateAuthorTrackSerializer(BaseSerializer):
     plays_count = serializers.IntegerField(read_only=True)
     download = serializers.IntegerField(read_only=True)
-    user = AuthorSerializer(read_only=AuthorSerializer)
+    user = AuthorSummarySerializer(read_only=True)
 
     class Meta:
         model = models.Track
@@ -61,26 +62,87 @@ class CreateAuthorTrackSerializer(BaseSerializer):
             "private",
             "cover",
             "create_at",
+            "duration",
+            "bitrate",
+            "sample_rate",
+            "channels",
             "plays_count",
             "likes_count",
+            "comments_count",
             "download",
             "user",
         )
+        read_only_fields = ("duration", "bitrate", "sample_rate", "channels")
         extra_kwargs = {
             "likes_count": {"read_only": True},
+            "comments_count": {"read_only": True},
+        }
+        expandable_fields = {
+            "license": (LicenseSerializer, {}),
+            "genre": (GenreSerializer, {"many": True}),
+            "album": (AlbumSerializer, {}),
+            "user": ("oauth.api.serializers.AuthorSerializer", {}),
         }
 
-    def update(self, instance, validated_data):
-        delete_old_file(instance.file.path)
-        delete_old_file(instance.cover.path)
-        return super().update(instance, validated_data)
+
+class UploadSessionSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    chunk_size = serializers.IntegerField(
+        min_value=1,
+        max_value=settings.UPLOAD_CHUNK_MAX_SIZE,
+        default=settings.UPLOAD_CHUNK_SIZE,
+    )
+    size = serializers.IntegerField(
+        min_value=1, max_value=settings.UPLOAD_SESSION_MAX_SIZE
+    )
+    total_chunks = serializers.IntegerField(read_only=True)
+    missing_chunks = serializers.SerializerMethodField()
+
+    class Meta:
+        model = models.UploadSession
+        fields = (
+            "id",
+            "filename",
+            "size",
+            "chunk_size",
+            "total_chunks",
+            "missing_chunks",
+            "created_at",
+            "updated_at",
+        )
+
+    def validate_filename(self, value):
+        if not value.lower().endswith((".mp3", ".wav")):
+            raise serializers.ValidationError("Only mp3 and wav files are allowed.")
+        return value
+
+    def get_missing_chunks(self, instance):
+        return missing_chunks(instance)
+
+
+class UploadChunkSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = models.UploadChunk
+        fields = ("number", "checksum")
 
 
 class AuthorTrackSerializer(CreateAuthorTrackSerializer):
     license = LicenseSerializer(many=False)
     genre = GenreSerializer(many=True)
     album = AlbumSerializer(many=False)
-    user = AuthorSerializer(many=False)
+    user = AuthorSummarySerializer(many=False)
+
+    class Meta(CreateAuthorTrackSerializer.Meta):
+        list_serializer_class = FragmentCacheListSerializer
+        # Versions of authors are bumped on changes of their profiles, links
+        # and follows, see oauth.api.signals
+        fragment_related = ("user", "album")
+        fragment_namespaces = ("audio_library.genre", "audio_library.license")
+        fragment_live_fields = (
+            "plays_count",
+            "likes_count",
+            "comments_count",
+            "download",
+        )
 
 
 class CreatePlayListSerializer(BaseSerializer):
@@ -92,17 +154,18 @@ class CreatePlayListSerializer(BaseSerializer):
             "cover",
             "tracks",
         )
-
-    def update(self, instance, validated_data):
-        delete_old_file(instance.cover.path)
-        return super().update(instance, validated_data)
+        expandable_fields = {"tracks": (AuthorTrackSerializer, {"many": True})}
 
 
 class PlayListSerializer(CreatePlayListSerializer):
     tracks = AuthorTrackSerializer(many=True, read_only=True)
+    total_duration = serializers.FloatField(read_only=True)
+
+    class Meta(CreatePlayListSerializer.Meta):
+        fields = CreatePlayListSerializer.Meta.fields + ("total_duration",)
 
 
-class CommentAuthorSerializer(serializers.ModelSerializer):
+class CommentAuthorSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Comment serialize"""
 
     class Meta:
@@ -112,12 +175,13 @@ class CommentAuthorSerializer(serializers.ModelSerializer):
             "text",
             "track",
         )
+        expandable_fields = {"track": (CreateAuthorTrackSerializer, {})}
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Comment serialize"""
 
-    user = AuthorSerializer(many=False)
+    user = AuthorSummarySerializer(many=False)
 
     class Meta:
         model = models.Comment
@@ -128,3 +192,4 @@ class CommentSerializer(serializers.ModelSerializer):
             "track",
             "create_at",
         )
+        expandable_fields = {"track": (CreateAuthorTrackSerializer, {})}
@@ -0,0 +1,160 @@
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_init,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+
+from audio_library.blobs import track_media_fields
+from audio_library.models import Album, Comment, Genre, License, Playlist, Track
+from audio_library.search import index_tracks, remove_tracks
+from audio_library.suggest import track_suggestions
+from audio_library.tasks import (
+    build_seek_index_celery_task,
+    extract_track_metadata_celery_task,
+    generate_waveform_celery_task,
+)
+from base.cache import (
+    bump_object_version_on_change,
+    bump_version,
+    bump_version_on_change,
+    get_object_namespace,
+    incr_table_rows,
+)
+from oauth.models import UserProfile
+
+track_media_fields(Track, "file", "cover")
+track_media_fields(Album, "cover")
+track_media_fields(Playlist, "cover")
+track_suggestions(Track, "track")
+track_suggestions(Album, "album")
+track_suggestions(Genre, "genre")
+# Cached responses of public lists are keyed with these versions, tracks
+# bump theirs below
+bump_version_on_change(Album)
+bump_version_on_change(Comment)
+bump_version_on_change(Genre)
+bump_version_on_change(License)
+# Cached fragments of tracks are keyed with these
+bump_object_version_on_change(Track)
+bump_object_version_on_change(Album)
+
+
+@receiver(post_init, sender=Track)
+def post_init_track_file_receiver(sender, instance, **kwargs):
+    # Raw value of a deferred field is missing, it must not be loaded here
+    instance._original_file_name = str(instance.__dict__.get("file") or "")
+
+
+@receiver(post_save, sender=Track)
+def post_save_track_file_receiver(sender, instance, created, **kwargs):
+    original_file_name = getattr(instance, "_original_file_name", "")
+    if not created and instance.file.name == original_file_name:
+        return
+    instance._original_file_name = instance.file.name
+    transaction.on_commit(lambda: process_track_file(instance.id))
+
+
+def process_track_file(track_id):
+    extract_track_metadata_celery_task.delay(track_id)
+    generate_waveform_celery_task.delay(track_id)
+    build_seek_index_celery_task.delay(track_id)
+
+
+@receiver(post_save, sender=Track)
+def post_save_track_rows_receiver(sender, instance, created, **kwargs):
+    # Cached list counts of tracks are keyed with this version
+    transaction.on_commit(lambda: bump_version(sender._meta.label_lower))
+    if created:
+        transaction.on_commit(lambda: incr_table_rows(sender))
+
+
+@receiver(post_delete, sender=Track)
+def post_delete_track_rows_receiver(sender, instance, **kwargs):
+    transaction.on_commit(lambda: bump_version(sender._meta.label_lower))
+    transaction.on_commit(lambda: incr_table_rows(sender, -1))
+
+
+@receiver(m2m_changed, sender=Track.genre.through)
+def track_genre_changed_rows_receiver(sender, instance, action, reverse, **kwargs):
+    # Genre facet counts are keyed with the track version
+    if action in ("post_add", "post_remove", "post_clear"):
+        transaction.on_commit(lambda: bump_version(Track._meta.label_lower))
+        # Track fragments embed genres, they are keyed with genre versions
+        namespace = (
+            Genre._meta.label_lower
+            if reverse
+            else get_object_namespace(Track, instance.pk)
+        )
+        transaction.on_commit(lambda: bump_version(namespace))
+
+
+def reindex_on_commit(tracks):
+    track_ids = list(tracks)
+    if track_ids:
+        transaction.on_commit(lambda: index_tracks(track_ids))
+
+
+@receiver(post_save, sender=Track)
+def post_save_track_search_receiver(sender, instance, **kwargs):
+    reindex_on_commit([instance.id])
+
+
+@receiver(post_delete, sender=Track)
+def post_delete_track_search_receiver(sender, instance, **kwargs):
+    transaction.on_commit(lambda: remove_tracks([instance.id]))
+
+
+@receiver(m2m_changed, sender=Track.genre.through)
+def track_genre_changed_search_receiver(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    if not reverse and action in ("post_add", "post_remove", "post_clear"):
+        reindex_on_commit([instance.id])
+    elif reverse and action in ("post_add", "post_remove"):
+        reindex_on_commit(pk_set)
+    elif reverse and action == "pre_clear":
+        reindex_on_commit(instance.track_genres.values_list("id", flat=True))
+
+
+@receiver(post_init, sender=Album)
+@receiver(post_init, sender=Genre)
+def post_init_name_receiver(sender, instance, **kwargs):
+    instance._original_name = instance.__dict__.get("name")
+
+
+@receiver(post_save, sender=Album)
+def post_save_album_search_receiver(sender, instance, created, **kwargs):
+    if not created and instance.name != instance._original_name:
+        reindex_on_commit(instance.track_set.values_list("id", flat=True))
+    instance._original_name = instance.name
+
+
+@receiver(pre_delete, sender=Album)
+def pre_delete_album_search_receiver(sender, instance, **kwargs):
+    # Tracks are detached from the album by a bulk update
+    reindex_on_commit(instance.track_set.values_list("id", flat=True))
+
+
+@receiver(post_save, sender=Genre)
+def post_save_genre_search_receiver(sender, instance, created, **kwargs):
+    if not created and instance.name != instance._original_name:
+        reindex_on_commit(instance.track_genres.values_list("id", flat=True))
+    instance._original_name = instance.name
+
+
+@receiver(post_init, sender=UserProfile)
+def post_init_profile_search_receiver(sender, instance, **kwargs):
+    instance._original_display_name = instance.__dict__.get("display_name")
+
+
+@receiver(post_save, sender=UserProfile)
+def post_save_profile_search_receiver(sender, instance, created, **kwargs):
+    if not created and instance.display_name != instance._original_display_name:
+        reindex_on_commit(
+            Track.objects.filter(user=instance.user_id).values_list("id", flat=True)
+        )
+    instance._original_display_name = instance.display_name
@@ -26,6 +26,7 @@ urlpatterns = [
         views.AlbumView.as_view({"put": "update", "delete": "destroy"}),
         name="album_detail",
     ),
+    path("album/<int:pk>/cover/", views.AlbumCoverView.as_view(), name="album_cover"),
     path(
         "author-album/<int:pk>/", views.PublicAlbumView.as_view(), name="author_album"
     ),
@@ -39,7 +40,34 @@ urlpatterns = [
         views.TrackView.as_view({"put": "update", "delete": "destroy"}),
         name="track_detail",
     ),
+    path(
+        "upload/",
+        views.UploadSessionView.as_view({"post": "create"}),
+        name="upload",
+    ),
+    path(
+        "upload/<uuid:pk>/",
+        views.UploadSessionView.as_view({"get": "retrieve", "delete": "destroy"}),
+        name="upload_detail",
+    ),
+    path(
+        "upload/<uuid:pk>/chunk/<int:number>/",
+        views.UploadChunkView.as_view(),
+        name="upload_chunk",
+    ),
+    path(
+        "upload/<uuid:pk>/finalize/",
+        views.UploadSessionView.as_view({"post": "finalize"}),
+        name="upload_finalize",
+    ),
     path("track/<int:pk>/like/", views.TrackLikeView.as_view(), name="track_like"),
+    path("track/<int:pk>/cover/", views.TrackCoverView.as_view(), name="track_cover"),
+    path("suggest/", views.SuggestView.as_view(), name="suggest"),
+    path(
+        "track/<int:pk>/waveform/",
+        views.TrackWaveformView.as_view(),
+        name="track_waveform",
+    ),
     path(
         "track/recently-played/",
         views.TrackRecentlyPlayedView.as_view(),
@@ -89,4 +117,9 @@ urlpatterns = [
         views.PlayListView.as_view({"put": "update", "delete": "destroy"}),
         name="playlist_detail",
     ),
+    path(
+        "playlist/<int:pk>/cover/",
+        views.PlaylistCoverView.as_view(),
+        name="playlist_cover",
+    ),
 ]
@@ -1,26 +1,62 @@
 import os.path
-from django.utils import timezone
-from django.http import FileResponse, Http404
+from io import BytesIO
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.http import Http404, HttpResponse, QueryDict
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 from django_filters.rest_framework import DjangoFilterBackend
 
 from rest_framework import generics, viewsets, parsers, views, status
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.exceptions import ValidationError
 from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
 from audio_library import models
 from audio_library.api import serializers
-from base.classes import MixedSerializer, TrackAPIListPagination
+from audio_library.api.filters import TrackFilter
+from audio_library.counters import incr_track_counter
+from audio_library.facets import TRACK_FACETS
+from audio_library.history import record_play
+from audio_library.search import TrackOrderingFilter, TrackSearchFilter
+from audio_library.seek_index import seek_offset
+from audio_library.suggest import suggest
+from audio_library.uploads import (
+    ChunkError,
+    SessionUploadedFile,
+    create_upload_file,
+    delete_upload_session,
+    missing_chunks,
+    write_chunk,
+)
+from audio_library.waveform import encode_waveform, get_peaks_path, read_peaks
+from oauth.models import UserProfile
+from base.cache import bump_object_version
+from base.classes import (
+    QueryPlanMixin,
+    ResponseCacheMixin,
+    StreamingListMixin,
+    FacetsMixin,
+    KeysetPagination,
+    MediaFileView,
+    MixedSerializer,
+    TrackListPagination,
+)
 from base.permissions import IsAuthor
-from base.services import delete_old_file
+from base.sendfile import sendfile
+from base.services import incr_counter
+from base.streaming import file_validators, start_listening_session
 
 
-class GenreView(generics.ListAPIView):
+class GenreView(ResponseCacheMixin, generics.ListAPIView):
     """List genre"""
 
     queryset = models.Genre.objects.all()
     serializer_class = serializers.GenreSerializer
+    cache_namespaces = ("audio_library.genre",)
 
 
 class LicenseView(viewsets.ModelViewSet):
@@ -44,28 +80,29 @@ class AlbumView(viewsets.ModelViewSet):
     permission_classes = [IsAuthor]
 
     def get_queryset(self):
-        return models.Album.objects.filter(user=self.request.user)
+        return models.Album.objects.filter(user=self.request.user).annotate(
+            total_duration=Sum("track__duration")
+        )
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-    def perform_destroy(self, instance):
-        delete_old_file(instance.cover.path)
-        instance.delete()
-
 
-class PublicAlbumView(generics.ListAPIView):
+class PublicAlbumView(ResponseCacheMixin, generics.ListAPIView):
     """List public album for user"""
 
     serializer_class = serializers.AlbumSerializer
+    cache_namespaces = ("audio_library.album", "audio_library.track")
 
     def get_queryset(self):
         return models.Album.objects.filter(
             user__id=self.kwargs.get("pk"), private=False
+        ).annotate(
+            total_duration=Sum("track__duration", filter=Q(track__private=False))
         )
 
 
-class TrackView(MixedSerializer, viewsets.ModelViewSet):
+class TrackView(QueryPlanMixin, MixedSerializer, viewsets.ModelViewSet):
     """CRUD tracks"""
 
     parser_classes = (parsers.MultiPartParser,)
@@ -76,29 +113,95 @@ class TrackView(MixedSerializer, viewsets.ModelViewSet):
     }
 
     def get_queryset(self):
-        return (
-            models.Track.objects.filter(user=self.request.user)
-            .prefetch_related(
-                "user",
-                "user__following",
-                "user__followers",
-                "user__social_links",
-                "license",
-                "genre",
-            )
-            .select_related("license", "user__user_profile", "album")
-        )
+        return models.Track.objects.filter(user=self.request.user)
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        create_track(serializer, self.request.user)
 
+    @transaction.atomic
     def perform_destroy(self, instance):
-        delete_old_file(instance.cover.path)
-        delete_old_file(instance.file.path)
         instance.delete()
+        incr_counter(
+            UserProfile.objects.filter(user=instance.user_id), "tracks_count", -1
+        )
+        bump_object_version(get_user_model(), instance.user_id)
+
+
+def create_track(serializer, user):
+    """Save new track and count it in author profile"""
+    with transaction.atomic():
+        track = serializer.save(user=user)
+        incr_counter(UserProfile.objects.filter(user=user), "tracks_count")
+        bump_object_version(get_user_model(), user.pk)
+    return track
+
+
+class UploadSessionView(viewsets.ModelViewSet):
+    """Resumable chunked upload of track file"""
+
+    parser_classes = (parsers.JSONParser, parsers.MultiPartParser)
+    permission_classes = [IsAuthor]
+    serializer_class = serializers.UploadSessionSerializer
+
+    def get_queryset(self):
+        return models.UploadSession.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        create_upload_file(serializer.save(user=self.request.user))
+
+    def perform_destroy(self, instance):
+        delete_upload_session(instance)
+
+    def finalize(self, request, pk):
+        """Create track from the uploaded file, fields as in track creation"""
+        session = self.get_object()
+        missing = missing_chunks(session)
+        if missing:
+            return Response(
+                {"message": "Upload is not complete.", "missing_chunks": missing},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if isinstance(request.data, QueryDict):
+            data = QueryDict(mutable=True)
+            for key, values in request.data.lists():
+                data.setlist(key, values)
+        else:
+            data = dict(request.data)
+        data["file"] = SessionUploadedFile(session)
+        try:
+            serializer = serializers.CreateAuthorTrackSerializer(
+                data=data, context=self.get_serializer_context()
+            )
+            serializer.is_valid(raise_exception=True)
+            create_track(serializer, request.user)
+        finally:
+            data["file"].close()
+        delete_upload_session(session)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
-class PlayListView(MixedSerializer, viewsets.ModelViewSet):
+class UploadChunkView(views.APIView):
+    """Write chunk of upload session.
+
+    Body is the raw chunk, ``X-Chunk-Checksum`` its hex SHA-256 digest.
+    """
+
+    serializer_class = None
+    permission_classes = [IsAuthor]
+
+    def put(self, request, pk, number):
+        session = get_object_or_404(models.UploadSession, id=pk)
+        self.check_object_permissions(request, session)
+        checksum = request.headers.get("X-Chunk-Checksum", "")
+        try:
+            chunk = write_chunk(session, number, request.stream or BytesIO(), checksum)
+        except ChunkError as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(serializers.UploadChunkSerializer(chunk).data)
+
+
+class PlayListView(QueryPlanMixin, MixedSerializer, viewsets.ModelViewSet):
     """CRUD playlist for user"""
 
     parser_classes = (parsers.MultiPartParser,)
@@ -109,139 +212,137 @@ class PlayListView(MixedSerializer, viewsets.ModelViewSet):
     }
 
     def get_queryset(self):
-        return models.Playlist.objects.filter(user=self.request.user).prefetch_related(
-            "tracks__user",
-            "tracks__user__following",
-            "tracks__user__followers",
-            "tracks__user__social_links",
-            "tracks__license",
-            "tracks__genre",
+        return models.Playlist.objects.filter(user=self.request.user).annotate(
+            total_duration=Sum("tracks__duration")
         )
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-    def perform_destroy(self, instance):
-        delete_old_file(instance.cover.path)
-        instance.delete()
 
-
-class TrackListView(generics.ListAPIView):
+class TrackListView(
+    ResponseCacheMixin,
+    StreamingListMixin,
+    QueryPlanMixin,
+    FacetsMixin,
+    generics.ListAPIView,
+):
     """List all track"""
 
-    queryset = (
-        models.Track.objects.filter(private=False)
-        .order_by("-id")
-        .prefetch_related(
-            "user",
-            "user__following",
-            "user__followers",
-            "user__social_links",
-            "license",
-            "genre",
-        )
-        .select_related("license", "user__user_profile", "album")
-    )
+    queryset = models.Track.objects.filter(private=False)
     serializer_class = serializers.AuthorTrackSerializer
-    pagination_class = TrackAPIListPagination
-    filter_backends = (SearchFilter, OrderingFilter, DjangoFilterBackend)
-    search_fields = ("title", "user")
+    pagination_class = TrackListPagination
+    filter_backends = (TrackSearchFilter, TrackOrderingFilter, DjangoFilterBackend)
     ordering_fields = (
         "create_at",
-        "play_count",
+        "plays_count",
         "download",
         "user",
+        "duration",
+    )
+    ordering = ("-create_at", "-id")
+    filterset_class = TrackFilter
+    facets = TRACK_FACETS
+    cache_namespaces = (
+        "audio_library.track",
+        "audio_library.album",
+        "audio_library.genre",
+        "audio_library.license",
+        "oauth.userprofile",
     )
-    filterset_fields = [
-        "title",
-        "user__user_profile__display_name",
-        "album__name",
-        "genre__name",
-    ]
 
 
-class TrackRecentlyPlayedView(generics.ListAPIView):
+class TrackRecentlyPlayedView(QueryPlanMixin, generics.ListAPIView):
     """List all recently played track"""
 
     permission_classes = [IsAuthenticated]
     serializer_class = serializers.AuthorTrackSerializer
 
     def get_queryset(self):
-        return (
-            models.Track.objects.filter(
-                private=False, played_track__user=self.request.user
-            )
-            .order_by("-played_track__played_at")[:10]
-            .prefetch_related(
-                "user",
-                "user__following",
-                "user__followers",
-                "user__social_links",
-                "license",
-                "genre",
-            )
-            .select_related("license", "user__user_profile", "album")
-        )
-
-
-class AuthorTrackListView(generics.ListAPIView):
+        return models.Track.objects.filter(
+            private=False, played_track__user=self.request.user
+        ).order_by("-played_track__played_at")[:10]
+
+
+class AuthorTrackListView(
+    ResponseCacheMixin,
+    StreamingListMixin,
+    QueryPlanMixin,
+    FacetsMixin,
+    generics.ListAPIView,
+):
     """List all track user"""
 
     serializer_class = serializers.AuthorTrackSerializer
-    pagination_class = TrackAPIListPagination
-    filter_backends = (SearchFilter, OrderingFilter, DjangoFilterBackend)
-    search_fields = ("title", "user")
+    pagination_class = TrackListPagination
+    filter_backends = (TrackSearchFilter, TrackOrderingFilter, DjangoFilterBackend)
     ordering_fields = (
         "create_at",
-        "play_count",
+        "plays_count",
         "download",
         "user",
+        "duration",
+    )
+    ordering = ("-create_at", "-id")
+    filterset_class = TrackFilter
+    facets = TRACK_FACETS
+    cache_namespaces = (
+        "audio_library.track",
+        "audio_library.album",
+        "audio_library.genre",
+        "audio_library.license",
+        "oauth.userprofile",
     )
-    filterset_fields = ["title", "album__name", "genre__name"]
 
     def get_queryset(self):
-        return (
-            models.Track.objects.filter(user__id=self.kwargs.get("pk"), private=False)
-            .order_by("-id")
-            .prefetch_related(
-                "user",
-                "license",
-                "user__following",
-                "user__followers",
-                "user__social_links",
-                "genre",
-            )
-            .select_related("user", "user__user_profile")
+        return models.Track.objects.filter(
+            user__id=self.kwargs.get("pk"), private=False
         )
 
 
+def get_seek_start(request, path):
+    """Byte offset of the frame playing at ``?t=`` seconds.
+
+    An explicit ``Range`` header wins, clients seeking by bytes keep working.
+    """
+    seconds = request.query_params.get("t")
+    if seconds is None or "Range" in request.headers:
+        return None
+    try:
+        seconds = float(seconds)
+    except ValueError:
+        seconds = -1
+    if not 0 <= seconds < float("inf"):
+        raise ValidationError({"t": "Must be a non-negative number of seconds."})
+    try:
+        return seek_offset(path, seconds)
+    except (OSError, ValueError):
+        return None
+
+
 class StreamingFileView(views.APIView):
     """Listen track"""
 
     serializer_class = None
 
     def set_play(self):
-        self.track.plays_count += 1
-        self.track.save()
+        incr_track_counter(self.track.id, "plays_count")
 
     def get(self, request, pk):
         self.track = get_object_or_404(models.Track, id=pk, private=False)
-        if os.path.exists(self.track.file.path):
+        if not os.path.exists(self.track.file.path):
+            raise Http404
+
+        # Invalid seeks are rejected before they count as a play
+        start = get_seek_start(request, self.track.file.path)
+        if start_listening_session(request, "play", self.track.id):
             self.set_play()
             if request.user.is_authenticated:
-                played_instance, created = models.PlayedUserTrack.objects.get_or_create(
-                    user_id=request.user.id,
-                    track=self.track,
-                )
-
-                played_instance.played_at = timezone.now()
-                played_instance.save()
+                record_play(request.user.id, self.track.id)
 
-            return FileResponse(
-                open(self.track.file.path, "rb"), filename=self.track.file.name
-            )
-        else:
-            return Http404
+        return sendfile(
+            request, self.track.file.path, filename=self.track.file.name, start=start
+        )
 
 
 class StreamingFileAuthorView(views.APIView):
@@ -251,18 +352,20 @@ class StreamingFileAuthorView(views.APIView):
     permission_classes = [IsAuthor]
 
     def set_play(self):
-        self.track.plays_count += 1
-        self.track.save()
+        incr_track_counter(self.track.id, "plays_count")
 
     def get(self, request, pk):
         self.track = get_object_or_404(models.Track, id=pk)
-        if os.path.exists(self.track.file.path):
+        self.check_object_permissions(request, self.track)
+        if not os.path.exists(self.track.file.path):
+            raise Http404
+
+        start = get_seek_start(request, self.track.file.path)
+        if start_listening_session(request, "play", self.track.id):
             self.set_play()
-            return FileResponse(
-                open(self.track.file.path, "rb"), filename=self.track.file.name
-            )
-        else:
-            return Http404
+        return sendfile(
+            request, self.track.file.path, filename=self.track.file.name, start=start
+        )
 
 
 class DownloadTrackView(views.APIView):
@@ -271,23 +374,101 @@ class DownloadTrackView(views.APIView):
     serializer_class = None
 
     def set_download(self):
-        self.track.download += 1
-        self.track.save()
+        incr_track_counter(self.track.id, "download")
 
     def get(self, request, pk):
         self.track = get_object_or_404(models.Track, id=pk, private=False)
-        if os.path.exists(self.track.file.path):
+        if not os.path.exists(self.track.file.path):
+            raise Http404
+
+        if start_listening_session(request, "download", self.track.id):
             self.set_download()
-            return FileResponse(
-                open(self.track.file.path, "rb"),
-                filename=self.track.file.name,
-                as_attachment=True,
+        return sendfile(
+            request,
+            self.track.file.path,
+            filename=self.track.file.name,
+            as_attachment=True,
+        )
+
+
+class TrackCoverView(MediaFileView):
+    """Cover of public track"""
+
+    queryset = models.Track.objects.filter(private=False).only("id", "cover")
+
+
+class AlbumCoverView(MediaFileView):
+    """Cover of public album"""
+
+    queryset = models.Album.objects.filter(private=False).only("id", "cover")
+
+
+class PlaylistCoverView(MediaFileView):
+    """Cover of playlist"""
+
+    queryset = models.Playlist.objects.only("id", "cover")
+
+
+class SuggestView(views.APIView):
+    """Typeahead suggestions of tracks, authors, albums and genres"""
+
+    # JWT authentication would load the user from the database
+    authentication_classes = ()
+    serializer_class = None
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get("limit", settings.SUGGEST_LIMIT))
+        except ValueError:
+            limit = settings.SUGGEST_LIMIT
+        limit = min(max(limit, 1), settings.SUGGEST_MAX_LIMIT)
+        return Response({"results": suggest(request.query_params.get("q", ""), limit)})
+
+
+class TrackWaveformView(views.APIView):
+    """Precomputed waveform peaks of track"""
+
+    serializer_class = None
+
+    def get(self, request, pk):
+        try:
+            bits = int(request.query_params.get("bits", 8))
+            resolution = int(request.query_params.get("resolution", 1024))
+        except ValueError:
+            bits = resolution = 0
+        if bits not in (8, 16) or resolution < 1:
+            return Response(
+                {"message": "bits must be 8 or 16 and resolution positive."},
+                status=status.HTTP_400_BAD_REQUEST,
             )
-        else:
-            return Http404
+
+        track = get_object_or_404(
+            models.Track.objects.only("id", "file"), id=pk, private=False
+        )
+        peaks_path = get_peaks_path(track.file.path)
+        try:
+            etag, last_modified = file_validators(peaks_path)
+        except FileNotFoundError:
+            raise Http404
+        etag = f'{etag[:-1]}-{bits}-{resolution}"'
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = HttpResponse(
+                encode_waveform(read_peaks(peaks_path, resolution), bits),
+                content_type="application/octet-stream",
+            )
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        patch_cache_control(
+            response, public=True, max_age=settings.WAVEFORM_CACHE_MAX_AGE
+        )
+        return response
 
 
-class CommentAuthorView(viewsets.ModelViewSet):
+class CommentAuthorView(QueryPlanMixin, viewsets.ModelViewSet):
     """CRUD comment user"""
 
     serializer_class = serializers.CommentAuthorSerializer
@@ -296,27 +477,44 @@ class CommentAuthorView(viewsets.ModelViewSet):
     def get_queryset(self):
         return models.Comment.objects.filter(user=self.request.user)
 
+    @transaction.atomic
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        comment = serializer.save(user=self.request.user)
+        incr_counter(models.Track.objects.filter(id=comment.track_id), "comments_count")
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+        incr_counter(
+            models.Track.objects.filter(id=instance.track_id), "comments_count", -1
+        )
 
+    @transaction.atomic
+    def perform_update(self, serializer):
+        # Locked, so concurrent moves of the comment count from its real track
+        track_id = (
+            models.Comment.objects.select_for_update()
+            .values_list("track_id", flat=True)
+            .get(id=serializer.instance.id)
+        )
+        comment = serializer.save()
+        if comment.track_id != track_id:
+            incr_counter(models.Track.objects.filter(id=track_id), "comments_count", -1)
+            incr_counter(
+                models.Track.objects.filter(id=comment.track_id), "comments_count"
+            )
 
-class CommentView(viewsets.ModelViewSet):
+
+class CommentView(ResponseCacheMixin, QueryPlanMixin, viewsets.ModelViewSet):
     """Comment for track"""
 
     serializer_class = serializers.CommentSerializer
+    pagination_class = KeysetPagination
+    ordering = ("-create_at", "-id")
+    cache_namespaces = ("audio_library.comment", "oauth.userprofile")
 
     def get_queryset(self):
-        return (
-            models.Comment.objects.filter(track_id=self.kwargs.get("pk"))
-            .prefetch_related(
-                "user",
-                "user__user_profile",
-                "user__following",
-                "user__followers",
-                "user__social_links",
-            )
-            .select_related("user")
-        )
+        return models.Comment.objects.filter(track_id=self.kwargs.get("pk"))
 
 
 class TrackLikeView(views.APIView):
@@ -333,31 +531,36 @@ class TrackLikeView(views.APIView):
                 {"message": "You can not like own track."},
                 status=status.HTTP_403_FORBIDDEN,
             )
-        if request.user.likes_of_tracks.filter(id=track.id).exists():
+        # Concurrent likes insert the row once, only that one counts it
+        with transaction.atomic():
+            _, created = models.Track.user_of_likes.through.objects.get_or_create(
+                track_id=track.id, user_id=request.user.id
+            )
+            if created:
+                incr_counter(models.Track.objects.filter(id=track.id), "likes_count")
+        if not created:
             return Response(
                 {"message": "You already like this track."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-
-        track.user_of_likes.add(request.user.id)
-        track.likes_count += 1
-        track.save()
-
         return Response({"message": "You like track."}, status=status.HTTP_201_CREATED)
 
     def delete(self, request, pk):
         """Remove like from track"""
         track = get_object_or_404(models.Track, id=pk, private=False)
-        if not request.user.likes_of_tracks.filter(id=track.id).exists():
+        with transaction.atomic():
+            deleted, _ = models.Track.user_of_likes.through.objects.filter(
+                track_id=track.id, user_id=request.user.id
+            ).delete()
+            if deleted:
+                incr_counter(
+                    models.Track.objects.filter(id=track.id), "likes_count", -1
+                )
+        if not deleted:
             return Response(
                 {"message": "You dont like this track for removing."},
                 status=status.HTTP_403_FORBIDDEN,
             )
-
-        track.user_of_likes.remove(request.user.id)
-        track.likes_count -= 1
-        track.save()
-
         return Response(
             {"message": "Remove like track."}, status=status.HTTP_204_NO_CONTENT
         )
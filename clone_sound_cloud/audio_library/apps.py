@@ -1,6 +1,18 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.utils.module_loading import import_string
 
 
 class AudioLibraryConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "audio_library"
+
+    def ready(self):
+        import audio_library.api.signals
+        from audio_library.suggest import LocalSuggestIndex, get_suggest_index
+        from base.cache_stats import track_cachalot_stats
+
+        track_cachalot_stats()
+        # The in-process trie starts warming off the request path
+        if import_string(settings.SUGGEST_INDEX) is LocalSuggestIndex:
+            get_suggest_index()
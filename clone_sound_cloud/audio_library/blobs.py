@@ -0,0 +1,131 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+
+from audio_library.models import MediaBlob
+from audio_library.seek_index import get_seek_index_path
+from audio_library.waveform import get_peaks_path
+from base.services import delete_old_file
+from base.storage import BLOBS_DIR, get_content_hash
+
+
+def acquire_blob(name):
+    with transaction.atomic():
+        blob, created = MediaBlob.objects.select_for_update().get_or_create(
+            name=name, defaults={"ref_count": 1}
+        )
+        if not created:
+            MediaBlob.objects.filter(name=name).update(ref_count=F("ref_count") + 1)
+
+
+def release_blob(name):
+    """Drop one reference, the file is deleted with the last one"""
+    with transaction.atomic():
+        blob = MediaBlob.objects.select_for_update().filter(name=name).first()
+        if blob is not None and blob.ref_count > 1:
+            MediaBlob.objects.filter(name=name).update(ref_count=F("ref_count") - 1)
+            return
+        if blob is not None:
+            blob.delete()
+    transaction.on_commit(lambda: delete_blob_files(name))
+
+
+def delete_blob_files(name):
+    """Delete stored file and files derived from it, unless referenced again"""
+    try:
+        path = default_storage.path(name)
+    except SuspiciousFileOperation:
+        return False
+    with transaction.atomic():
+        # Locking the name makes a concurrent acquire_blob of the same content
+        # wait for the files to be gone, or be seen here if it came first
+        blob, _ = MediaBlob.objects.select_for_update().get_or_create(
+            name=name, defaults={"ref_count": 0}
+        )
+        if blob.ref_count:
+            return False
+        delete_old_file(path)
+        delete_old_file(get_peaks_path(path))
+        delete_old_file(get_seek_index_path(path))
+        blob.delete()
+    return True
+
+
+def delete_orphan_blobs():
+    """Delete stored files without a ``MediaBlob`` row, return their number.
+
+    Files saved by requests rolled back afterwards are never referenced.
+    Recent files are skipped, their row may not be committed yet.
+    """
+    root = default_storage.path(BLOBS_DIR)
+    expired = time.time() - settings.MEDIA_BLOB_ORPHAN_AGE
+    deleted = 0
+    for dir_path, _, file_names in os.walk(root):
+        prefix = os.path.relpath(dir_path, default_storage.location).replace(
+            os.sep, "/"
+        )
+        names = set()
+        for file_name in filter(get_content_hash, file_names):
+            try:
+                if os.path.getmtime(os.path.join(dir_path, file_name)) < expired:
+                    names.add(f"{prefix}/{file_name}")
+            except FileNotFoundError:
+                continue
+        names -= set(
+            MediaBlob.objects.filter(name__in=names).values_list("name", flat=True)
+        )
+        deleted += sum(delete_blob_files(name) for name in sorted(names))
+    return deleted
+
+
+def get_loaded_names(instance, fields):
+    """Names of file fields loaded on instance, deferred fields are skipped"""
+    return {
+        field: str(instance.__dict__[field] or "")
+        for field in fields
+        if field in instance.__dict__
+    }
+
+
+def track_media_fields(model, *fields):
+    """Count references of ``model`` file ``fields`` to stored files"""
+    uid = f"media_blobs_{model._meta.label_lower}"
+
+    def post_init_receiver(sender, instance, **kwargs):
+        instance._original_media = get_loaded_names(instance, fields)
+
+    def post_save_receiver(sender, instance, created, **kwargs):
+        original = getattr(instance, "_original_media", {})
+        for field, name in get_loaded_names(instance, fields).items():
+            if not created and field not in original:
+                continue
+            old_name = "" if created else original[field]
+            if name == old_name:
+                continue
+            if name:
+                acquire_blob(name)
+            if old_name:
+                release_blob(old_name)
+            original[field] = name
+        instance._original_media = original
+
+    def pre_delete_receiver(sender, instance, **kwargs):
+        # Load deferred file fields while the row still exists
+        for field in fields:
+            getattr(instance, field)
+
+    def post_delete_receiver(sender, instance, **kwargs):
+        for name in get_loaded_names(instance, fields).values():
+            if name:
+                release_blob(name)
+
+    post_init.connect(post_init_receiver, model, weak=False, dispatch_uid=uid)
+    post_save.connect(post_save_receiver, model, weak=False, dispatch_uid=uid)
+    pre_delete.connect(pre_delete_receiver, model, weak=False, dispatch_uid=uid)
+    post_delete.connect(post_delete_receiver, model, weak=False, dispatch_uid=uid)
@@ -0,0 +1,130 @@
+import atexit
+import threading
+import uuid
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django_redis import get_redis_connection
+
+from audio_library.models import Track
+from base.services import load_backend
+
+TRACK_COUNTER_FIELDS = ("plays_count", "download")
+
+
+class LocalCounterBuffer:
+    """In-process counter buffer for tests and single process development,
+    flushed at interpreter exit"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        atexit.register(self.flush_at_exit)
+
+    def incr(self, track_id, field, amount=1):
+        with self._lock:
+            self._counts[(track_id, field)] += amount
+
+    def drain(self):
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+        return dict(counts)
+
+    def drain_orphans(self):
+        return {}
+
+    def flush_at_exit(self):
+        if self._counts:
+            flush_track_counters(buffer=self)
+
+
+class RedisCounterBuffer:
+    """Counter buffer shared by all workers in a Redis hash.
+
+    ``drain`` renames the hash before reading it, so increments arriving
+    during a flush land in a fresh hash and are never lost or counted twice.
+    """
+
+    key = "track_counters"
+    rename_if_exists_script = """
+        if redis.call("EXISTS", KEYS[1]) == 1 then
+            return redis.call("RENAME", KEYS[1], KEYS[2])
+        end
+        return false
+    """
+
+    def __init__(self):
+        self.client = get_redis_connection("default")
+        self._rename_if_exists = self.client.register_script(
+            self.rename_if_exists_script
+        )
+
+    def incr(self, track_id, field, amount=1):
+        self.client.hincrby(self.key, f"{track_id}:{field}", amount)
+
+    def drain(self):
+        processing_key = f"{self.key}:flushing:{uuid.uuid4().hex}"
+        if not self._rename_if_exists(keys=[self.key, processing_key]):
+            return {}
+        return self._pop(processing_key)
+
+    def drain_orphans(self):
+        """Collect hashes left behind by flushes that crashed midway"""
+        counts = Counter()
+        for key in self.client.scan_iter(f"{self.key}:flushing:*"):
+            counts.update(self._pop(key))
+        return dict(counts)
+
+    def _pop(self, key):
+        pipe = self.client.pipeline()
+        pipe.hgetall(key)
+        pipe.delete(key)
+        data, _ = pipe.execute()
+        counts = {}
+        for name, amount in data.items():
+            track_id, field = name.decode().split(":")
+            counts[(int(track_id), field)] = int(amount)
+        return counts
+
+
+def get_counter_buffer():
+    return load_backend(settings.TRACK_COUNTER_BUFFER)
+
+
+def incr_track_counter(track_id, field, amount=1):
+    """Buffer increment of track counter instead of writing it immediately"""
+    if field not in TRACK_COUNTER_FIELDS:
+        raise ValueError(f"Unknown track counter {field}")
+    get_counter_buffer().incr(track_id, field, amount)
+
+
+def apply_track_counters(counts):
+    """Write buffered ``{(track_id, field): amount}`` to database with F()"""
+    by_track = defaultdict(dict)
+    for (track_id, field), amount in counts.items():
+        if amount and field in TRACK_COUNTER_FIELDS:
+            by_track[track_id][field] = amount
+
+    with transaction.atomic():
+        for track_id, fields in sorted(by_track.items()):
+            Track.objects.filter(id=track_id).update(
+                **{field: F(field) + amount for field, amount in fields.items()}
+            )
+    return len(by_track)
+
+
+def flush_track_counters(include_orphans=False, buffer=None):
+    """Flush buffered counters, return number of updated tracks"""
+    buffer = buffer or get_counter_buffer()
+    counts = Counter(buffer.drain())
+    if include_orphans:
+        counts.update(buffer.drain_orphans())
+
+    try:
+        return apply_track_counters(counts)
+    except Exception:
+        for (track_id, field), amount in counts.items():
+            buffer.incr(track_id, field, amount)
+        raise
@@ -0,0 +1,84 @@
+from django.db.models import Case, CharField, Count, Q, Value, When
+
+from audio_library.models import Track
+
+# Name, lower bound inclusive and upper bound exclusive in seconds
+DURATION_BUCKETS = (
+    ("short", None, 120),
+    ("medium", 120, 300),
+    ("long", 300, 600),
+    ("very_long", 600, None),
+)
+
+
+def duration_bucket_filter(bucket):
+    lower, upper = next((lo, up) for name, lo, up in DURATION_BUCKETS if name == bucket)
+    condition = Q()
+    if lower is not None:
+        condition &= Q(duration__gte=lower)
+    if upper is not None:
+        condition &= Q(duration__lt=upper)
+    return condition
+
+
+def get_tracks(queryset):
+    """Filtered tracks without annotations and ordering, one row per track"""
+    return Track.objects.filter(pk__in=queryset.values("pk"))
+
+
+def genre_facet(queryset):
+    rows = (
+        Track.genre.through.objects.filter(track__in=queryset.values("pk"))
+        .values("genre__name")
+        .annotate(count=Count("track"))
+        .order_by("-count", "genre__name")
+    )
+    return [{"value": row["genre__name"], "count": row["count"]} for row in rows]
+
+
+def license_facet(queryset):
+    rows = (
+        get_tracks(queryset)
+        .values("license", "license__text")
+        .annotate(count=Count("pk"))
+        .order_by("-count", "license")
+    )
+    return [
+        {
+            "value": row["license"],
+            "label": row["license__text"][:50],
+            "count": row["count"],
+        }
+        for row in rows
+    ]
+
+
+def duration_bucket_facet(queryset):
+    bucket = Case(
+        *(
+            When(duration_bucket_filter(name), then=Value(name))
+            for name, _, _ in DURATION_BUCKETS
+        ),
+        output_field=CharField(),
+    )
+    rows = (
+        get_tracks(queryset)
+        .filter(duration__isnull=False)
+        .annotate(bucket=bucket)
+        .values("bucket")
+        .annotate(count=Count("pk"))
+        .order_by()
+    )
+    counts = {row["bucket"]: row["count"] for row in rows}
+    return [
+        {"value": name, "count": counts[name]}
+        for name, _, _ in DURATION_BUCKETS
+        if name in counts
+    ]
+
+
+TRACK_FACETS = {
+    "genre": genre_facet,
+    "license": license_facet,
+    "duration_bucket": duration_bucket_facet,
+}
@@ -0,0 +1,139 @@
+import atexit
+import json
+import threading
+from collections import deque
+from datetime import datetime
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from audio_library.models import PlayedUserTrack, Track
+from base.services import load_backend
+
+
+class LocalHistoryQueue:
+    """In-process bounded queue of listen events, flushed at interpreter exit"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events = deque(maxlen=settings.PLAY_HISTORY_MAX_LENGTH)
+        atexit.register(self.flush_at_exit)
+
+    def push(self, event):
+        with self._lock:
+            self._events.append(event)
+
+    def pop_batch(self, size):
+        with self._lock:
+            return [self._events.popleft() for _ in range(min(size, len(self._events)))]
+
+    def flush_at_exit(self):
+        if self._events:
+            flush_play_history(queue=self)
+
+
+class RedisHistoryQueue:
+    """Listen events in a Redis list shared by workers.
+
+    The list is trimmed on every push, so a stalled flusher drops the oldest
+    events instead of growing without bound.
+    """
+
+    key = "played_tracks"
+
+    def __init__(self):
+        self.client = get_redis_connection("default")
+
+    def push(self, event):
+        pipe = self.client.pipeline()
+        pipe.rpush(self.key, json.dumps(event))
+        pipe.ltrim(self.key, -settings.PLAY_HISTORY_MAX_LENGTH, -1)
+        pipe.execute()
+
+    def pop_batch(self, size):
+        pipe = self.client.pipeline()
+        pipe.lrange(self.key, 0, size - 1)
+        pipe.ltrim(self.key, size, -1)
+        events, _ = pipe.execute()
+        return [json.loads(event) for event in events]
+
+
+def get_history_queue():
+    return load_backend(settings.PLAY_HISTORY_QUEUE)
+
+
+def record_play(user_id, track_id):
+    """Queue listen event instead of writing PlayedUserTrack synchronously"""
+    get_history_queue().push(
+        {
+            "user_id": user_id,
+            "track_id": track_id,
+            "played_at": timezone.now().isoformat(),
+        }
+    )
+
+
+def write_play_history(events):
+    """Upsert listen events, keeping the latest ``played_at`` per user and track"""
+    latest = {}
+    for event in events:
+        key = (event["user_id"], event["track_id"])
+        played_at = datetime.fromisoformat(event["played_at"])
+        if key not in latest or latest[key] < played_at:
+            latest[key] = played_at
+    if not latest:
+        return 0
+
+    # Skip events of users or tracks deleted since they were queued
+    user_ids = set(
+        get_user_model()
+        .objects.filter(id__in={user_id for user_id, _ in latest})
+        .values_list("id", flat=True)
+    )
+    track_ids = set(
+        Track.objects.filter(id__in={track_id for _, track_id in latest}).values_list(
+            "id", flat=True
+        )
+    )
+    with transaction.atomic():
+        # Events pushed back after a failed flush can be older than stored rows
+        stored = PlayedUserTrack.objects.select_for_update().filter(
+            user_id__in=user_ids, track_id__in=track_ids
+        )
+        for user_id, track_id, played_at in stored.values_list(
+            "user_id", "track_id", "played_at"
+        ):
+            if latest.get((user_id, track_id), played_at) <= played_at:
+                latest.pop((user_id, track_id), None)
+        played = [
+            PlayedUserTrack(user_id=user_id, track_id=track_id, played_at=played_at)
+            for (user_id, track_id), played_at in latest.items()
+            if user_id in user_ids and track_id in track_ids
+        ]
+        PlayedUserTrack.objects.bulk_create(
+            played,
+            update_conflicts=True,
+            unique_fields=["user", "track"],
+            update_fields=["played_at"],
+        )
+    return len(played)
+
+
+def flush_play_history(queue=None, batch_size=None):
+    """Drain listen events queue in batches, return number of written rows"""
+    queue = queue or get_history_queue()
+    batch_size = batch_size or settings.PLAY_HISTORY_BATCH_SIZE
+    written = 0
+    while True:
+        events = queue.pop_batch(batch_size)
+        if not events:
+            return written
+        try:
+            written += write_play_history(events)
+        except Exception:
+            for event in events:
+                queue.push(event)
+            raise
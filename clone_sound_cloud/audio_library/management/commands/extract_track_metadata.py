@@ -0,0 +1,54 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+
+from audio_library.metadata import get_track_metadata, save_track_metadata
+from audio_library.models import Track
+
+
+def read_metadata(track):
+    track_id, path = track
+    try:
+        return track_id, get_track_metadata(path), None
+    except (OSError, ValueError) as exc:
+        return track_id, None, str(exc)
+
+
+class Command(BaseCommand):
+    help = "Fill duration, bitrate, sample rate and channels of existing tracks"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Process every track, not only tracks without metadata",
+        )
+        parser.add_argument("--workers", type=int, default=None)
+        parser.add_argument("--chunk-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        tracks = Track.objects.exclude(file="").order_by("id").only("id", "file")
+        if not options["all"]:
+            tracks = tracks.filter(duration__isnull=True)
+        chunk_size = options["chunk_size"]
+        paths = (
+            (track.id, track.file.path)
+            for track in tracks.iterator(chunk_size=chunk_size)
+        )
+
+        updated = failed = 0
+        # Headers are parsed in worker processes, database is written here
+        with ProcessPoolExecutor(max_workers=options["workers"]) as executor:
+            while chunk := list(islice(paths, chunk_size)):
+                for track_id, metadata, error in executor.map(read_metadata, chunk):
+                    if error is not None:
+                        failed += 1
+                        self.stderr.write(f"Track {track_id}: {error}")
+                        continue
+                    save_track_metadata(track_id, metadata)
+                    updated += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Updated {updated} tracks, {failed} failed")
+        )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from audio_library.counters import flush_track_counters
+
+
+class Command(BaseCommand):
+    help = (
+        "Flush buffered play and download counters to the database, "
+        "including increments left behind by interrupted flushes"
+    )
+
+    def handle(self, *args, **options):
+        updated = flush_track_counters(include_orphans=True)
+        self.stdout.write(self.style.SUCCESS(f"Updated counters of {updated} tracks"))
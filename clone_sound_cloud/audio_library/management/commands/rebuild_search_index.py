@@ -0,0 +1,31 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from audio_library.models import Track
+from audio_library.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index of tracks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        track_ids = (
+            Track.objects.order_by("id")
+            .values_list("id", flat=True)
+            .iterator(chunk_size=options["chunk_size"])
+        )
+
+        indexed = 0
+        # Searches keep seeing the old index until the new one is committed
+        with transaction.atomic():
+            backend.clear()
+            while chunk := list(islice(track_ids, options["chunk_size"])):
+                indexed += backend.index(chunk)
+
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} tracks"))
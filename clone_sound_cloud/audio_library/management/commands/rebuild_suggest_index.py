@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from audio_library.suggest import rebuild_suggestions
+
+
+class Command(BaseCommand):
+    help = "Rebuild typeahead suggestions and refresh their popularity"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Drop the whole index first, suggestions are missing meanwhile",
+        )
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        indexed = rebuild_suggestions(options["clear"], options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} suggestions"))
@@ -0,0 +1,65 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Max
+
+from audio_library.models import Comment, Track
+from base.services import count_subquery
+from oauth.models import UserFollowing, UserProfile
+
+
+def recompute_profiles(start, end):
+    return UserProfile.objects.filter(user_id__gte=start, user_id__lt=end).update(
+        followers_count=count_subquery(
+            UserFollowing.objects.all(), "following_user", "user_id"
+        ),
+        following_count=count_subquery(UserFollowing.objects.all(), "user", "user_id"),
+        tracks_count=count_subquery(Track.objects.all(), "user", "user_id"),
+    )
+
+
+def recompute_tracks(start, end):
+    return Track.objects.filter(id__gte=start, id__lt=end).update(
+        comments_count=count_subquery(Comment.objects.all(), "track"),
+        likes_count=count_subquery(Track.user_of_likes.through.objects.all(), "track"),
+    )
+
+
+def run_in_thread(recompute, start, end):
+    try:
+        return recompute(start, end)
+    finally:
+        # Every worker thread opens its own connection
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = "Recompute denormalized follower, following, track, comment and like counts"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        jobs = []
+        for recompute, queryset, field in (
+            (recompute_profiles, UserProfile.objects, "user_id"),
+            (recompute_tracks, Track.objects, "id"),
+        ):
+            last_id = queryset.aggregate(last_id=Max(field))["last_id"] or 0
+            jobs += [
+                (recompute, start, start + chunk_size)
+                for start in range(0, last_id + 1, chunk_size)
+            ]
+
+        # Each chunk is a single UPDATE by primary key range, run in parallel
+        if options["workers"] == 1:
+            updated = sum(recompute(start, end) for recompute, start, end in jobs)
+        else:
+            with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+                futures = [executor.submit(run_in_thread, *job) for job in jobs]
+                updated = sum(future.result() for future in futures)
+
+        self.stdout.write(self.style.SUCCESS(f"Recomputed {updated} rows"))
@@ -0,0 +1,204 @@
+import os
+import struct
+from collections import namedtuple
+
+from audio_library.models import Track
+from base.cache import bump_object_version
+
+# Bitrates in kbps by (MPEG-1, layer) and (MPEG-2/2.5, layer), index 0 is "free"
+BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+SAMPLE_RATES = {
+    1: (44100, 48000, 32000),
+    2: (22050, 24000, 16000),
+    2.5: (11025, 12000, 8000),
+}
+VERSIONS = {0b00: 2.5, 0b10: 2, 0b11: 1}
+LAYERS = {0b01: 3, 0b10: 2, 0b11: 1}
+
+FrameHeader = namedtuple(
+    "FrameHeader",
+    "version layer bitrate sample_rate channels length samples side_info",
+)
+AudioMetadata = namedtuple(
+    "AudioMetadata", "duration bitrate sample_rate channels audio_start frames toc"
+)
+
+
+def parse_frame_header(data, offset=0):
+    """MPEG audio frame header at ``offset`` or ``None`` if it is not one"""
+    if len(data) < offset + 4:
+        return None
+    header = struct.unpack_from(">I", data, offset)[0]
+    if header >> 21 != 0x7FF:
+        return None
+    version = VERSIONS.get((header >> 19) & 0b11)
+    layer = LAYERS.get((header >> 17) & 0b11)
+    bitrate_index = (header >> 12) & 0b1111
+    sample_rate_index = (header >> 10) & 0b11
+    if version is None or layer is None:
+        return None
+    if bitrate_index in (0, 0b1111) or sample_rate_index == 0b11:
+        return None
+
+    bitrate = BITRATES[(1 if version == 1 else 2, layer)][bitrate_index]
+    sample_rate = SAMPLE_RATES[version][sample_rate_index]
+    padding = (header >> 9) & 1
+    channels = 1 if (header >> 6) & 0b11 == 0b11 else 2
+
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate * 1000 // sample_rate + padding) * 4
+    else:
+        samples = 1152 if layer == 2 or version == 1 else 576
+        length = samples // 8 * bitrate * 1000 // sample_rate + padding
+
+    if version == 1:
+        side_info = 17 if channels == 1 else 32
+    else:
+        side_info = 9 if channels == 1 else 17
+    return FrameHeader(
+        version, layer, bitrate, sample_rate, channels, length, samples, side_info
+    )
+
+
+def skip_id3v2(data):
+    """Offset of audio data after ID3v2 tag, ``0`` when there is no tag"""
+    if len(data) < 10 or data[:3] != b"ID3":
+        return 0
+    size = 0
+    for byte in data[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def find_first_frame(data, offset=0):
+    """First frame header confirmed by the header of the next frame"""
+    while True:
+        offset = data.find(b"\xff", offset)
+        if offset == -1:
+            return None, None
+        frame = parse_frame_header(data, offset)
+        if frame is not None:
+            following = parse_frame_header(data, offset + frame.length)
+            if following is not None or offset + frame.length >= len(data):
+                return offset, frame
+        offset += 1
+
+
+def read_mp3_metadata(f, file_size):
+    # ID3v2 tag can be large (cover art), only read what follows it
+    audio_offset = skip_id3v2(f.read(10))
+    f.seek(audio_offset)
+    data = f.read(64 * 1024)
+    offset, frame = find_first_frame(data)
+    if frame is None:
+        raise ValueError("No MPEG audio frame found")
+    audio_start = audio_offset + offset
+
+    f.seek(max(file_size - 128, 0))
+    audio_end = file_size - 128 if f.read(3) == b"TAG" else file_size
+
+    frames = audio_bytes = toc = None
+    xing = offset + 4 + frame.side_info
+    if data.startswith((b"Xing", b"Info"), xing):
+        flags = struct.unpack_from(">I", data, xing + 4)[0]
+        position = xing + 8
+        if flags & 0x1:
+            frames = struct.unpack_from(">I", data, position)[0]
+            position += 4
+        if flags & 0x2:
+            audio_bytes = struct.unpack_from(">I", data, position)[0]
+            position += 4
+        if flags & 0x4:
+            toc_end = position + 100
+            toc = data[position:toc_end]
+    elif data.startswith(b"VBRI", offset + 36):
+        audio_bytes, frames = struct.unpack_from(">II", data, offset + 46)
+
+    if frames:
+        duration = frames * frame.samples / frame.sample_rate
+        audio_bytes = audio_bytes or audio_end - audio_start
+        bitrate = round(audio_bytes * 8 / duration / 1000) if duration else 0
+    else:
+        bitrate = frame.bitrate
+        duration = (audio_end - audio_start) * 8 / (bitrate * 1000)
+
+    return AudioMetadata(
+        duration, bitrate, frame.sample_rate, frame.channels, audio_start, frames, toc
+    )
+
+
+def read_wav_metadata(f, file_size):
+    riff, _, wave_id = struct.unpack("<4sI4s", f.read(12))
+    if riff != b"RIFF" or wave_id != b"WAVE":
+        raise ValueError("Not a RIFF WAVE file")
+
+    fmt = None
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            raise ValueError("WAVE data chunk not found")
+        chunk_id, chunk_size = struct.unpack("<4sI", chunk)
+        if chunk_id == b"fmt ":
+            fmt = struct.unpack("<HHIIHH", f.read(16))
+            f.seek(chunk_size - 16 + chunk_size % 2, os.SEEK_CUR)
+        elif chunk_id == b"data":
+            break
+        else:
+            f.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+    if fmt is None:
+        raise ValueError("WAVE fmt chunk not found")
+
+    _, channels, sample_rate, byte_rate, _, _ = fmt
+    audio_start = f.tell()
+    # Streamed WAVs may have a 0 or 0xFFFFFFFF data size
+    data_size = min(chunk_size or file_size, file_size - audio_start)
+    return AudioMetadata(
+        data_size / byte_rate if byte_rate else 0,
+        round(byte_rate * 8 / 1000),
+        sample_rate,
+        channels,
+        audio_start,
+        None,
+        None,
+    )
+
+
+def read_audio_metadata(path):
+    """Parse MP3 or WAV headers, the audio data itself is never decoded"""
+    file_size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        if f.read(4) == b"RIFF":
+            f.seek(0)
+            return read_wav_metadata(f, file_size)
+        f.seek(0)
+        return read_mp3_metadata(f, file_size)
+
+
+def get_track_metadata(path):
+    """Values of Track metadata columns"""
+    metadata = read_audio_metadata(path)
+    return {
+        "duration": round(metadata.duration, 3),
+        "bitrate": metadata.bitrate,
+        "sample_rate": metadata.sample_rate,
+        "channels": metadata.channels,
+    }
+
+
+def save_track_metadata(track_id, metadata):
+    """Write metadata columns of a track.
+
+    The update skips signals, so versions of cached lists and fragments of
+    the track are bumped here.
+    """
+    Track.objects.filter(id=track_id).update(**metadata)
+    bump_object_version(Track, track_id)
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:18
+
+from django.db import migrations, models
+
+
+def remove_duplicate_played_tracks(apps, schema_editor):
+    """Keep only the latest play of every user and track pair"""
+    PlayedUserTrack = apps.get_model("audio_library", "PlayedUserTrack")
+    duplicates = (
+        PlayedUserTrack.objects.values("user", "track")
+        .annotate(total=models.Count("id"))
+        .filter(total__gt=1)
+    )
+    for duplicate in list(duplicates):
+        latest = (
+            PlayedUserTrack.objects.filter(
+                user=duplicate["user"], track=duplicate["track"]
+            )
+            .order_by("-played_at", "-id")
+            .first()
+        )
+        PlayedUserTrack.objects.filter(
+            user=duplicate["user"], track=duplicate["track"]
+        ).exclude(id=latest.id).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("audio_library", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_played_tracks, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="playedusertrack",
+            constraint=models.UniqueConstraint(
+                fields=("user", "track"), name="unique_played_user_track"
+            ),
+        ),
+    ]
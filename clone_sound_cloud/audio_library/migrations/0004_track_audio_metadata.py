@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("audio_library", "0003_played_user_track_unique"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="track",
+            name="bitrate",
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="track",
+            name="channels",
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="track",
+            name="duration",
+            field=models.FloatField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="track",
+            name="sample_rate",
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True),
+        ),
+    ]
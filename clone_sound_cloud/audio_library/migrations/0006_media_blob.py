@@ -0,0 +1,51 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:45
+
+from collections import Counter
+
+from django.db import migrations, models
+
+MEDIA_FIELDS = (
+    ("audio_library", "Track", "file"),
+    ("audio_library", "Track", "cover"),
+    ("audio_library", "Album", "cover"),
+    ("audio_library", "Playlist", "cover"),
+    ("oauth", "UserProfile", "avatar"),
+)
+
+
+def count_media_references(apps, schema_editor):
+    """Reference counts of files uploaded before deduplication"""
+    MediaBlob = apps.get_model("audio_library", "MediaBlob")
+    references = Counter()
+    for app_label, model_name, field in MEDIA_FIELDS:
+        model = apps.get_model(app_label, model_name)
+        names = model.objects.exclude(**{field: ""}).exclude(
+            **{f"{field}__isnull": True}
+        )
+        references.update(names.values_list(field, flat=True).iterator())
+    MediaBlob.objects.bulk_create(
+        [MediaBlob(name=name, ref_count=count) for name, count in references.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("audio_library", "0005_upload_session"),
+        ("oauth", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MediaBlob",
+            fields=[
+                (
+                    "name",
+                    models.CharField(max_length=255, primary_key=True, serialize=False),
+                ),
+                ("ref_count", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RunPython(count_media_references, migrations.RunPython.noop),
+    ]
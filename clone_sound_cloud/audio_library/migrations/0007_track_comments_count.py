@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:55
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(queryset, field, outer_ref="pk"):
+    """Number of ``queryset`` rows whose ``field`` is the outer row"""
+    rows = (
+        queryset.filter(**{field: OuterRef(outer_ref)})
+        .order_by()
+        .values(field)
+        .annotate(total=Count("*"))
+        .values("total")
+    )
+    return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+
+def fill_comments_count(apps, schema_editor):
+    Track = apps.get_model("audio_library", "Track")
+    Comment = apps.get_model("audio_library", "Comment")
+    Track.objects.update(comments_count=count_subquery(Comment.objects.all(), "track"))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("audio_library", "0006_media_blob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="track",
+            name="comments_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_comments_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,74 @@
+from django.db import migrations
+
+SEARCH_TABLE = "audio_library_track_search"
+
+DOCUMENTS_SQL = """
+    SELECT t.id, t.title, COALESCE(p.display_name, ''), COALESCE(a.name, ''),
+        COALESCE((
+            SELECT {genres} FROM audio_library_track_genre tg
+            JOIN audio_library_genre g ON g.id = tg.genre_id
+            WHERE tg.track_id = t.id
+        ), '')
+    FROM audio_library_track t
+    LEFT JOIN oauth_userprofile p ON p.user_id = t.user_id
+    LEFT JOIN audio_library_album a ON a.id = t.album_id
+"""
+
+POSTGRESQL_SQL = [
+    f"""
+    CREATE TABLE {SEARCH_TABLE} (
+        track_id bigint PRIMARY KEY
+            REFERENCES audio_library_track (id) ON DELETE CASCADE
+            DEFERRABLE INITIALLY DEFERRED,
+        vector tsvector NOT NULL
+    )
+    """,
+    f"CREATE INDEX {SEARCH_TABLE}_vector ON {SEARCH_TABLE} USING gin (vector)",
+    f"""
+    INSERT INTO {SEARCH_TABLE} (track_id, vector)
+    SELECT id,
+        setweight(to_tsvector('simple', title), 'A')
+        || setweight(to_tsvector('simple', author), 'B')
+        || setweight(to_tsvector('simple', album), 'C')
+        || setweight(to_tsvector('simple', genres), 'C')
+    FROM ({DOCUMENTS_SQL.format(genres="string_agg(g.name, ' ')")})
+        AS documents (id, title, author, album, genres)
+    """,
+]
+
+SQLITE_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE {SEARCH_TABLE}
+    USING fts5(title, author, album, genres, tokenize = 'unicode61')
+    """,
+    f"""
+    INSERT INTO {SEARCH_TABLE} (rowid, title, author, album, genres)
+    {DOCUMENTS_SQL.format(genres="group_concat(g.name, ' ')")}
+    """,
+]
+
+
+VENDOR_SQL = {"postgresql": POSTGRESQL_SQL, "sqlite": SQLITE_SQL}
+
+
+def create_search_table(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor not in VENDOR_SQL:
+        raise NotImplementedError(f"Track search is not supported on {vendor}")
+    for sql in VENDOR_SQL[vendor]:
+        schema_editor.execute(sql)
+
+
+def drop_search_table(apps, schema_editor):
+    schema_editor.execute(f"DROP TABLE {SEARCH_TABLE}")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("audio_library", "0007_track_comments_count"),
+        ("oauth", "0003_profile_counters"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
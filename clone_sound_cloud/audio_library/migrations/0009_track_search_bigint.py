@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:30
+
+from django.db import migrations
+
+SEARCH_TABLE = "audio_library_track_search"
+
+
+def widen_track_id(apps, schema_editor):
+    """Track ids are bigint, earlier 0008 created this column as integer"""
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(
+            f"ALTER TABLE {SEARCH_TABLE} ALTER COLUMN track_id TYPE bigint"
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("audio_library", "0008_track_search"),
+    ]
+
+    operations = [
+        migrations.RunPython(widen_track_id, migrations.RunPython.noop),
+    ]
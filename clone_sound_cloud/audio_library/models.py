@@ -1,3 +1,5 @@
+import uuid
+
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 from django.core.validators import FileExtensionValidator
@@ -13,6 +15,17 @@ from base.services import (
 )
 
 
+class MediaBlob(models.Model):
+    """Reference count of a stored media file shared by tracks, covers, avatars"""
+
+    name = models.CharField(max_length=255, primary_key=True)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count})"
+
+
 class License(models.Model):
     """Model licence audio user"""
 
@@ -78,9 +91,14 @@ class Track(models.Model):
         ],
     )
     create_at = models.DateTimeField(auto_now_add=True)
+    duration = models.FloatField(blank=True, null=True, db_index=True)
+    bitrate = models.PositiveIntegerField(blank=True, null=True, db_index=True)
+    sample_rate = models.PositiveIntegerField(blank=True, null=True, db_index=True)
+    channels = models.PositiveSmallIntegerField(blank=True, null=True)
     plays_count = models.PositiveIntegerField(default=0)
     download = models.PositiveIntegerField(default=0)
     likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
     user_of_likes = models.ManyToManyField(
         get_user_model(), related_name="likes_of_tracks", blank=True
     )
@@ -110,6 +128,13 @@ class PlayedUserTrack(models.Model):
     )
     played_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "track"], name="unique_played_user_track"
+            )
+        ]
+
     def __str__(self):
         return f"{self.user} played {self.track.title} at {self.played_at }"
 
@@ -150,3 +175,44 @@ class Playlist(models.Model):
 
     def __str__(self):
         return f"{self.user} - {self.title}"
+
+
+class UploadSession(models.Model):
+    """Resumable chunked upload of a track file"""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        get_user_model(), on_delete=models.CASCADE, related_name="upload_sessions"
+    )
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    @property
+    def total_chunks(self):
+        return -(-self.size // self.chunk_size)
+
+    def __str__(self):
+        return f"{self.user} - {self.filename}"
+
+
+class UploadChunk(models.Model):
+    """Chunk of upload session written to disk"""
+
+    session = models.ForeignKey(
+        UploadSession, on_delete=models.CASCADE, related_name="chunks"
+    )
+    number = models.PositiveIntegerField()
+    checksum = models.CharField(max_length=64)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["session", "number"], name="unique_upload_chunk"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.session_id} - {self.number}"
@@ -0,0 +1,226 @@
+import re
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.db.models import Expression, F, FloatField, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Ln
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+from rest_framework.settings import api_settings
+
+from audio_library.models import Track
+from base.services import load_backend
+
+SEARCH_TABLE = "audio_library_track_search"
+TOKEN_RE = re.compile(r"\w+")
+
+
+def get_search_terms(query):
+    return TOKEN_RE.findall(query.lower())[:16]
+
+
+class RowSQL(Expression):
+    """Scalar ``sql`` of the outer row, ``{pk}`` is its primary key column.
+
+    Unlike a ``RawSQL`` naming the track table, it stays correct when the
+    query aliases that table, as in subqueries.
+    """
+
+    def __init__(self, sql, params, output_field=None):
+        super().__init__(output_field=output_field)
+        self.sql = sql
+        self.params = list(params)
+        self.pk = F("pk")
+
+    def get_source_expressions(self):
+        return [self.pk]
+
+    def set_source_expressions(self, exprs):
+        (self.pk,) = exprs
+
+    def as_sql(self, compiler, connection):
+        pk_sql, pk_params = compiler.compile(self.pk)
+        return f"({self.sql.format(pk=pk_sql)})", [*self.params, *pk_params]
+
+
+def get_documents(track_ids):
+    """``(id, title, author, album, genres)`` of tracks to index"""
+    tracks = (
+        Track.objects.filter(id__in=track_ids)
+        .select_related("user__user_profile", "album")
+        .prefetch_related("genre")
+        .only("id", "title", "user__user_profile__display_name", "album__name")
+    )
+    for track in tracks:
+        profile = getattr(track.user, "user_profile", None)
+        yield (
+            track.id,
+            track.title,
+            (profile and profile.display_name) or "",
+            track.album.name if track.album else "",
+            " ".join(genre.name for genre in track.genre.all()),
+        )
+
+
+class PostgresSearchBackend:
+    """``tsvector`` per track in a GIN indexed table.
+
+    Title weighs most, then author display name, then album and genres.
+    Terms are matched by prefix, so results show up while a word is typed.
+    """
+
+    config = "simple"
+    weights = ("A", "B", "C", "C")
+
+    def get_tsquery(self, terms):
+        return " & ".join(f"{term}:*" for term in terms)
+
+    def index(self, track_ids):
+        documents = list(get_documents(track_ids))
+        vector = " || ".join(
+            f"setweight(to_tsvector('{self.config}', %s), '{weight}')"
+            for weight in self.weights
+        )
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE} (track_id, vector) VALUES (%s, {vector}) "
+                "ON CONFLICT (track_id) DO UPDATE SET vector = EXCLUDED.vector",
+                documents,
+            )
+        return len(documents)
+
+    def remove(self, track_ids):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {SEARCH_TABLE} WHERE track_id = ANY(%s)",
+                [list(track_ids)],
+            )
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+
+    def match(self, terms):
+        return RawSQL(
+            f"SELECT track_id FROM {SEARCH_TABLE} "
+            f"WHERE vector @@ to_tsquery('{self.config}', %s)",
+            [self.get_tsquery(terms)],
+        )
+
+    def rank(self, terms):
+        return RowSQL(
+            f"SELECT ts_rank(vector, to_tsquery('{self.config}', %s)) "
+            f"FROM {SEARCH_TABLE} WHERE track_id = {{pk}}",
+            [self.get_tsquery(terms)],
+            output_field=FloatField(),
+        )
+
+
+class SQLiteSearchBackend:
+    """FTS5 virtual table keyed by track id, ranked with weighted BM25"""
+
+    weights = (10.0, 5.0, 2.0, 2.0)
+
+    def get_match_query(self, terms):
+        return " ".join(f'"{term}"*' for term in terms)
+
+    def index(self, track_ids):
+        documents = list(get_documents(track_ids))
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s",
+                [(document[0],) for document in documents],
+            )
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE} (rowid, title, author, album, genres) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                documents,
+            )
+        return len(documents)
+
+    def remove(self, track_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s",
+                [(track_id,) for track_id in track_ids],
+            )
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+
+    def match(self, terms):
+        return RawSQL(
+            f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s",
+            [self.get_match_query(terms)],
+        )
+
+    def rank(self, terms):
+        weights = ", ".join(str(weight) for weight in self.weights)
+        # bm25() is lower for better matches
+        return RowSQL(
+            f"SELECT -bm25({SEARCH_TABLE}, {weights}) FROM {SEARCH_TABLE} "
+            f"WHERE {SEARCH_TABLE} MATCH %s AND rowid = {{pk}}",
+            [self.get_match_query(terms)],
+            output_field=FloatField(),
+        )
+
+
+def get_search_backend():
+    try:
+        path = settings.TRACK_SEARCH_BACKENDS[connection.vendor]
+    except KeyError:
+        raise ImproperlyConfigured(
+            f"Track search is not supported on {connection.vendor}, "
+            "see TRACK_SEARCH_BACKENDS"
+        ) from None
+    return load_backend(path)
+
+
+def index_tracks(track_ids):
+    return get_search_backend().index(track_ids)
+
+
+def remove_tracks(track_ids):
+    get_search_backend().remove(track_ids)
+
+
+def search_tracks(queryset, query):
+    """Tracks matching every term of ``query``, annotated with ``search_rank``.
+
+    Text relevance is blended with popularity, weighted by
+    ``TRACK_SEARCH_POPULARITY_WEIGHT``.
+    """
+    terms = get_search_terms(query)
+    if not terms:
+        return queryset.none()
+    backend = get_search_backend()
+    popularity = Ln(F("plays_count") + F("likes_count") + Value(1.0))
+    return queryset.filter(id__in=backend.match(terms)).annotate(
+        search_rank=backend.rank(terms)
+        + Value(settings.TRACK_SEARCH_POPULARITY_WEIGHT) * popularity
+    )
+
+
+class TrackSearchFilter(BaseFilterBackend):
+    """Full-text ``?search=`` over title, author, album and genres"""
+
+    search_param = api_settings.SEARCH_PARAM
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, "").strip()
+        if not query:
+            return queryset
+        return search_tracks(queryset, query)
+
+
+class TrackOrderingFilter(OrderingFilter):
+    """Search results are ordered by relevance unless ordering is given"""
+
+    def get_ordering(self, request, queryset, view):
+        if self.ordering_param not in request.query_params and (
+            "search_rank" in queryset.query.annotations
+        ):
+            return ("-search_rank", "-id")
+        return super().get_ordering(request, queryset, view)
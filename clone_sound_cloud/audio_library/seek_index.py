@@ -0,0 +1,149 @@
+import os
+import struct
+import wave
+
+import numpy as np
+
+from audio_library.metadata import (
+    find_first_frame,
+    parse_frame_header,
+    read_audio_metadata,
+)
+
+SEEK_INDEX_SUFFIX = ".seek"
+SEEK_INDEX_HEADER = struct.Struct("<4sBHI")
+SEEK_INDEX_MAGIC = b"SEEK"
+SEEK_INDEX_OFFSET = struct.Struct("<I")
+VERSION = 1
+
+# Time between index entries in milliseconds
+SEEK_INDEX_STEP = 100
+
+MP3_BLOCK_SIZE = 64 * 1024
+# Longest MPEG audio frame is 2881 bytes (layer II, 160 kbit/s, 8 kHz)
+FRAME_MARGIN = 4 * 1024
+
+
+def get_seek_index_path(audio_path):
+    """Seek index is stored next to the audio file"""
+    return f"{audio_path}{SEEK_INDEX_SUFFIX}"
+
+
+def scan_frame_offsets(f, metadata, step, block_size=MP3_BLOCK_SIZE):
+    """Offset of the frame playing at every ``step`` seconds, from frame headers.
+
+    The file is read a block at a time, so memory does not grow with it.
+    """
+    offsets = []
+    f.seek(metadata.audio_start)
+    base, data, offset = metadata.audio_start, f.read(block_size), 0
+    # Xing/Info frame carries no audio
+    if metadata.frames is not None:
+        offset += parse_frame_header(data).length
+    at_end = False
+    elapsed = next_time = 0.0
+    while True:
+        # Keep a whole frame and the next header in the buffer
+        while not at_end and len(data) - offset <= FRAME_MARGIN:
+            block = f.read(block_size)
+            at_end = not block
+            base += offset
+            data, offset = data[offset:] + block, 0
+        if offset >= len(data):
+            break
+        frame = parse_frame_header(data, offset)
+        if frame is None:
+            found, frame = find_first_frame(data, offset + 1)
+            if frame is None or not at_end and found > len(data) - FRAME_MARGIN:
+                if at_end:
+                    break
+                # Resync in the next block
+                offset = max(offset + 1, len(data) - FRAME_MARGIN)
+                continue
+            offset = found
+        frame_end = elapsed + frame.samples / frame.sample_rate
+        while next_time < frame_end:
+            offsets.append(base + offset)
+            next_time += step
+        elapsed = frame_end
+        offset += frame.length
+    return offsets
+
+
+def toc_offset(metadata, file_size, seconds):
+    """Byte offset estimated from Xing TOC, or from bitrate of CBR file"""
+    if metadata.toc and metadata.duration:
+        percent = min(max(seconds / metadata.duration * 100, 0), 99.999)
+        index = int(percent)
+        lower = metadata.toc[index]
+        upper = metadata.toc[index + 1] if index < 99 else 256
+        fraction = (lower + (upper - lower) * (percent - index)) / 256
+        return metadata.audio_start + int(fraction * (file_size - metadata.audio_start))
+    return metadata.audio_start + int(seconds * metadata.bitrate * 125)
+
+
+def build_seek_index(audio_path, step=SEEK_INDEX_STEP):
+    """Write time to byte offset table of MP3 file next to it"""
+    metadata = read_audio_metadata(audio_path)
+    with open(audio_path, "rb") as f:
+        offsets = scan_frame_offsets(f, metadata, step / 1000)
+    if len(offsets) < 2 and metadata.toc:
+        # Frames could not be walked (corrupt stream), fall back to the TOC
+        file_size = os.path.getsize(audio_path)
+        offsets = [
+            toc_offset(metadata, file_size, index * step / 1000)
+            for index in range(int(metadata.duration * 1000 // step) + 1)
+        ]
+
+    index_path = get_seek_index_path(audio_path)
+    tmp_path = f"{index_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(SEEK_INDEX_HEADER.pack(SEEK_INDEX_MAGIC, VERSION, step, len(offsets)))
+        f.write(np.asarray(offsets, "<u4").tobytes())
+    os.replace(tmp_path, index_path)
+    return index_path
+
+
+def lookup_seek_index(index_path, seconds):
+    """Read a single entry of seek index"""
+    with open(index_path, "rb") as f:
+        magic, version, step, count = SEEK_INDEX_HEADER.unpack(
+            f.read(SEEK_INDEX_HEADER.size)
+        )
+        if magic != SEEK_INDEX_MAGIC or version != VERSION or not count:
+            raise ValueError(f"{index_path} is not a seek index")
+        index = min(int(seconds * 1000 // step), count - 1)
+        f.seek(SEEK_INDEX_HEADER.size + SEEK_INDEX_OFFSET.size * index)
+        return SEEK_INDEX_OFFSET.unpack(f.read(SEEK_INDEX_OFFSET.size))[0]
+
+
+def wav_offset(audio_path, metadata, seconds):
+    """Offset of the PCM sample frame playing at ``seconds``"""
+    with wave.open(audio_path, "rb") as wav:
+        block_align = wav.getnchannels() * wav.getsampwidth()
+        frame = int(seconds * wav.getframerate())
+    return metadata.audio_start + frame * block_align
+
+
+def seek_offset(audio_path, seconds):
+    """Byte offset of the frame playing at ``seconds``.
+
+    WAV offsets are computed from the header. MP3 uses the seek index and,
+    until it is built, an estimate moved forward to the next frame boundary.
+    """
+    try:
+        return lookup_seek_index(get_seek_index_path(audio_path), seconds)
+    except (FileNotFoundError, ValueError):
+        pass
+
+    metadata = read_audio_metadata(audio_path)
+    file_size = os.path.getsize(audio_path)
+    if audio_path.lower().endswith(".wav"):
+        return min(wav_offset(audio_path, metadata, seconds), file_size)
+
+    offset = toc_offset(metadata, file_size, seconds)
+    with open(audio_path, "rb") as f:
+        f.seek(offset)
+        data = f.read(64 * 1024)
+    frame_offset, _ = find_first_frame(data)
+    return file_size if frame_offset is None else offset + frame_offset
@@ -0,0 +1,277 @@
+import json
+import logging
+import re
+import threading
+from itertools import islice
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count, F
+from django.db.models.signals import post_delete, post_save
+from django_redis import get_redis_connection
+
+from audio_library.models import Album, Genre, Track
+from base.services import load_backend
+from oauth.models import UserProfile
+
+logger = logging.getLogger(__name__)
+
+WORD_RE = re.compile(r"\w+")
+MAX_PREFIX_LENGTH = 20
+
+
+def get_words(text):
+    return WORD_RE.findall((text or "").lower())
+
+
+def get_prefixes(label):
+    return {
+        word[:length]
+        for word in get_words(label)
+        for length in range(1, min(len(word), MAX_PREFIX_LENGTH) + 1)
+    }
+
+
+def matches(query_words, label):
+    """Every query word starts some word of ``label``"""
+    words = get_words(label)
+    return all(any(word.startswith(term) for word in words) for term in query_words)
+
+
+def get_sources():
+    """``{kind: queryset of (id, label, score)}`` of suggested objects"""
+    return {
+        "track": Track.objects.filter(private=False).values_list(
+            "id", "title", F("plays_count") + F("likes_count")
+        ),
+        "author": UserProfile.objects.exclude(display_name=None)
+        .exclude(display_name="")
+        .values_list("user_id", "display_name", "followers_count")
+        .order_by(),
+        "album": Album.objects.filter(private=False)
+        .annotate(score=Count("track"))
+        .values_list("id", "name", "score"),
+        "genre": Genre.objects.annotate(score=Count("track_genres")).values_list(
+            "id", "name", "score"
+        ),
+    }
+
+
+def get_entries(kind, ids=None, chunk_size=1000):
+    """``(kind, id, label, score)`` of suggested objects, all when ``ids`` is None"""
+    queryset = get_sources()[kind]
+    if ids is not None:
+        id_field = "user_id" if kind == "author" else "id"
+        queryset = queryset.filter(**{f"{id_field}__in": ids})
+    for id_, label, score in queryset.iterator(chunk_size=chunk_size):
+        yield kind, id_, label, score
+
+
+class TrieNode:
+    __slots__ = ("children", "members")
+
+    def __init__(self):
+        self.children = {}
+        self.members = set()
+
+
+class LocalSuggestIndex:
+    """In-process prefix trie for tests and single process development.
+
+    Other processes do not share it. A background thread fills it when it
+    is created, at worker start, see ``AudioLibraryConfig.ready``; it then
+    follows changes made by this process and ``rebuild_suggestions``.
+    Lookups never read the database, they miss what is not loaded yet.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._root = TrieNode()
+        self._entries = {}
+        self.warm_thread = threading.Thread(
+            target=self.warm, name="suggest-index-warm", daemon=True
+        )
+        self.warm_thread.start()
+
+    def warm(self, chunk_size=1000):
+        try:
+            for kind in get_sources():
+                entries = get_entries(kind, chunk_size=chunk_size)
+                while chunk := list(islice(entries, chunk_size)):
+                    self.add(chunk)
+        except DatabaseError:
+            logger.warning("Suggest index not warmed", exc_info=True)
+        finally:
+            # The thread has its own connection
+            connection.close()
+
+    def _nodes(self, label):
+        for prefix in get_prefixes(label):
+            node = self._root
+            for char in prefix:
+                node = node.children.setdefault(char, TrieNode())
+            yield node
+
+    def add(self, entries):
+        with self._lock:
+            for kind, id_, label, score in entries:
+                member = f"{kind}:{id_}"
+                self._discard(member)
+                self._entries[member] = (kind, id_, label, score)
+                for node in self._nodes(label):
+                    node.members.add(member)
+
+    def remove(self, members):
+        with self._lock:
+            for member in members:
+                self._discard(member)
+
+    def _discard(self, member):
+        entry = self._entries.pop(member, None)
+        if entry is not None:
+            for node in self._nodes(entry[2]):
+                node.members.discard(member)
+
+    def clear(self):
+        with self._lock:
+            self._root = TrieNode()
+            self._entries = {}
+
+    def suggest(self, query_words, limit):
+        node = self._root
+        with self._lock:
+            for char in max(query_words, key=len)[:MAX_PREFIX_LENGTH]:
+                node = node.children.get(char)
+                if node is None:
+                    return []
+            entries = [self._entries[member] for member in node.members]
+        entries = [entry for entry in entries if matches(query_words, entry[2])]
+        entries.sort(key=lambda entry: -entry[3])
+        return [
+            {"type": kind, "id": id_, "label": label}
+            for kind, id_, label, _ in entries[:limit]
+        ]
+
+
+class RedisSuggestIndex:
+    """Sorted set of members by popularity per label word prefix.
+
+    Each set keeps only the ``max_members`` most popular members, so a lookup
+    is a single ``ZREVRANGE`` of bounded size followed by ``HMGET`` of labels.
+    """
+
+    key = "suggest"
+    max_members = 100
+
+    def __init__(self):
+        self.client = get_redis_connection("default")
+
+    def prefix_key(self, prefix):
+        return f"{self.key}:prefix:{prefix}"
+
+    def add(self, entries):
+        entries = {f"{entry[0]}:{entry[1]}": entry for entry in entries}
+        if not entries:
+            return
+        # Prefixes of the previous label are dropped first
+        self.remove(entries)
+        pipe = self.client.pipeline(transaction=False)
+        for member, (kind, id_, label, score) in entries.items():
+            pipe.hset(f"{self.key}:entries", member, json.dumps([kind, id_, label]))
+            for prefix in get_prefixes(label):
+                pipe.zadd(self.prefix_key(prefix), {member: score})
+                pipe.zremrangebyrank(self.prefix_key(prefix), 0, -self.max_members - 1)
+        pipe.execute()
+
+    def remove(self, members):
+        members = list(members)
+        if not members:
+            return
+        stored = self.client.hmget(f"{self.key}:entries", members)
+        pipe = self.client.pipeline(transaction=False)
+        for member, entry in zip(members, stored):
+            if entry is None:
+                continue
+            for prefix in get_prefixes(json.loads(entry)[2]):
+                pipe.zrem(self.prefix_key(prefix), member)
+        pipe.hdel(f"{self.key}:entries", *members)
+        pipe.execute()
+
+    def clear(self):
+        for key in self.client.scan_iter(f"{self.key}:*"):
+            self.client.delete(key)
+
+    def suggest(self, query_words, limit):
+        prefix = max(query_words, key=len)[:MAX_PREFIX_LENGTH]
+        members = self.client.zrevrange(self.prefix_key(prefix), 0, -1)
+        if not members:
+            return []
+        suggestions = []
+        for entry in self.client.hmget(f"{self.key}:entries", members):
+            if entry is None:
+                continue
+            kind, id_, label = json.loads(entry)
+            if matches(query_words, label):
+                suggestions.append({"type": kind, "id": id_, "label": label})
+                if len(suggestions) == limit:
+                    break
+        return suggestions
+
+
+def get_suggest_index():
+    return load_backend(settings.SUGGEST_INDEX)
+
+
+def index_suggestions(kind, ids):
+    """Add or refresh suggestions of objects, drop hidden or deleted ones"""
+    entries = list(get_entries(kind, ids))
+    found = {entry[1] for entry in entries}
+    index = get_suggest_index()
+    index.remove(f"{kind}:{id_}" for id_ in ids if id_ not in found)
+    index.add(entries)
+
+
+def remove_suggestions(kind, ids):
+    get_suggest_index().remove(f"{kind}:{id_}" for id_ in ids)
+
+
+def rebuild_suggestions(clear=False, chunk_size=1000):
+    """Index every suggested object again, refreshing popularity scores"""
+    index = get_suggest_index()
+    if clear:
+        index.clear()
+    indexed = 0
+    for kind in get_sources():
+        entries = get_entries(kind, chunk_size=chunk_size)
+        while chunk := list(islice(entries, chunk_size)):
+            index.add(chunk)
+            indexed += len(chunk)
+    return indexed
+
+
+def suggest(query, limit):
+    """Most popular tracks, authors, albums and genres matching ``query``.
+
+    Every word of the query must start a word of the label. Only the suggest
+    index is read, never the database.
+    """
+    query_words = get_words(query)
+    if not query_words:
+        return []
+    return get_suggest_index().suggest(query_words, limit)
+
+
+def track_suggestions(model, kind, id_attr="pk"):
+    """Keep suggestions of ``model`` objects in step with their rows"""
+    uid = f"suggest_{model._meta.label_lower}"
+
+    def post_save_receiver(sender, instance, **kwargs):
+        ids = [getattr(instance, id_attr)]
+        transaction.on_commit(lambda: index_suggestions(kind, ids))
+
+    def post_delete_receiver(sender, instance, **kwargs):
+        ids = [getattr(instance, id_attr)]
+        transaction.on_commit(lambda: remove_suggestions(kind, ids))
+
+    post_save.connect(post_save_receiver, model, weak=False, dispatch_uid=uid)
+    post_delete.connect(post_delete_receiver, model, weak=False, dispatch_uid=uid)
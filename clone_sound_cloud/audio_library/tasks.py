@@ -0,0 +1,88 @@
+from celery.signals import worker_shutting_down
+
+from config.celery import app
+
+from audio_library.blobs import delete_orphan_blobs
+from audio_library.counters import flush_track_counters
+from audio_library.history import flush_play_history
+from audio_library.metadata import get_track_metadata, save_track_metadata
+from audio_library.models import Track
+from audio_library.seek_index import build_seek_index
+from audio_library.suggest import rebuild_suggestions
+from audio_library.uploads import delete_expired_upload_sessions
+from audio_library.waveform import generate_waveform
+
+
+@app.task(bind=True, default_retry_delay=60)
+def flush_track_counters_celery_task(self):
+    try:
+        updated = flush_track_counters()
+    except Exception as exc:
+        raise self.retry(exc=exc, countdown=60)
+    return f"Updated {updated} tracks"
+
+
+@app.task(bind=True, default_retry_delay=60)
+def flush_play_history_celery_task(self):
+    try:
+        written = flush_play_history()
+    except Exception as exc:
+        raise self.retry(exc=exc, countdown=60)
+    return f"Written {written} played tracks"
+
+
+@app.task(bind=True, default_retry_delay=60, max_retries=3)
+def generate_waveform_celery_task(self, track_id):
+    track = Track.objects.filter(id=track_id).only("id", "file").first()
+    if track is None or not track.file:
+        return "Track not found"
+    try:
+        generate_waveform(track.file.path)
+    except Exception as exc:
+        raise self.retry(exc=exc, countdown=60)
+    return "Done"
+
+
+@app.task(bind=True, default_retry_delay=60, max_retries=3)
+def extract_track_metadata_celery_task(self, track_id):
+    track = Track.objects.filter(id=track_id).only("id", "file").first()
+    if track is None or not track.file:
+        return "Track not found"
+    try:
+        metadata = get_track_metadata(track.file.path)
+    except (OSError, ValueError) as exc:
+        raise self.retry(exc=exc, countdown=60)
+    save_track_metadata(track_id, metadata)
+    return "Done"
+
+
+@app.task(bind=True, default_retry_delay=60, max_retries=3)
+def build_seek_index_celery_task(self, track_id):
+    track = Track.objects.filter(id=track_id).only("id", "file").first()
+    if track is None or not track.file:
+        return "Track not found"
+    if not track.file.name.lower().endswith(".mp3"):
+        return "Seek offsets of WAV are computed from its header"
+    try:
+        build_seek_index(track.file.path)
+    except (OSError, ValueError) as exc:
+        raise self.retry(exc=exc, countdown=60)
+    return "Done"
+
+
+@app.task
+def rebuild_suggest_index_celery_task():
+    # Plays and likes are counted without saving tracks, scores drift
+    return f"Indexed {rebuild_suggestions()} suggestions"
+
+
+@app.task
+def delete_expired_upload_sessions_celery_task():
+    sessions = delete_expired_upload_sessions()
+    return f"Deleted {sessions} upload sessions, {delete_orphan_blobs()} orphan blobs"
+
+
+@worker_shutting_down.connect
+def flush_on_worker_shutting_down(**kwargs):
+    flush_track_counters()
+    flush_play_history()
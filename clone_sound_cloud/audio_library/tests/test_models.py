@@ -1,8 +1,24 @@
+import os
+import shutil
+import struct
 import tempfile
+import time
+import wave
 
-from django.test import TestCase
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
 
 from audio_library import models
+from audio_library.blobs import delete_blob_files, delete_orphan_blobs
+from audio_library.metadata import get_track_metadata, read_audio_metadata
+from audio_library.seek_index import (
+    build_seek_index,
+    scan_frame_offsets,
+    seek_offset,
+)
 from oauth.tests.test_models import create_user
 
 
@@ -40,6 +56,24 @@ def create_file(format_="jpg"):
     return tempfile.NamedTemporaryFile(suffix=f".{format_}").name
 
 
+# MPEG-1 layer III, 128 kbps, 44100 Hz, stereo: 417 bytes and 1152 samples
+MP3_FRAME_HEADER = b"\xff\xfb\x90\x00"
+MP3_FRAME_LENGTH = 417
+
+
+def create_mp3(path, frames=100, xing_frames=None):
+    data = b""
+    if xing_frames is not None:
+        xing = b"Xing" + struct.pack(">II", 0x1, xing_frames)
+        data += MP3_FRAME_HEADER + bytes(32) + xing
+        data += bytes(MP3_FRAME_LENGTH - len(data))
+    data += (MP3_FRAME_HEADER + bytes(MP3_FRAME_LENGTH - 4)) * frames
+    id3 = b"ID3\x03\x00\x00\x00\x00\x00\x0a" + bytes(10)
+    with open(path, "wb") as f:
+        f.write(id3 + data)
+    return path
+
+
 class AudioLibraryTests(TestCase):
     def setUp(self):
         self.user1 = create_user(is_active=True)
@@ -153,3 +187,176 @@ class AudioLibraryTests(TestCase):
         self.assertEqual(
             self.playlist.__str__(), f"{self.playlist.user} - {self.playlist.title}"
         )
+
+
+class AudioMetadataTests(TestCase):
+    def test_wav_metadata(self):
+        path = create_file("wav")
+        with wave.open(path, "wb") as wav:
+            wav.setnchannels(2)
+            wav.setsampwidth(2)
+            wav.setframerate(22050)
+            wav.writeframes(bytes(22050 * 2 * 2 * 3))
+
+        self.assertEqual(
+            get_track_metadata(path),
+            {"duration": 3.0, "bitrate": 706, "sample_rate": 22050, "channels": 2},
+        )
+
+    def test_cbr_mp3_metadata(self):
+        path = create_mp3(create_file("mp3"), frames=100)
+        metadata = read_audio_metadata(path)
+
+        self.assertEqual(metadata.audio_start, 20)
+        self.assertEqual(metadata.bitrate, 128)
+        self.assertEqual(metadata.sample_rate, 44100)
+        self.assertEqual(metadata.channels, 2)
+        self.assertAlmostEqual(metadata.duration, 100 * 1152 / 44100, places=1)
+
+    def test_xing_mp3_metadata(self):
+        path = create_mp3(create_file("mp3"), frames=10, xing_frames=1000)
+        metadata = read_audio_metadata(path)
+
+        self.assertEqual(metadata.frames, 1000)
+        self.assertAlmostEqual(metadata.duration, 1000 * 1152 / 44100)
+
+    def test_not_audio_file(self):
+        path = create_file("mp3")
+        with open(path, "wb") as f:
+            f.write(b"not an audio file")
+
+        with self.assertRaises(ValueError):
+            read_audio_metadata(path)
+
+
+class SeekIndexTests(TestCase):
+    frame_duration = 1152 / 44100
+
+    def test_build_seek_index(self):
+        path = create_mp3(create_file("mp3"), frames=100, xing_frames=100)
+        build_seek_index(path)
+        first_frame = 20 + MP3_FRAME_LENGTH
+
+        self.assertEqual(seek_offset(path, 0), first_frame)
+        self.assertEqual(
+            seek_offset(path, 1.0),
+            first_frame + int(1.0 // self.frame_duration) * MP3_FRAME_LENGTH,
+        )
+        # Past the end the last indexed frame is returned
+        self.assertEqual(seek_offset(path, 60), first_frame + 99 * MP3_FRAME_LENGTH)
+
+    def test_scan_frame_offsets_in_blocks(self):
+        path = create_mp3(create_file("mp3"), frames=100)
+        frame = MP3_FRAME_HEADER + bytes(MP3_FRAME_LENGTH - 4)
+        with open(path, "ab") as f:
+            # Junk longer than a block, frames resume after it
+            f.write(bytes(10000) + frame * 10)
+        metadata = read_audio_metadata(path)
+
+        with open(path, "rb") as f:
+            whole = scan_frame_offsets(f, metadata, 0.1, block_size=10**6)
+            blocks = scan_frame_offsets(f, metadata, 0.1, block_size=1000)
+
+        self.assertEqual(blocks, whole)
+        self.assertEqual(len(blocks), int(110 * self.frame_duration / 0.1) + 1)
+        self.assertGreater(blocks[-1], 20 + 100 * MP3_FRAME_LENGTH + 10000)
+
+    def test_seek_offset_without_index_is_frame_boundary(self):
+        path = create_mp3(create_file("mp3"), frames=100)
+        offset = seek_offset(path, 1.0)
+        frames = (offset - 20) // MP3_FRAME_LENGTH
+
+        self.assertEqual((offset - 20) % MP3_FRAME_LENGTH, 0)
+        self.assertLessEqual(abs(frames - 1.0 / self.frame_duration), 1)
+
+    def test_seek_offset_wav(self):
+        path = create_file("wav")
+        with wave.open(path, "wb") as wav:
+            wav.setnchannels(2)
+            wav.setsampwidth(2)
+            wav.setframerate(8000)
+            wav.writeframes(bytes(8000 * 4 * 3))
+
+        self.assertEqual(seek_offset(path, 1.5), 44 + 12000 * 4)
+
+
+class MediaBlobTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = create_user(is_active=True)
+        self.license = models.License.objects.create(user=self.user, text="test")
+
+    def create_track(self, content, name="t1.mp3"):
+        return models.Track.objects.create(
+            user=self.user,
+            license=self.license,
+            file=SimpleUploadedFile(name, content),
+            title="t1",
+        )
+
+    def test_same_content_is_stored_once(self):
+        track1 = self.create_track(b"audio")
+        track2 = self.create_track(b"audio", name="other.mp3")
+
+        self.assertEqual(track1.file.name, track2.file.name)
+        self.assertTrue(track1.file.name.startswith("blobs/"))
+        self.assertEqual(
+            models.MediaBlob.objects.get(name=track1.file.name).ref_count, 2
+        )
+
+    def test_blob_deleted_with_last_reference(self):
+        track1 = self.create_track(b"audio")
+        track2 = self.create_track(b"audio")
+        path = track1.file.path
+
+        with self.captureOnCommitCallbacks(execute=True):
+            track1.delete()
+        self.assertTrue(os.path.exists(path))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            track2.delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(models.MediaBlob.objects.exists())
+
+    def test_replaced_file_is_released(self):
+        track = self.create_track(b"audio")
+        old_path = track.file.path
+
+        with self.captureOnCommitCallbacks(execute=True):
+            track.file = SimpleUploadedFile("t2.mp3", b"new audio")
+            track.save()
+
+        self.assertFalse(os.path.exists(old_path))
+        self.assertEqual(
+            list(models.MediaBlob.objects.values_list("name", flat=True)),
+            [track.file.name],
+        )
+
+    def test_blob_referenced_again_is_kept(self):
+        track = self.create_track(b"audio")
+
+        self.assertFalse(delete_blob_files(track.file.name))
+        self.assertTrue(os.path.exists(track.file.path))
+
+    def test_orphan_blobs_deleted(self):
+        track = self.create_track(b"audio")
+        # Saved by a request rolled back before its reference was committed
+        orphan = default_storage.save("track/t2.mp3", ContentFile(b"orphan"))
+        recent = default_storage.save("track/t3.mp3", ContentFile(b"recent"))
+        old = time.time() - settings.MEDIA_BLOB_ORPHAN_AGE - 60
+        for name in (track.file.name, orphan):
+            os.utime(default_storage.path(name), (old, old))
+
+        self.assertEqual(delete_orphan_blobs(), 1)
+        self.assertFalse(default_storage.exists(orphan))
+        self.assertTrue(default_storage.exists(recent))
+        self.assertTrue(os.path.exists(track.file.path))
+        self.assertEqual(
+            list(models.MediaBlob.objects.values_list("name", flat=True)),
+            [track.file.name],
+        )
@@ -1,14 +1,69 @@
-from django.test import TestCase
+import hashlib
+import json
+import os
+import shutil
+import struct
+import tempfile
+import time
+import wave
+from io import StringIO
+from datetime import timedelta
+
+import numpy as np
+
+from cachalot.api import cachalot_disabled
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import OuterRef, Subquery
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django_redis import get_redis_connection
 
 from rest_framework.reverse import reverse
-from rest_framework.test import APIClient
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
 
+from oauth.models import SocialLink, UserFollowing, UserProfile
 from oauth.tests.test_views import create_user
 
 from audio_library import models
 from audio_library.api import serializers
+from audio_library.api.views import TrackListView
+from audio_library.counters import (
+    flush_track_counters,
+    get_counter_buffer,
+    incr_track_counter,
+)
+from audio_library.history import flush_play_history, get_history_queue, record_play
+from audio_library.metadata import save_track_metadata
+from audio_library.search import search_tracks
+from audio_library.suggest import (
+    LocalSuggestIndex,
+    get_suggest_index,
+    rebuild_suggestions,
+)
+from audio_library.uploads import delete_expired_upload_sessions
+from audio_library.waveform import (
+    compute_peaks,
+    generate_waveform,
+    pcm_to_amplitudes,
+    peak_levels,
+    read_wav_peaks,
+)
+from base.cache import bump_version, estimate_rows, get_response_key, get_version
+from base.cache_stats import get_cache_stats
+from base.services import incr_counter
+from base.testing import QueryCountTestMixin, clear_caches
+from base.tiered_cache import CHANNEL, TieredCache
 from audio_library.tests.test_models import (
+    MP3_FRAME_HEADER,
+    MP3_FRAME_LENGTH,
     create_file,
+    create_mp3,
     create_playlist,
     create_comment,
     create_track,
@@ -17,6 +72,8 @@ from audio_library.tests.test_models import (
 
 class PublicTestAudioLibraryViews(TestCase):
     def setUp(self):
+        # Cached responses of earlier tests outlive their rows
+        clear_caches()
         self.client = APIClient()
         self.user1 = create_user(is_active=True)
         self.user2 = create_user(is_active=True, email="test2@gmail.com")
@@ -61,6 +118,7 @@ class PublicTestAudioLibraryViews(TestCase):
         self.assertEqual(res.status_code, 200)
         self.assertNotEquals(res.json, None)
         self.assertEqual(len(res.data), 1)
+        self.assertIn("total_duration", res.data[0])
 
     def test_list_track(self):
         res = self.client.get(reverse("audio:track_list"))
@@ -68,6 +126,191 @@ class PublicTestAudioLibraryViews(TestCase):
         self.assertEqual(res.status_code, 200)
         self.assertNotEqual(res.json, None)
 
+    def test_list_track_compact_author(self):
+        self.client.force_authenticate(self.user2)
+        self.client.post(reverse("oauth:author_follow_unfollow", [self.user1.id]))
+
+        res = self.client.get(reverse("audio:track_list"))
+        author = res.data["results"][0]["user"]
+
+        self.assertEqual(
+            set(author),
+            {"id", "display_name", "avatar", "followers_count", "following_count"},
+        )
+        self.assertEqual(author["followers_count"], 1)
+        self.assertEqual(author["following_count"], 0)
+
+    def test_list_track_duration_filter(self):
+        models.Track.objects.filter(id=self.track.id).update(duration=180)
+
+        res_long = self.client.get(reverse("audio:track_list"), {"duration__gte": 120})
+        res_short = self.client.get(reverse("audio:track_list"), {"duration__lte": 120})
+
+        self.assertEqual(len(res_long.data["results"]), 1)
+        self.assertEqual(len(res_short.data["results"]), 0)
+
+    def test_list_track_facets(self):
+        clear_caches()
+        with self.captureOnCommitCallbacks(execute=True):
+            track = create_track(
+                user=self.user1,
+                license_=self.license,
+                genre=self.genre1,
+                album=self.album,
+                cover=create_file(),
+                file=create_file("mp3"),
+            )
+            track.genre.add(self.genre2)
+        models.Track.objects.filter(id=self.track.id).update(duration=60)
+        models.Track.objects.filter(id=track.id).update(duration=400)
+
+        res = self.client.get(
+            reverse("audio:track_list"),
+            {"facets": "genre,license,duration_bucket", "genre__name": "g1"},
+        )
+
+        self.assertEqual(len(res.data["results"]), 2)
+        self.assertEqual(
+            res.data["facets"]["genre"],
+            [{"value": "g1", "count": 2}, {"value": "g2", "count": 1}],
+        )
+        self.assertEqual(res.data["facets"]["license"][0]["count"], 2)
+        self.assertEqual(
+            res.data["facets"]["duration_bucket"],
+            [{"value": "short", "count": 1}, {"value": "long", "count": 1}],
+        )
+
+    def test_list_track_facets_cached_per_filters(self):
+        clear_caches()
+        url = reverse("audio:track_list")
+
+        self.client.get(url, {"facets": "genre"})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.track.genre.add(self.genre2)
+        res = self.client.get(url, {"facets": "genre", "cursor": ""})
+        filtered = self.client.get(
+            url, {"facets": "genre", "duration_bucket": "very_long"}
+        )
+
+        self.assertEqual(len(res.data["facets"]["genre"]), 2)
+        self.assertEqual(filtered.data["facets"]["genre"], [])
+
+    def test_list_track_unknown_facet(self):
+        res = self.client.get(reverse("audio:track_list"), {"facets": "genre,mood"})
+
+        self.assertEqual(res.status_code, 400)
+
+    def test_list_track_keyset_pages(self):
+        tracks = [self.track] + [
+            create_track(
+                user=self.user1,
+                license_=self.license,
+                genre=self.genre1,
+                album=self.album,
+                cover=create_file(),
+                file=create_file("mp3"),
+                title=f"t{i}",
+            )
+            for i in range(4)
+        ]
+        # Equal timestamps are ordered by id
+        models.Track.objects.update(create_at=timezone.now())
+
+        res = self.client.get(reverse("audio:track_list"), {"page_size": 2})
+        ids = [track["id"] for track in res.data["results"]]
+        while res.data["next"]:
+            res = self.client.get(res.data["next"])
+            ids += [track["id"] for track in res.data["results"]]
+        previous = self.client.get(res.data["previous"])
+
+        self.assertEqual(ids, sorted((track.id for track in tracks), reverse=True))
+        self.assertEqual(
+            [track["id"] for track in previous.data["results"]], ids[-3:-1]
+        )
+
+    def test_list_track_keyset_nullable_ordering(self):
+        models.Track.objects.filter(id=self.track.id).update(duration=10)
+        track = create_track(
+            user=self.user1,
+            license_=self.license,
+            genre=self.genre1,
+            album=self.album,
+            cover=create_file(),
+            file=create_file("mp3"),
+        )
+
+        res = self.client.get(
+            reverse("audio:track_list"), {"ordering": "-duration", "page_size": 1}
+        )
+        next_res = self.client.get(res.data["next"])
+
+        self.assertEqual(res.data["results"][0]["id"], self.track.id)
+        self.assertEqual(next_res.data["results"][0]["id"], track.id)
+        self.assertIsNone(next_res.data["next"])
+
+    def test_list_track_invalid_cursor(self):
+        res = self.client.get(reverse("audio:track_list"), {"cursor": "forged"})
+
+        self.assertEqual(res.status_code, 404)
+
+    # Whole responses are always rebuilt, only the count is cached
+    @override_settings(RESPONSE_CACHE_TIMEOUT=0)
+    def test_list_track_page_number_cached_count(self):
+        clear_caches()
+        url = reverse("audio:track_list")
+        params = {"page": 1, "title": self.track.title}
+
+        res = self.client.get(url, params)
+        with cachalot_disabled(), CaptureQueriesContext(connection) as queries:
+            cached = self.client.get(url, params)
+        with self.captureOnCommitCallbacks(execute=True):
+            create_track(
+                user=self.user1,
+                license_=self.license,
+                genre=self.genre1,
+                album=self.album,
+                cover=create_file(),
+                file=create_file("mp3"),
+                title=self.track.title,
+            )
+        fresh = self.client.get(url, params)
+
+        self.assertEqual(res.data["count"], 1)
+        self.assertTrue(res.data["count_exact"])
+        self.assertEqual(cached.data["count"], 1)
+        self.assertFalse(any("COUNT(" in query["sql"] for query in queries))
+        self.assertEqual(fresh.data["count"], 2)
+
+    @override_settings(PAGINATION_ESTIMATE_THRESHOLD=1)
+    def test_list_track_page_number_count_excludes_private_tracks(self):
+        clear_caches()
+        with self.captureOnCommitCallbacks(execute=True):
+            models.Track.objects.create(
+                user=self.user1,
+                license=self.license,
+                file=create_file("mp3"),
+                title="hidden",
+                private=True,
+            )
+
+        res = self.client.get(reverse("audio:track_list"), {"page": 1})
+
+        self.assertEqual(res.data["count"], 1)
+        self.assertEqual(len(res.data["results"]), 1)
+
+    def test_estimate_rows(self):
+        clear_caches()
+        models.Track.objects.create(
+            user=self.user1,
+            license=self.license,
+            file=create_file("mp3"),
+            title="hidden",
+            private=True,
+        )
+
+        self.assertEqual(estimate_rows(models.Track.objects.all()), 2)
+        self.assertIsNone(estimate_rows(models.Track.objects.filter(private=False)))
+
     def test_author_track_list(self):
         res = self.client.get(reverse("audio:author_track_list", [self.user1.id]))
 
@@ -80,7 +323,7 @@ class PublicTestAudioLibraryViews(TestCase):
         s1 = serializers.CommentSerializer(self.comment)
         self.assertEqual(res.status_code, 200)
         self.assertNotEqual(res.json, None)
-        self.assertIn(s1.data, res.data)
+        self.assertIn(s1.data, res.data["results"])
 
     # Permission required
     def test_list_license_unauthorized(self):
@@ -238,6 +481,7 @@ class PublicTestAudioLibraryViews(TestCase):
 
 class PrivateTestAudioLibraryViews(TestCase):
     def setUp(self):
+        clear_caches()
         self.client = APIClient()
         self.user1 = create_user(is_active=True)
         self.user2 = create_user(is_active=True, email="test2@gmail.com")
@@ -401,8 +645,75 @@ class PrivateTestAudioLibraryViews(TestCase):
     def test_like_track_user(self):
         self.client.force_authenticate(self.user2)
         res = self.client.post(reverse("audio:track_like", [self.track.id]))
+        self.track.refresh_from_db()
 
         self.assertEqual(res.status_code, 201)
+        self.assertEqual(self.track.likes_count, 1)
+
+    def test_comment_counter(self):
+        self.client.force_authenticate(self.user2)
+        res = self.client.post(
+            reverse("audio:comments"), {"text": "c1", "track": self.track.id}
+        )
+        self.track.refresh_from_db()
+        self.assertEqual(self.track.comments_count, 1)
+
+        self.client.delete(reverse("audio:comments_detail", [res.data["id"]]))
+        self.track.refresh_from_db()
+        self.assertEqual(self.track.comments_count, 0)
+
+    def test_comment_counter_follows_moved_comment(self):
+        other = create_track(
+            user=self.user1,
+            license_=self.license,
+            genre=self.genre1,
+            album=self.album,
+            cover=None,
+            file=create_file("mp3"),
+            title="t3",
+        )
+        self.client.force_authenticate(self.user2)
+        res = self.client.post(
+            reverse("audio:comments"), {"text": "c1", "track": self.track.id}
+        )
+
+        self.client.put(
+            reverse("audio:comments_detail", [res.data["id"]]),
+            {"text": "c1", "track": other.id},
+        )
+        self.track.refresh_from_db()
+        other.refresh_from_db()
+
+        self.assertEqual(self.track.comments_count, 0)
+        self.assertEqual(other.comments_count, 1)
+
+    def test_author_fragments_follow_tracks_count(self):
+        UserProfile.objects.filter(user=self.user1).update(tracks_count=1)
+        self.client.force_authenticate(self.user1)
+        self.client.get(reverse("oauth:author"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse("audio:track_detail", [self.track.id]))
+        res = self.client.get(reverse("oauth:author"))
+
+        profiles = {
+            author["id"]: author["user_profile"] for author in res.data["results"]
+        }
+        self.assertEqual(profiles[self.user1.id]["tracks_count"], 0)
+
+    def test_recompute_counters(self):
+        UserFollowing.objects.create(user=self.user2, following_user=self.user1)
+        self.track.user_of_likes.add(self.user2)
+
+        call_command("recompute_counters", workers=1, stdout=StringIO())
+        self.track.refresh_from_db()
+        profile = self.user1.user_profile
+        profile.refresh_from_db()
+
+        self.assertEqual(self.track.comments_count, 1)
+        self.assertEqual(self.track.likes_count, 1)
+        self.assertEqual(profile.followers_count, 1)
+        self.assertEqual(profile.tracks_count, 1)
 
     def test_delete_like_track_user(self):
         self.client.force_authenticate(self.user2)
@@ -412,6 +723,23 @@ class PrivateTestAudioLibraryViews(TestCase):
 
         self.assertEqual(res.status_code, 204)
 
+    def test_repeated_like_and_unlike_count_once(self):
+        self.client.force_authenticate(self.user2)
+        url = reverse("audio:track_like", [self.track.id])
+
+        self.client.post(url)
+        again = self.client.post(url)
+        self.track.refresh_from_db()
+        liked = self.track.likes_count
+        self.client.delete(url)
+        unliked = self.client.delete(url)
+        self.track.refresh_from_db()
+
+        self.assertEqual(again.status_code, 400)
+        self.assertEqual(liked, 1)
+        self.assertEqual(unliked.status_code, 403)
+        self.assertEqual(self.track.likes_count, 0)
+
     def test_like_author_track(self):
         self.client.force_authenticate(self.user1)
         res = self.client.post(reverse("audio:track_like", [self.track.id]))
@@ -497,3 +825,1054 @@ class PrivateTestAudioLibraryViews(TestCase):
     #         reverse('audio:playlist_detail', [self.playlist.id]))
     #
     #     self.assertEqual(res.status_code, 204)
+
+
+class StreamingTrackViewsTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            TRACK_COUNTER_BUFFER="audio_library.counters.LocalCounterBuffer",
+            PLAY_HISTORY_QUEUE="audio_library.history.LocalHistoryQueue",
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        clear_caches()
+        get_counter_buffer().drain()
+        # Left over counts would be flushed at exit, after the test database
+        self.addCleanup(get_counter_buffer().drain)
+        get_history_queue().pop_batch(settings.PLAY_HISTORY_MAX_LENGTH)
+
+        self.client = APIClient()
+        self.user1 = create_user(is_active=True)
+        self.user2 = create_user(is_active=True, email="test2@gmail.com")
+        self.license = models.License.objects.create(user=self.user1, text="test")
+        self.content = bytes(range(256)) * 40
+        os.makedirs(os.path.join(self.media_root, "track"))
+        with open(os.path.join(self.media_root, "track", "t1.mp3"), "wb") as f:
+            f.write(self.content)
+        self.track = models.Track.objects.create(
+            user=self.user1, license=self.license, file="track/t1.mp3", title="t1"
+        )
+
+    def get_stream(self, data=None, **headers):
+        res = self.client.get(
+            reverse("audio:stream_track", [self.track.id]), data, headers=headers
+        )
+        return res, b"".join(res.streaming_content) if res.streaming else b""
+
+    def test_stream_full_track(self):
+        res, body = self.get_stream()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res["Accept-Ranges"], "bytes")
+        self.assertEqual(body, self.content)
+
+    def test_stream_single_range(self):
+        res, body = self.get_stream(Range="bytes=100-199")
+
+        self.assertEqual(res.status_code, 206)
+        self.assertEqual(res["Content-Range"], f"bytes 100-199/{len(self.content)}")
+        self.assertEqual(res["Content-Length"], "100")
+        self.assertEqual(body, self.content[100:200])
+
+    def test_stream_suffix_range(self):
+        res, body = self.get_stream(Range="bytes=-10")
+
+        self.assertEqual(res.status_code, 206)
+        self.assertEqual(body, self.content[-10:])
+
+    def test_stream_multi_range(self):
+        res, body = self.get_stream(Range="bytes=0-9,20-29")
+
+        self.assertEqual(res.status_code, 206)
+        self.assertTrue(res["Content-Type"].startswith("multipart/byteranges"))
+        self.assertEqual(int(res["Content-Length"]), len(body))
+        self.assertIn(self.content[0:10], body)
+        self.assertIn(self.content[20:30], body)
+
+    def test_stream_unsatisfiable_range(self):
+        res, body = self.get_stream(Range=f"bytes={len(self.content)}-")
+
+        self.assertEqual(res.status_code, 416)
+        self.assertEqual(res["Content-Range"], f"bytes */{len(self.content)}")
+
+    def test_stream_if_range_mismatch_returns_full_track(self):
+        res, body = self.get_stream(
+            Range="bytes=0-9", If_Range="Wed, 21 Oct 2015 07:28:00 GMT"
+        )
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(body, self.content)
+
+    def test_stream_counts_play_once_per_session(self):
+        self.get_stream()
+        self.get_stream(Range="bytes=100-")
+        self.get_stream(Range="bytes=500-")
+        flush_track_counters()
+        self.track.refresh_from_db()
+
+        self.assertEqual(self.track.plays_count, 1)
+
+    def test_download_range(self):
+        res = self.client.get(
+            reverse("audio:download_track", [self.track.id]),
+            headers={"Range": "bytes=10-19"},
+        )
+        body = b"".join(res.streaming_content)
+        flush_track_counters()
+        self.track.refresh_from_db()
+
+        self.assertEqual(res.status_code, 206)
+        self.assertEqual(body, self.content[10:20])
+        self.assertIn("attachment", res["Content-Disposition"])
+        self.assertEqual(self.track.download, 1)
+
+    def test_stream_seek_to_time(self):
+        create_mp3(self.track.file.path, frames=100)
+        size = os.path.getsize(self.track.file.path)
+        res, body = self.get_stream({"t": 1})
+        start = size - len(body)
+
+        self.assertEqual(res.status_code, 206)
+        self.assertEqual(res["Content-Range"], f"bytes {start}-{size - 1}/{size}")
+        self.assertEqual((start - 20) % MP3_FRAME_LENGTH, 0)
+        self.assertTrue(body.startswith(MP3_FRAME_HEADER))
+
+    def test_stream_range_wins_over_seek_time(self):
+        res, body = self.get_stream({"t": 1}, Range="bytes=0-9")
+
+        self.assertEqual(res.status_code, 206)
+        self.assertEqual(body, self.content[:10])
+
+    def test_stream_invalid_seek_time(self):
+        res, _ = self.get_stream({"t": "-1"})
+        flush_track_counters()
+        self.track.refresh_from_db()
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(self.track.plays_count, 0)
+        # The rejected request opened no listening session
+        self.get_stream()
+        flush_track_counters()
+        self.track.refresh_from_db()
+        self.assertEqual(self.track.plays_count, 1)
+
+    def test_stream_track_nginx_backend(self):
+        with override_settings(
+            SENDFILE_BACKEND="base.sendfile.NginxBackend",
+            SENDFILE_ROOT=self.media_root,
+        ):
+            res = self.client.get(reverse("audio:stream_track", [self.track.id]))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res["X-Accel-Redirect"], "/protected-media/track/t1.mp3")
+        self.assertEqual(res.content, b"")
+
+    def test_stream_play_is_buffered_until_flush(self):
+        self.get_stream()
+        self.track.refresh_from_db()
+
+        self.assertEqual(self.track.plays_count, 0)
+
+    def test_local_counter_buffer_flushed_at_exit(self):
+        buffer = get_counter_buffer()
+        incr_track_counter(self.track.id, "plays_count", 2)
+        buffer.flush_at_exit()
+        self.track.refresh_from_db()
+
+        self.assertEqual(self.track.plays_count, 2)
+        self.assertEqual(buffer.drain(), {})
+
+    def test_redis_counter_buffer_flush(self):
+        with override_settings(
+            TRACK_COUNTER_BUFFER="audio_library.counters.RedisCounterBuffer"
+        ):
+            for _ in range(3):
+                incr_track_counter(self.track.id, "plays_count")
+            incr_track_counter(self.track.id, "download")
+            flush_track_counters()
+        self.track.refresh_from_db()
+
+        self.assertEqual(self.track.plays_count, 3)
+        self.assertEqual(self.track.download, 1)
+
+    def test_stream_records_played_track_on_flush(self):
+        self.client.force_authenticate(self.user2)
+        self.get_stream()
+
+        self.assertFalse(models.PlayedUserTrack.objects.exists())
+
+        flush_play_history()
+        played = models.PlayedUserTrack.objects.get(user=self.user2)
+
+        self.assertEqual(played.track, self.track)
+
+    def test_flush_play_history_upserts_latest_play(self):
+        record_play(self.user2.id, self.track.id)
+        flush_play_history()
+        first_played_at = models.PlayedUserTrack.objects.get().played_at
+        record_play(self.user2.id, self.track.id)
+        record_play(self.user2.id, self.track.id)
+        flush_play_history(batch_size=1)
+        played = models.PlayedUserTrack.objects.get()
+
+        self.assertGreater(played.played_at, first_played_at)
+
+    def test_flush_play_history_keeps_newer_play(self):
+        record_play(self.user2.id, self.track.id)
+        flush_play_history()
+        played_at = models.PlayedUserTrack.objects.get().played_at
+        # An older event pushed back after a failed flush
+        get_history_queue().push(
+            {
+                "user_id": self.user2.id,
+                "track_id": self.track.id,
+                "played_at": (played_at - timedelta(minutes=5)).isoformat(),
+            }
+        )
+        flush_play_history()
+
+        self.assertEqual(models.PlayedUserTrack.objects.get().played_at, played_at)
+
+    def test_stream_if_none_match_not_modified(self):
+        res, body = self.get_stream()
+        res, body = self.get_stream(If_None_Match=res["ETag"])
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(body, b"")
+
+    def test_stream_if_modified_since_not_modified(self):
+        res, body = self.get_stream()
+        res, body = self.get_stream(If_Modified_Since=res["Last-Modified"])
+
+        self.assertEqual(res.status_code, 304)
+
+    def test_track_cover_validators(self):
+        with open(os.path.join(self.media_root, "track", "c1.jpg"), "wb") as f:
+            f.write(b"cover")
+        self.track.cover = "track/c1.jpg"
+        self.track.save()
+        url = reverse("audio:track_cover", [self.track.id])
+
+        res = self.client.get(url)
+        res_cached = self.client.get(url, headers={"If-None-Match": res["ETag"]})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(b"".join(res.streaming_content), b"cover")
+        self.assertEqual(res_cached.status_code, 304)
+
+    def test_track_cover_missing(self):
+        res = self.client.get(reverse("audio:track_cover", [self.track.id]))
+
+        self.assertEqual(res.status_code, 404)
+
+    def test_stream_author_track_not_author(self):
+        self.client.force_authenticate(self.user2)
+        res = self.client.get(reverse("audio:stream_author_track", [self.track.id]))
+
+        self.assertEqual(res.status_code, 403)
+
+
+class TrackWaveformViewTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client = APIClient()
+        self.user1 = create_user(is_active=True)
+        self.license = models.License.objects.create(user=self.user1, text="test")
+        path = os.path.join(self.media_root, "t1.wav")
+        samples = np.zeros(8192, "<i2")
+        samples[4096:4106] = 16384
+        with wave.open(path, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(8000)
+            wav.writeframes(samples.tobytes())
+        self.track = models.Track.objects.create(
+            user=self.user1, license=self.license, file="t1.wav", title="t1"
+        )
+        self.url = reverse("audio:track_waveform", [self.track.id])
+
+    def test_compute_peaks_levels(self):
+        levels = compute_peaks(np.linspace(0, 1, 4096 * 3, dtype=np.float32))
+
+        self.assertEqual(sorted(levels), [256, 1024, 4096])
+        self.assertEqual(levels[256].max(), 32767)
+        self.assertTrue((np.diff(levels[1024]) >= 0).all())
+
+    def test_wav_peaks_read_in_blocks(self):
+        path = self.track.file.path
+        with wave.open(path, "rb") as wav:
+            amplitudes = pcm_to_amplitudes(wav.readframes(wav.getnframes()), 2, 1)
+        expected = compute_peaks(amplitudes, (8, 16))
+
+        for block_frames in (1, 1000, 10**6):
+            levels = peak_levels(read_wav_peaks(path, 16, block_frames), (8, 16))
+            self.assertEqual(
+                {r: level.tolist() for r, level in levels.items()},
+                {r: level.tolist() for r, level in expected.items()},
+            )
+
+    def test_waveform_not_generated(self):
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, 404)
+
+    def test_waveform_int8(self):
+        generate_waveform(self.track.file.path)
+        res = self.client.get(self.url, {"resolution": 256})
+        magic, version, bits, count = struct.unpack_from("<2sBBI", res.content)
+        peaks = np.frombuffer(res.content, "<i1", count, 8)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual((magic, bits, count), (b"WF", 8, 256))
+        self.assertEqual(peaks.max(), 64)
+        self.assertEqual(peaks[128], 64)
+        self.assertIn("max-age", res["Cache-Control"])
+
+    def test_waveform_int16_not_modified(self):
+        generate_waveform(self.track.file.path)
+        res = self.client.get(self.url, {"bits": 16})
+        res_cached = self.client.get(
+            self.url, {"bits": 16}, headers={"If-None-Match": res["ETag"]}
+        )
+
+        self.assertEqual(len(res.content), 8 + 2 * 1024)
+        self.assertEqual(res_cached.status_code, 304)
+
+    def test_waveform_invalid_bits(self):
+        res = self.client.get(self.url, {"bits": 12})
+
+        self.assertEqual(res.status_code, 400)
+
+
+class UploadSessionViewsTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            UPLOAD_SESSION_ROOT=os.path.join(self.media_root, "uploads"),
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client = APIClient()
+        self.user1 = create_user(is_active=True)
+        self.user2 = create_user(is_active=True, email="test2@gmail.com")
+        self.license = models.License.objects.create(user=self.user1, text="test")
+        self.genre = models.Genre.objects.create(name="g1")
+        self.content = b"0123456789"
+        self.client.force_authenticate(self.user1)
+        res = self.client.post(
+            reverse("audio:upload"),
+            {"filename": "t1.mp3", "size": len(self.content), "chunk_size": 4},
+        )
+        self.session_id = res.data["id"]
+
+    def put_chunk(self, number, data, checksum=None):
+        return self.client.generic(
+            "PUT",
+            reverse("audio:upload_chunk", [self.session_id, number]),
+            data,
+            content_type="application/octet-stream",
+            headers={"X-Chunk-Checksum": checksum or hashlib.sha256(data).hexdigest()},
+        )
+
+    def finalize(self):
+        return self.client.post(
+            reverse("audio:upload_finalize", [self.session_id]),
+            {"title": "t1", "license": self.license.id, "genre": [self.genre.id]},
+        )
+
+    def test_create_upload_session(self):
+        res = self.client.get(reverse("audio:upload_detail", [self.session_id]))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["total_chunks"], 3)
+        self.assertEqual(res.data["missing_chunks"], [0, 1, 2])
+
+    def test_upload_chunks_out_of_order_and_finalize(self):
+        for number in (2, 0, 1):
+            res = self.put_chunk(number, self.content[number * 4 : number * 4 + 4])
+            self.assertEqual(res.status_code, 200)
+        res = self.finalize()
+        track = models.Track.objects.get(id=res.data["id"])
+
+        self.assertEqual(res.status_code, 201)
+        with open(track.file.path, "rb") as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertFalse(models.UploadSession.objects.exists())
+
+    def test_finalize_with_json_body(self):
+        for number in range(3):
+            self.put_chunk(number, self.content[number * 4 : number * 4 + 4])
+        genre = models.Genre.objects.create(name="g2")
+        res = self.client.post(
+            reverse("audio:upload_finalize", [self.session_id]),
+            {
+                "title": "t1",
+                "license": self.license.id,
+                "genre": [self.genre.id, genre.id],
+            },
+            format="json",
+        )
+        track = models.Track.objects.get(id=res.data["id"])
+
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(
+            set(track.genre.values_list("id", flat=True)), {self.genre.id, genre.id}
+        )
+
+    def test_upload_chunk_checksum_mismatch(self):
+        res = self.put_chunk(0, b"0123", checksum=hashlib.sha256(b"x").hexdigest())
+
+        self.assertEqual(res.status_code, 400)
+        self.assertFalse(models.UploadChunk.objects.exists())
+
+    def test_broken_chunk_resend_keeps_received_bytes(self):
+        for number in range(3):
+            self.put_chunk(number, self.content[number * 4 : number * 4 + 4])
+        truncated = self.put_chunk(
+            0, b"01", checksum=hashlib.sha256(b"0123").hexdigest()
+        )
+        corrupt = self.put_chunk(
+            0, b"xxxx", checksum=hashlib.sha256(b"0123").hexdigest()
+        )
+        res = self.finalize()
+        track = models.Track.objects.get(id=res.data["id"])
+
+        self.assertEqual(truncated.status_code, 400)
+        self.assertEqual(corrupt.status_code, 400)
+        self.assertEqual(res.status_code, 201)
+        with open(track.file.path, "rb") as f:
+            self.assertEqual(f.read(), self.content)
+
+    def test_upload_chunk_wrong_length(self):
+        res = self.put_chunk(2, b"8")
+
+        self.assertEqual(res.status_code, 400)
+
+    def test_finalize_incomplete_upload(self):
+        self.put_chunk(0, b"0123")
+        res = self.finalize()
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(res.data["missing_chunks"], [1, 2])
+
+    def test_upload_chunk_of_other_user(self):
+        self.client.force_authenticate(self.user2)
+        res = self.put_chunk(0, b"0123")
+
+        self.assertEqual(res.status_code, 403)
+
+    def test_delete_expired_upload_sessions(self):
+        models.UploadSession.objects.update(
+            updated_at=timezone.now()
+            - timedelta(seconds=settings.UPLOAD_SESSION_TIMEOUT)
+        )
+
+        self.assertEqual(delete_expired_upload_sessions(), 1)
+        self.assertEqual(os.listdir(settings.UPLOAD_SESSION_ROOT), [])
+
+
+class TrackSearchTests(TestCase):
+    def setUp(self):
+        # Cached responses of earlier tests outlive their rows
+        clear_caches()
+        self.client = APIClient()
+        self.user = create_user(is_active=True)
+        self.user.user_profile.display_name = "Nightwalker"
+        self.user.user_profile.save()
+        self.genre = models.Genre.objects.create(name="ambient")
+        self.license = models.License.objects.create(user=self.user, text="test")
+        self.album = models.Album.objects.create(
+            user=self.user, name="Harbour lights", description="d1"
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rain = self.create_track("Rain over harbour")
+            self.storm = self.create_track("Storm")
+            self.private = self.create_track("Rain demo")
+            self.private.private = True
+            self.private.save()
+
+    def create_track(self, title):
+        return create_track(
+            user=self.user,
+            license_=self.license,
+            genre=self.genre,
+            album=self.album,
+            cover=None,
+            file=create_file("mp3"),
+            title=title,
+        )
+
+    def search(self, query, **params):
+        res = self.client.get(reverse("audio:track_list"), {"search": query, **params})
+        self.assertEqual(res.status_code, 200)
+        return [track["id"] for track in res.data["results"]]
+
+    def test_search_title_prefix(self):
+        self.assertEqual(self.search("rai"), [self.rain.id])
+
+    def test_search_author_album_and_genre(self):
+        self.assertEqual(len(self.search("nightwalker")), 2)
+        self.assertEqual(len(self.search("harbour ambient")), 2)
+        self.assertEqual(self.search("nightwalker storm"), [self.storm.id])
+
+    def test_search_ranks_title_above_album(self):
+        self.assertEqual(self.search("harbour"), [self.rain.id, self.storm.id])
+
+    def test_search_rank_in_subquery(self):
+        tracks = models.Track.objects.filter(album=OuterRef("pk"))
+        best = search_tracks(tracks, "harbour").order_by("-search_rank")
+        album = models.Album.objects.annotate(best=Subquery(best.values("id")[:1])).get(
+            id=self.album.id
+        )
+
+        self.assertEqual(album.best, self.rain.id)
+
+    def test_search_blends_popularity(self):
+        models.Track.objects.filter(id=self.storm.id).update(plays_count=10**6)
+
+        self.assertEqual(self.search("harbour"), [self.storm.id, self.rain.id])
+
+    def test_search_keyset_pages(self):
+        first = self.client.get(
+            reverse("audio:track_list"), {"search": "harbour", "page_size": 1}
+        )
+        second = self.client.get(first.data["next"])
+
+        self.assertEqual(first.data["results"][0]["id"], self.rain.id)
+        self.assertEqual(second.data["results"][0]["id"], self.storm.id)
+        self.assertIsNone(second.data["next"])
+
+    def test_search_facets(self):
+        res = self.client.get(
+            reverse("audio:track_list"),
+            {"search": "harbour", "facets": "genre,license,duration_bucket"},
+        )
+
+        self.assertEqual(
+            res.data["facets"]["genre"], [{"value": "ambient", "count": 2}]
+        )
+
+    def test_search_without_terms(self):
+        self.assertEqual(self.search("!!"), [])
+
+    def test_search_index_follows_renames_and_deletes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.album.name = "Lighthouse"
+            self.album.save()
+            self.user.user_profile.display_name = "Daybreaker"
+            self.user.user_profile.save()
+            self.storm.delete()
+
+        self.assertEqual(self.search("harbour"), [self.rain.id])
+        self.assertEqual(self.search("lighthouse daybreaker"), [self.rain.id])
+
+    def test_rebuild_search_index(self):
+        models.Track.objects.filter(id=self.storm.id).update(title="Thunder")
+
+        call_command("rebuild_search_index", stdout=StringIO())
+
+        self.assertEqual(self.search("thunder"), [self.storm.id])
+
+
+class SuggestViewTests(TestCase):
+    suggest_index = "audio_library.suggest.RedisSuggestIndex"
+
+    def setUp(self):
+        settings_override = override_settings(SUGGEST_INDEX=self.suggest_index)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        get_suggest_index().clear()
+
+        self.client = APIClient()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user = create_user(is_active=True)
+            self.user.user_profile.display_name = "Nightwalker"
+            self.user.user_profile.save()
+            self.genre = models.Genre.objects.create(name="Nightcore")
+            self.license = models.License.objects.create(user=self.user, text="t")
+            self.album = models.Album.objects.create(
+                user=self.user, name="Night drive", description="d1"
+            )
+            self.track = create_track(
+                user=self.user,
+                license_=self.license,
+                genre=self.genre,
+                album=self.album,
+                cover=None,
+                file=create_file("mp3"),
+                title="Nights in white",
+            )
+
+    def suggest(self, query, **params):
+        res = self.client.get(reverse("audio:suggest"), {"q": query, **params})
+        self.assertEqual(res.status_code, 200)
+        return [(item["type"], item["id"]) for item in res.data["results"]]
+
+    def test_suggest_all_kinds(self):
+        with self.assertNumQueries(0):
+            suggestions = self.suggest("NIG")
+
+        self.assertEqual(
+            set(suggestions),
+            {
+                ("track", self.track.id),
+                ("author", self.user.id),
+                ("album", self.album.id),
+                ("genre", self.genre.id),
+            },
+        )
+
+    def test_suggest_every_word(self):
+        self.assertEqual(self.suggest("dri nig"), [("album", self.album.id)])
+        self.assertEqual(self.suggest("nigx"), [])
+        self.assertEqual(self.suggest("  "), [])
+
+    def test_suggest_by_popularity(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.track.plays_count = 10**6
+            self.track.save()
+
+        self.assertEqual(self.suggest("nig", limit=1), [("track", self.track.id)])
+
+    def test_suggest_follows_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.track.private = True
+            self.track.save()
+            self.user.user_profile.display_name = "Daywalker"
+            self.user.user_profile.save()
+            self.genre.delete()
+
+        self.assertEqual(self.suggest("nig"), [("album", self.album.id)])
+        self.assertEqual(self.suggest("dayw"), [("author", self.user.id)])
+
+    def test_suggest_empty_index_reads_no_database(self):
+        get_suggest_index().clear()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggest("nig"), [])
+        rebuild_suggestions()
+        self.assertEqual(len(self.suggest("nig")), 4)
+
+    def test_rebuild_suggest_index(self):
+        models.Album.objects.filter(id=self.album.id).update(name="Sunrise")
+
+        call_command("rebuild_suggest_index", "--clear", stdout=StringIO())
+
+        self.assertEqual(self.suggest("sun"), [("album", self.album.id)])
+
+
+class LocalSuggestViewTests(SuggestViewTests):
+    suggest_index = "audio_library.suggest.LocalSuggestIndex"
+
+
+# The warming thread reads committed rows only
+class LocalSuggestIndexWarmTests(TransactionTestCase):
+    def test_new_index_warms_from_database(self):
+        user = create_user(is_active=True)
+        license_ = models.License.objects.create(user=user, text="t")
+        track = models.Track.objects.create(
+            user=user, license=license_, file=create_file("mp3"), title="Nightfall"
+        )
+
+        index = LocalSuggestIndex()
+        index.warm_thread.join(timeout=10)
+
+        self.assertEqual(
+            index.suggest(["night"], 10),
+            [{"type": "track", "id": track.id, "label": "Nightfall"}],
+        )
+
+
+class QueryPlanTests(QueryCountTestMixin, TestCase):
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+        self.user = create_user(is_active=True)
+        self.license = models.License.objects.create(user=self.user, text="t")
+        self.album = models.Album.objects.create(
+            user=self.user, name="a1", description="d1"
+        )
+        genres = [models.Genre.objects.create(name=f"g{i}") for i in range(2)]
+        self.tracks = []
+        for i in range(3):
+            track = create_track(
+                user=create_user(is_active=True, email=f"author{i}@gmail.com"),
+                license_=self.license,
+                genre=genres[0],
+                album=self.album,
+                cover=None,
+                file=create_file("mp3"),
+                title=f"t{i}",
+            )
+            track.genre.add(genres[1])
+            create_comment(
+                user=create_user(is_active=True, email=f"critic{i}@gmail.com"),
+                track=self.tracks[0] if self.tracks else track,
+            )
+            self.tracks.append(track)
+
+    def test_track_lists_query_count(self):
+        self.assertQueryCountConstant(reverse("audio:track_list"))
+        self.assertQueryCountConstant(
+            reverse("audio:track_list"), page=1, facets="genre"
+        )
+        self.assertQueryCountConstant(
+            reverse("audio:comments_by_track", [self.tracks[0].id])
+        )
+
+    def test_track_list_page_rows_load_live_columns_only(self):
+        res = self.client.get(reverse("audio:track_list"))
+        track = res.renderer_context["view"].paginator.page[0]
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn("plays_count", track.__dict__)
+        self.assertNotIn("title", track.__dict__)
+        self.assertEqual(res.data["results"][0]["album"]["name"], self.album.name)
+
+    @override_settings(STREAMING_LIST_CHUNK_SIZE=1)
+    def test_track_list_streamed_in_chunks(self):
+        url = reverse("audio:track_list")
+        expected = self.client.get(url, {"page_size": 2}).data
+
+        res = self.client.get(url, {"stream": 1, "page_size": 2})
+        data = json.loads(b"".join(res.streaming_content))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res["Content-Type"], "application/json")
+        self.assertEqual(data["results"], json.loads(json.dumps(expected["results"])))
+        self.assertIsNone(data["previous"])
+
+        res = self.client.get(data["next"] + "&stream=1")
+        next_page = json.loads(b"".join(res.streaming_content))
+        self.assertEqual(
+            [track["id"] for track in next_page["results"]], [self.tracks[0].id]
+        )
+        self.assertIsNone(next_page["next"])
+
+        res = self.client.get(next_page["previous"] + "&stream=1")
+        previous_page = json.loads(b"".join(res.streaming_content))
+        self.assertEqual(previous_page["results"], data["results"])
+
+    def test_track_list_stream_rejects_page_numbers(self):
+        res = self.client.get(reverse("audio:track_list"), {"stream": 1, "page": 1})
+
+        self.assertEqual(res.status_code, 400)
+
+    def test_track_list_serialized_from_fragments(self):
+        # Authenticated requests skip the response cache
+        self.client.force_authenticate(self.user)
+        url = reverse("audio:track_list")
+        self.client.get(url)
+
+        # Bulk updates skip signals, fragments are kept but counters are live
+        models.Track.objects.update(title="renamed", plays_count=7)
+        with cachalot_disabled(), self.assertNumQueries(1):
+            cached = self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            models.Track.objects.get(id=self.tracks[0].id).save()
+        fresh = self.client.get(url)
+
+        titles = {track["id"]: track["title"] for track in fresh.data["results"]}
+        self.assertEqual(
+            [track["title"] for track in cached.data["results"]], ["t2", "t1", "t0"]
+        )
+        self.assertEqual(
+            {track["plays_count"] for track in cached.data["results"]}, {7}
+        )
+        self.assertEqual(titles[self.tracks[0].id], "renamed")
+        self.assertEqual(titles[self.tracks[1].id], "t1")
+
+    def test_track_fragments_follow_their_author_only(self):
+        self.client.force_authenticate(self.user)
+        url = reverse("audio:track_list")
+        self.client.get(url)
+
+        models.Track.objects.update(title="renamed")
+        profile = self.tracks[0].user.user_profile
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.display_name = "Renamed author"
+            profile.save()
+        res = self.client.get(url)
+
+        tracks = {track["id"]: track for track in res.data["results"]}
+        self.assertEqual(tracks[self.tracks[0].id]["title"], "renamed")
+        self.assertEqual(
+            tracks[self.tracks[0].id]["user"]["display_name"], "Renamed author"
+        )
+        self.assertEqual(tracks[self.tracks[1].id]["title"], "t1")
+
+    def test_track_fragments_follow_saved_metadata(self):
+        self.client.force_authenticate(self.user)
+        url = reverse("audio:track_list")
+        self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            save_track_metadata(
+                self.tracks[0].id,
+                {"duration": 12.5, "bitrate": 128, "sample_rate": 44100, "channels": 2},
+            )
+        res = self.client.get(url)
+
+        durations = {track["id"]: track["duration"] for track in res.data["results"]}
+        self.assertEqual(durations[self.tracks[0].id], 12.5)
+
+    def test_playlist_query_count_independent_of_tracks(self):
+        playlist = create_playlist(
+            user=self.user, tracks=self.tracks[0], cover=create_file()
+        )
+        self.client.force_authenticate(self.user)
+        url = reverse("audio:playlist")
+
+        with cachalot_disabled():
+            with CaptureQueriesContext(connection) as one_track:
+                self.client.get(url)
+            playlist.tracks.add(*self.tracks[1:])
+            with CaptureQueriesContext(connection) as three_tracks:
+                res = self.client.get(url)
+
+        self.assertEqual(len(res.data[0]["tracks"]), 3)
+        self.assertEqual(len(one_track), len(three_tracks))
+
+    def test_sparse_fieldset_prunes_queryset(self):
+        url = reverse("audio:track_list")
+
+        with cachalot_disabled(), CaptureQueriesContext(connection) as queries:
+            res = self.client.get(url, {"fields": "id,title,user.display_name"})
+
+        self.assertEqual(set(res.data["results"][0]), {"id", "title", "user"})
+        self.assertEqual(set(res.data["results"][0]["user"]), {"display_name"})
+        # The page, then tracks missing from the fragment cache
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn("audio_library_license", queries[1]["sql"])
+        self.assertNotIn('"audio_library_track"."file"', queries[1]["sql"])
+
+    def test_omit_nested_fields(self):
+        res = self.client.get(
+            reverse("audio:track_list"), {"omit": "license,genre,album.description"}
+        )
+        track = res.data["results"][0]
+
+        self.assertNotIn("license", track)
+        self.assertNotIn("genre", track)
+        self.assertNotIn("description", track["album"])
+        self.assertIn("name", track["album"])
+
+    def test_expand_nested_fields(self):
+        SocialLink.objects.create(user=self.tracks[0].user, link="https://a.com")
+        comment = models.Comment.objects.filter(track=self.tracks[0]).first()
+
+        tracks = self.client.get(
+            reverse("audio:track_list"), {"expand": "user.social_links"}
+        )
+        comments = self.client.get(
+            reverse("audio:comments_by_track", [self.tracks[0].id]),
+            {"expand": "track", "fields": "id,track.title"},
+        )
+
+        self.assertEqual(
+            tracks.data["results"][-1]["user"]["social_links"][0]["link"],
+            "https://a.com",
+        )
+        self.assertIn(
+            {"id": comment.id, "track": {"title": self.tracks[0].title}},
+            comments.data["results"],
+        )
+
+    def test_writes_ignore_sparse_fieldsets(self):
+        self.client.force_authenticate(self.user)
+
+        res = self.client.post(
+            reverse("audio:comments") + "?fields=id",
+            {"text": "nice", "track": self.tracks[0].id},
+        )
+
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(res.data["text"], "nice")
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+        self.user = create_user(is_active=True)
+        self.license = models.License.objects.create(user=self.user, text="test")
+        self.genre = models.Genre.objects.create(name="g1")
+        self.track = create_track(
+            user=self.user,
+            license_=self.license,
+            genre=self.genre,
+            album=None,
+            cover=None,
+            file=create_file("mp3"),
+        )
+
+    def get_response_key(self, view_name):
+        keys = cache.keys(f"response:*.{view_name}:*")
+        self.assertEqual(len(keys), 1)
+        return keys[0]
+
+    def test_anonymous_list_served_from_cache(self):
+        url = reverse("audio:track_list")
+
+        first = self.client.get(url, {"page": 1})
+        with cachalot_disabled(), self.assertNumQueries(0):
+            second = self.client.get(url, {"page": 1})
+        other_page = self.client.get(url, {"page": 1, "fields": "id"})
+
+        self.assertEqual(first["X-Cache"], "MISS")
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(other_page["X-Cache"], "MISS")
+
+    def test_change_invalidates_cached_list(self):
+        url = reverse("audio:comments_by_track", [self.track.id])
+        self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_comment(user=self.user, track=self.track, text="new")
+        res = self.client.get(url)
+
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(res.data["results"][0]["text"], "new")
+
+    def test_authenticated_requests_skip_cache(self):
+        self.client.force_authenticate(self.user)
+
+        res = self.client.get(reverse("audio:genre"))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertNotIn("X-Cache", res)
+
+    @override_settings(RESPONSE_CACHE_LOCK_WAIT=5)
+    def test_streamed_list_skips_cache(self):
+        url = reverse("audio:track_list")
+        view = TrackListView()
+        request = Request(APIRequestFactory().get(url, {"stream": 1}))
+        # Another request holds the lock of the same key
+        cache.add(f"{get_response_key(view, request, view.cache_namespaces)}:lock", 1)
+
+        started = time.monotonic()
+        res = self.client.get(url, {"stream": 1})
+        b"".join(res.streaming_content)
+
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertNotIn("X-Cache", res)
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=0)
+    def test_stale_response_served_while_refreshing(self):
+        url = reverse("audio:genre")
+        self.client.get(url)
+        # Another request is refreshing the expired entry
+        cache.add(f"{self.get_response_key('GenreView')}:lock", 1)
+
+        stale = self.client.get(url)
+        clear_caches()
+        refreshed = self.client.get(url)
+
+        self.assertEqual(stale["X-Cache"], "STALE")
+        self.assertEqual(stale.data, refreshed.data)
+        self.assertEqual(refreshed["X-Cache"], "MISS")
+
+
+# Cachalot reports invalidations once the outermost transaction commits
+class CacheStatsTests(TransactionTestCase):
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+        self.user = create_user(is_active=True)
+        self.license = models.License.objects.create(user=self.user, text="test")
+        self.genre = models.Genre.objects.create(name="g1")
+        self.track = create_track(
+            user=self.user,
+            license_=self.license,
+            genre=self.genre,
+            album=None,
+            cover=None,
+            file=create_file("mp3"),
+        )
+
+    def test_track_writes_skip_cachalot(self):
+        before = get_cache_stats().get("cachalot", {})
+
+        incr_counter(models.Track.objects.filter(id=self.track.id), "likes_count")
+        list(models.Genre.objects.all())
+        list(models.Genre.objects.all())
+        models.Genre.objects.create(name="g2")
+        after = get_cache_stats()["cachalot"]
+
+        self.assertEqual(
+            after.get("invalidation:audio_library_track", 0),
+            before.get("invalidation:audio_library_track", 0),
+        )
+        self.assertGreater(after["hit"], before.get("hit", 0))
+        self.assertEqual(
+            after["invalidation:audio_library_genre"],
+            before.get("invalidation:audio_library_genre", 0) + 1,
+        )
+        self.assertTrue(0 < after["hit_ratio"] <= 1)
+
+    def test_stats_for_staff_only(self):
+        self.client.force_authenticate(self.user)
+        forbidden = self.client.get(reverse("cache_stats"))
+        self.user.is_staff = True
+        self.user.save()
+
+        res = self.client.get(reverse("cache_stats"))
+
+        self.assertEqual(forbidden.status_code, 403)
+        self.assertEqual(res.status_code, 200)
+        self.assertIn("cachalot", res.data)
+
+
+class TieredCacheTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.tiered = TieredCache("test", max_size=2)
+
+    def test_local_tier_serves_hot_keys(self):
+        self.tiered.set_many({"a": 1, "b": 2, "c": 3})
+        # Only the local tier is left
+        cache.delete_many(["a", "b", "c"])
+        before = get_cache_stats().get("test", {})
+
+        found = self.tiered.get_many(["a", "b", "c"])
+        after = get_cache_stats()["test"]
+
+        self.assertEqual(found, {"b": 2, "c": 3})
+        self.assertEqual(len(self.tiered.local), 2)
+        self.assertEqual(after["local_hit"] - before.get("local_hit", 0), 2)
+        self.assertEqual(after["miss"] - before.get("miss", 0), 1)
+
+    def test_invalidation_from_other_process(self):
+        self.tiered.set_many({"a": 1})
+        cache.set("a", 2)
+        stale = self.tiered.get("a")
+        message = json.dumps({"origin": "other", "namespace": "test", "keys": ["a"]})
+
+        client = get_redis_connection("default")
+        deadline = time.monotonic() + 5
+        # The listener subscribes in the background, messages before are lost
+        while self.tiered.get("a") != 2 and time.monotonic() < deadline:
+            client.publish(CHANNEL, message)
+            time.sleep(0.05)
+
+        self.assertEqual(stale, 1)
+        self.assertEqual(self.tiered.get("a"), 2)
+
+    def test_bumped_version_not_served_from_local_tier(self):
+        version = get_version("test")
+
+        bump_version("test")
+
+        self.assertGreater(get_version("test"), version)
@@ -0,0 +1,117 @@
+import hashlib
+import mimetypes
+import os
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.utils import timezone
+
+from audio_library.models import UploadChunk, UploadSession
+from base.services import delete_old_file
+
+BLOCK_SIZE = 64 * 1024
+
+
+class ChunkError(Exception):
+    """Chunk body does not match the session or its checksum"""
+
+
+class SessionUploadedFile(UploadedFile):
+    """Assembled upload, moved into the storage instead of being copied"""
+
+    def __init__(self, session):
+        self.path = get_upload_path(session)
+        super().__init__(
+            open(self.path, "rb"),
+            name=session.filename,
+            content_type=mimetypes.guess_type(session.filename)[0],
+            size=session.size,
+        )
+
+    def temporary_file_path(self):
+        return self.path
+
+
+def get_upload_path(session):
+    return os.path.join(settings.UPLOAD_SESSION_ROOT, f"{session.id}.part")
+
+
+def create_upload_file(session):
+    """Allocate the file so chunks can be written at their offsets in any order"""
+    os.makedirs(settings.UPLOAD_SESSION_ROOT, exist_ok=True)
+    with open(get_upload_path(session), "wb") as f:
+        f.truncate(session.size)
+
+
+def chunk_range(session, number):
+    """``(offset, length)`` of chunk in the assembled file"""
+    offset = number * session.chunk_size
+    return offset, min(session.chunk_size, session.size - offset)
+
+
+def write_chunk(session, number, stream, checksum):
+    """Write chunk body to its offset once its SHA-256 ``checksum`` matches.
+
+    The body is spooled and verified first, so a broken resend of a received
+    chunk never overwrites its bytes. Chunks do not overlap, so parallel
+    requests write with ``pwrite`` into the same file without locking.
+    """
+    if not 0 <= number < session.total_chunks:
+        raise ChunkError(f"Chunk number must be in 0..{session.total_chunks - 1}.")
+    offset, length = chunk_range(session, number)
+    digest = hashlib.sha256()
+    written = 0
+
+    with tempfile.SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+    ) as body:
+        while written <= length:
+            block = stream.read(BLOCK_SIZE)
+            if not block:
+                break
+            block = block[: length + 1 - written]
+            digest.update(block)
+            body.write(block)
+            written += len(block)
+
+        if written != length:
+            raise ChunkError(f"Chunk {number} must be {length} bytes.")
+        if digest.hexdigest() != checksum.lower():
+            raise ChunkError(f"Checksum of chunk {number} does not match.")
+
+        body.seek(0)
+        fd = os.open(get_upload_path(session), os.O_WRONLY)
+        try:
+            while block := body.read(BLOCK_SIZE):
+                os.pwrite(fd, block, offset)
+                offset += len(block)
+        finally:
+            os.close(fd)
+
+    chunk, _ = UploadChunk.objects.update_or_create(
+        session=session, number=number, defaults={"checksum": digest.hexdigest()}
+    )
+    UploadSession.objects.filter(id=session.id).update(updated_at=timezone.now())
+    return chunk
+
+
+def missing_chunks(session):
+    received = set(session.chunks.values_list("number", flat=True))
+    return [number for number in range(session.total_chunks) if number not in received]
+
+
+def delete_upload_session(session):
+    delete_old_file(get_upload_path(session))
+    session.delete()
+
+
+def delete_expired_upload_sessions():
+    """Remove sessions without any chunk received for ``UPLOAD_SESSION_TIMEOUT``"""
+    expired = timezone.now() - timedelta(seconds=settings.UPLOAD_SESSION_TIMEOUT)
+    deleted = 0
+    for session in UploadSession.objects.filter(updated_at__lt=expired).iterator():
+        delete_upload_session(session)
+        deleted += 1
+    return deleted
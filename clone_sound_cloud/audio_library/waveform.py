@@ -0,0 +1,168 @@
+import os
+import struct
+import subprocess
+import wave
+
+import numpy as np
+from django.conf import settings
+
+PEAKS_SUFFIX = ".peaks"
+PEAKS_HEADER = struct.Struct("<4sBH")
+PEAKS_MAGIC = b"PEAK"
+WAVEFORM_HEADER = struct.Struct("<2sBBI")
+WAVEFORM_MAGIC = b"WF"
+VERSION = 1
+
+# Number of peaks per level, every level must divide the largest one
+RESOLUTIONS = (256, 1024, 4096)
+# Frames of a WAV converted at once when computing peaks
+WAV_BLOCK_FRAMES = 64 * 1024
+
+
+def get_peaks_path(audio_path):
+    """Peaks are stored next to the audio file"""
+    return f"{audio_path}{PEAKS_SUFFIX}"
+
+
+def pcm_to_amplitudes(frames, sample_width, channels):
+    """Absolute amplitude 0..1 per frame of interleaved PCM, loudest channel"""
+    if sample_width == 1:
+        samples = (np.frombuffer(frames, np.uint8).astype(np.float32) - 128) / 128
+    elif sample_width == 2:
+        samples = np.frombuffer(frames, "<i2").astype(np.float32) / 2**15
+    elif sample_width == 3:
+        raw = np.frombuffer(frames, np.uint8).reshape(-1, 3).astype(np.int32)
+        samples = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+        samples = np.where(samples >= 2**23, samples - 2**24, samples)
+        samples = samples.astype(np.float32) / 2**23
+    elif sample_width == 4:
+        samples = np.frombuffer(frames, "<i4").astype(np.float32) / 2**31
+    else:
+        raise ValueError(f"Unsupported sample width {sample_width}")
+    samples = samples[: len(samples) - len(samples) % channels]
+    return np.abs(samples.reshape(-1, channels)).max(axis=1)
+
+
+def read_wav_peaks(path, finest, block_frames=WAV_BLOCK_FRAMES):
+    """Peak 0..1 of ``finest`` buckets of a PCM WAV, read a block at a time.
+
+    Blocks hold whole buckets, so memory does not grow with the file.
+    """
+    with wave.open(path, "rb") as wav:
+        sample_width, channels = wav.getsampwidth(), wav.getnchannels()
+        bucket = max(-(-wav.getnframes() // finest), 1)
+        block_frames = max(block_frames // bucket, 1) * bucket
+        peaks = np.zeros(finest, np.float32)
+        index = 0
+        while index < finest:
+            amplitudes = pcm_to_amplitudes(
+                wav.readframes(block_frames), sample_width, channels
+            )
+            if not len(amplitudes):
+                break
+            count = -(-len(amplitudes) // bucket)
+            padded = np.zeros(count * bucket, np.float32)
+            padded[: len(amplitudes)] = amplitudes
+            end = index + count
+            peaks[index:end] = padded.reshape(count, bucket).max(axis=1)
+            index = end
+    return peaks
+
+
+def decode_amplitudes(path):
+    """Decode MP3 (or non PCM WAV) to mono 16 bit PCM with ffmpeg"""
+    result = subprocess.run(
+        [
+            settings.FFMPEG_BINARY,
+            "-v",
+            "error",
+            "-i",
+            path,
+            "-f",
+            "s16le",
+            "-ac",
+            "1",
+            "-ar",
+            str(settings.WAVEFORM_SAMPLE_RATE),
+            "-",
+        ],
+        capture_output=True,
+        check=True,
+        timeout=5 * 60,
+    )
+    return pcm_to_amplitudes(result.stdout, 2, 1)
+
+
+def read_peak_levels(path, resolutions=RESOLUTIONS):
+    if path.lower().endswith(".wav"):
+        try:
+            return peak_levels(read_wav_peaks(path, max(resolutions)), resolutions)
+        except wave.Error:
+            pass
+    return compute_peaks(decode_amplitudes(path), resolutions)
+
+
+def compute_peaks(amplitudes, resolutions=RESOLUTIONS):
+    """Peak levels ``{resolution: int16 array}`` scaled to 0..32767"""
+    finest = max(resolutions)
+    bucket = max(-(-len(amplitudes) // finest), 1)
+    padded = np.zeros(bucket * finest, np.float32)
+    padded[: len(amplitudes)] = amplitudes
+    return peak_levels(padded.reshape(finest, bucket).max(axis=1), resolutions)
+
+
+def peak_levels(peaks, resolutions=RESOLUTIONS):
+    """Levels of the finest ``peaks`` 0..1, coarser ones by taking maxima"""
+    finest = max(resolutions)
+    peaks = np.round(np.clip(peaks, 0, 1) * 32767).astype("<i2")
+    return {
+        resolution: peaks.reshape(resolution, finest // resolution).max(axis=1)
+        for resolution in resolutions
+    }
+
+
+def write_peaks(path, levels):
+    resolutions = sorted(levels)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(PEAKS_HEADER.pack(PEAKS_MAGIC, VERSION, len(resolutions)))
+        f.write(struct.pack(f"<{len(resolutions)}I", *resolutions))
+        for resolution in resolutions:
+            f.write(levels[resolution].astype("<i2").tobytes())
+    os.replace(tmp_path, path)
+
+
+def read_peaks(path, resolution):
+    """Smallest stored level with at least ``resolution`` peaks"""
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, count = PEAKS_HEADER.unpack_from(data)
+    if magic != PEAKS_MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a peaks file")
+    resolutions = struct.unpack_from(f"<{count}I", data, PEAKS_HEADER.size)
+
+    offset = PEAKS_HEADER.size + 4 * count
+    levels = {}
+    for stored in resolutions:
+        levels[stored] = np.frombuffer(data, "<i2", stored, offset)
+        offset += 2 * stored
+    fitting = [stored for stored in resolutions if stored >= resolution]
+    return levels[min(fitting) if fitting else max(resolutions)]
+
+
+def encode_waveform(peaks, bits=8):
+    """Compact little-endian payload: ``b"WF"``, version, bits, count, peaks"""
+    if bits == 8:
+        data = (peaks >> 8).astype("<i1")
+    else:
+        data = peaks.astype("<i2")
+    return (
+        WAVEFORM_HEADER.pack(WAVEFORM_MAGIC, VERSION, bits, len(data)) + data.tobytes()
+    )
+
+
+def generate_waveform(audio_path):
+    """Compute peaks of audio file and store them next to it"""
+    peaks_path = get_peaks_path(audio_path)
+    write_peaks(peaks_path, read_peak_levels(audio_path))
+    return peaks_path
@@ -0,0 +1,186 @@
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+
+from base.tiered_cache import TieredCache
+
+# Version stamps are read by every cached response, list and fragment
+version_cache = TieredCache("versions", max_size=10_000)
+# Row counters miss bulk changes, they are recounted this often
+ROWS_COUNTER_TIMEOUT = 60 * 60
+# Query parameters selecting a page or shaping the response, not the rows
+LIST_PARAMS = frozenset(
+    ("page", "page_size", "cursor", "ordering", "facets", "fields", "omit", "expand")
+)
+
+
+def get_version_key(namespace):
+    return f"version:{namespace}"
+
+
+def get_version(namespace):
+    """Current version stamp of ``namespace``, part of keys of derived data"""
+    return version_cache.get_or_set(
+        get_version_key(namespace), time.time_ns, timeout=None
+    )
+
+
+def bump_version(namespace):
+    """Invalidate every cached value keyed with the current version"""
+    key = get_version_key(namespace)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # A new stamp is never lower than versions handed out before eviction
+        cache.set(key, time.time_ns(), timeout=None)
+    version_cache.invalidate([key])
+
+
+def get_filter_params(request):
+    """Query parameters selecting the rows of a list, in stable order"""
+    return sorted(
+        (key, sorted(values))
+        for key, values in request.query_params.lists()
+        if key not in LIST_PARAMS
+    )
+
+
+def get_list_key(prefix, model, view, params):
+    """Key of data derived from a filtered list of ``model`` rows.
+
+    It changes with the view, its URL kwargs, filter ``params`` and the
+    version of the model, so bumping the version invalidates it.
+    """
+    view_kwargs = sorted((getattr(view, "kwargs", None) or {}).items())
+    view_name = f"{type(view).__module__}.{type(view).__qualname__}"
+    digest = hashlib.sha1(
+        json.dumps([view_name, view_kwargs, params], default=str).encode()
+    ).hexdigest()
+    namespace = model._meta.label_lower
+    return f"{prefix}:{namespace}:{get_version(namespace)}:{digest}"
+
+
+def get_versions(namespaces):
+    """Version stamps of ``namespaces`` read at once"""
+    keys = [get_version_key(namespace) for namespace in namespaces]
+    versions = version_cache.get_many(keys)
+    return [
+        versions[key] if key in versions else get_version(namespace)
+        for key, namespace in zip(keys, namespaces)
+    ]
+
+
+def get_response_key(view, request, namespaces):
+    """Key of a response of ``view`` to ``request``.
+
+    Every query parameter is part of it, pages and fieldsets included, as is
+    the host, since pagination links are absolute. Bumping the version of
+    any of ``namespaces`` invalidates it.
+    """
+    params = sorted(
+        (key, sorted(values)) for key, values in request.query_params.lists()
+    )
+    view_name = f"{type(view).__module__}.{type(view).__qualname__}"
+    digest = hashlib.sha1(
+        json.dumps(
+            [
+                request.get_host(),
+                request.path,
+                params,
+                get_versions(namespaces),
+            ],
+            default=str,
+        ).encode()
+    ).hexdigest()
+    return f"response:{view_name}:{digest}"
+
+
+def bump_version_on_change(model):
+    """Bump the version of ``model`` when one of its rows is saved or deleted"""
+    namespace = model._meta.label_lower
+    uid = f"bump_version_{namespace}"
+
+    def receiver(sender, **kwargs):
+        transaction.on_commit(lambda: bump_version(namespace))
+
+    post_save.connect(receiver, model, weak=False, dispatch_uid=uid)
+    post_delete.connect(receiver, model, weak=False, dispatch_uid=uid)
+
+
+def get_object_namespace(model, pk):
+    return f"{model._meta.label_lower}:{pk}"
+
+
+def bump_object_version(model, pk):
+    """Bump versions of ``model`` and of its object ``pk`` once committed,
+    for changes sending no signals, like bulk updates of counters"""
+    namespaces = [model._meta.label_lower, get_object_namespace(model, pk)]
+
+    def bump():
+        for namespace in namespaces:
+            bump_version(namespace)
+
+    transaction.on_commit(bump)
+
+
+def bump_object_version_on_change(model, target=None, attrs=("pk",)):
+    """Bump versions of the ``target`` objects a changed row of ``model`` is
+    part of, their primary keys are read from ``attrs``. ``target`` defaults
+    to ``model`` itself.
+    """
+    target = target or model
+    uid = f"bump_object_version_{model._meta.label_lower}_{'_'.join(attrs)}"
+
+    def receiver(sender, instance, **kwargs):
+        namespaces = [
+            get_object_namespace(target, getattr(instance, attr)) for attr in attrs
+        ]
+
+        def bump():
+            for namespace in namespaces:
+                bump_version(namespace)
+
+        transaction.on_commit(bump)
+
+    post_save.connect(receiver, model, weak=False, dispatch_uid=uid)
+    post_delete.connect(receiver, model, weak=False, dispatch_uid=uid)
+
+
+def get_rows_key(model):
+    return f"rows:{model._meta.db_table}"
+
+
+def incr_table_rows(model, amount=1):
+    """Keep the row counter of ``estimate_table_rows`` in step, if it exists"""
+    try:
+        cache.incr(get_rows_key(model), amount)
+    except ValueError:
+        pass
+
+
+def estimate_rows(queryset):
+    """Approximate number of rows of ``queryset`` without ``COUNT(*)``.
+
+    PostgreSQL gives the planner estimate of the query itself. Other
+    databases only know the whole table, from a counter maintained by
+    ``incr_table_rows`` and counted once when it is missing, so querysets
+    with a ``WHERE`` clause get ``None``.
+    """
+    if connection.vendor == "postgresql":
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0]["Plan"]["Plan Rows"]
+    if queryset.query.where:
+        return None
+    model = queryset.model
+    return cache.get_or_set(
+        get_rows_key(model), model._default_manager.count, ROWS_COUNTER_TIMEOUT
+    )
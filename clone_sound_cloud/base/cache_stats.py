@@ -0,0 +1,134 @@
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+STATS_KEY = "cache_stats"
+# Versions of cachalot whose private query function is wrapped to count hits
+CACHALOT_VERSIONS = ("2.6.",)
+
+
+class CacheStats:
+    """Hit, miss and invalidation counters of caches, shared by all workers.
+
+    Events are counted in process and added to a Redis hash per namespace
+    every ``CACHE_STATS_FLUSH_INTERVAL`` seconds, so counting never costs a
+    round trip of its own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._flushed_at = time.monotonic()
+
+    def incr(self, namespace, event, amount=1):
+        with self._lock:
+            self._counts[(namespace, event)] += amount
+            due = (
+                time.monotonic() - self._flushed_at
+                >= settings.CACHE_STATS_FLUSH_INTERVAL
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+            self._flushed_at = time.monotonic()
+        if not counts:
+            return
+        pipe = get_redis_connection("default").pipeline(transaction=False)
+        for (namespace, event), amount in counts.items():
+            pipe.sadd(STATS_KEY, namespace)
+            pipe.hincrby(f"{STATS_KEY}:{namespace}", event, amount)
+        try:
+            pipe.execute()
+        except RedisError:
+            # Counted again with the next flush
+            with self._lock:
+                self._counts.update(counts)
+
+    def read(self):
+        """``{namespace: {event: count}}`` of all workers"""
+        self.flush()
+        client = get_redis_connection("default")
+        stats = {}
+        for namespace in sorted(
+            member.decode() for member in client.smembers(STATS_KEY)
+        ):
+            counts = client.hgetall(f"{STATS_KEY}:{namespace}")
+            stats[namespace] = {
+                event.decode(): int(amount) for event, amount in sorted(counts.items())
+            }
+        return stats
+
+
+cache_stats = CacheStats()
+
+
+def incr_cache_stat(namespace, event, amount=1):
+    cache_stats.incr(namespace, event, amount)
+
+
+def get_cache_stats():
+    """Counters by namespace, with hit ratios of those counting hits"""
+    stats = cache_stats.read()
+    for counts in stats.values():
+        lookups = counts.get("hit", 0) + counts.get("miss", 0)
+        if lookups:
+            counts["hit_ratio"] = round(counts.get("hit", 0) / lookups, 4)
+            if "local_hit" in counts:
+                counts["local_hit_ratio"] = round(counts["local_hit"] / lookups, 4)
+    return stats
+
+
+def count_cachalot_invalidation(sender, **kwargs):
+    incr_cache_stat("cachalot", f"invalidation:{sender}")
+
+
+def track_cachalot_stats():
+    """Count cachalot invalidations per table, and query hits and misses.
+
+    Invalidations come from the public ``post_invalidation`` signal, sent
+    once the outermost transaction commits. Cachalot has no hook for hits
+    and misses, so the private function reading cached results is wrapped,
+    only for versions it was checked against. Queries of uncachable tables
+    never get there.
+    """
+    import cachalot
+    from cachalot import monkey_patch
+    from cachalot.signals import post_invalidation
+
+    post_invalidation.connect(
+        count_cachalot_invalidation, dispatch_uid="count_cachalot_invalidation"
+    )
+
+    get_result = getattr(monkey_patch, "_get_result_or_execute_query", None)
+    if getattr(get_result, "counts_stats", False):
+        return
+    if get_result is None or not cachalot.__version__.startswith(CACHALOT_VERSIONS):
+        logger.warning(
+            "Hits and misses of cachalot %s are not counted", cachalot.__version__
+        )
+        return
+
+    def get_result_or_execute_query(execute_query_func, *args, **kwargs):
+        executed = False
+
+        def execute_query():
+            nonlocal executed
+            executed = True
+            return execute_query_func()
+
+        result = get_result(execute_query, *args, **kwargs)
+        incr_cache_stat("cachalot", "miss" if executed else "hit")
+        return result
+
+    get_result_or_execute_query.counts_stats = True
+    monkey_patch._get_result_or_execute_query = get_result_or_execute_query
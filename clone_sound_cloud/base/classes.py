@@ -1,4 +1,41 @@
-from rest_framework.pagination import PageNumberPagination
+import math
+import random
+import time
+from functools import partial
+
+from cachalot.api import cachalot_disabled
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.db import DatabaseError
+from django.db.models import F, Q
+from django.http import Http404, StreamingHttpResponse
+from django.utils.functional import cached_property
+from rest_framework import exceptions, permissions, views
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.generics import get_object_or_404
+from rest_framework.pagination import (
+    BasePagination,
+    CursorPagination,
+    PageNumberPagination,
+)
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from base.cache import (
+    estimate_rows,
+    get_filter_params,
+    get_list_key,
+    get_response_key,
+)
+from base.cache_stats import get_cache_stats
+from base.query_plan import plan_page, plan_queryset
+from base.sendfile import sendfile
+from base.serializers import get_page_columns
 
 
 class MixedSerializer:
@@ -13,7 +50,563 @@ class MixedSerializer:
         return serializer_class(*args, **kwargs)
 
 
+class QueryPlanMixin:
+    """Load what the view serializer reads, in constant queries per page.
+
+    Relations are joined or prefetched as ``base.query_plan`` plans them,
+    columns are limited with ``only()`` for safe methods only, so saved
+    instances are never partially loaded. Lists of fragment cached
+    serializers load the columns ``get_page_columns`` names and nothing else.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        serializer = self.get_serializer()
+        only = self.request.method in permissions.SAFE_METHODS
+        if only and getattr(self, "action", "list") == "list":
+            columns = get_page_columns(serializer)
+            if columns is not None:
+                # Rows are serialized from cached fragments, misses reloaded
+                return plan_page(queryset, columns)
+        return plan_queryset(queryset, serializer, only=only)
+
+
+class FacetsMixin:
+    """List view mixin adding counts of filtered rows by ``?facets=`` names.
+
+    ``facets`` maps names to functions of the filtered queryset. Counts are
+    cached per facet and filter set under the version stamp of the model.
+    """
+
+    facets = {}
+    facets_query_param = "facets"
+
+    def get_facet_names(self, request):
+        value = request.query_params.get(self.facets_query_param, "")
+        names = sorted({name.strip() for name in value.split(",") if name.strip()})
+        unknown = [name for name in names if name not in self.facets]
+        if unknown:
+            raise exceptions.ValidationError(
+                {self.facets_query_param: f"Unknown facets: {', '.join(unknown)}."}
+            )
+        return names
+
+    def get_facet_counts(self, queryset, names):
+        params = get_filter_params(self.request)
+        keys = {
+            name: get_list_key(f"facets:{name}", queryset.model, self, params)
+            for name in names
+        }
+        cached = cache.get_many(keys.values())
+        missing = {
+            keys[name]: self.facets[name](queryset)
+            for name in names
+            if keys[name] not in cached
+        }
+        cache.set_many(missing, settings.FACET_COUNT_TIMEOUT)
+        cached.update(missing)
+        return {name: cached[keys[name]] for name in names}
+
+    def list(self, request, *args, **kwargs):
+        names = self.get_facet_names(request)
+        response = super().list(request, *args, **kwargs)
+        if names:
+            queryset = self.filter_queryset(self.get_queryset())
+            response.data["facets"] = self.get_facet_counts(queryset, names)
+        return response
+
+
+class StreamingListMixin:
+    """List view mixin writing ``?stream=1`` pages while their rows are read.
+
+    Rows are read ``STREAMING_LIST_CHUNK_SIZE`` at a time, relations
+    prefetched per chunk, and each chunk is serialized and rendered before
+    the next is read, so memory stays bounded whatever the page size, up to
+    ``STREAMING_LIST_MAX_PAGE_SIZE``. Links and facets follow the results.
+    The paginator must provide ``stream_page``, like ``KeysetPagination``.
+    """
+
+    stream_query_param = "stream"
+
+    def is_streamed(self, request):
+        return request.query_params.get(self.stream_query_param) in ("1", "true")
+
+    def list(self, request, *args, **kwargs):
+        if not self.is_streamed(request):
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        paginator = self.paginator
+        paginator.max_page_size = settings.STREAMING_LIST_MAX_PAGE_SIZE
+        chunks = paginator.stream_page(
+            queryset, request, self, settings.STREAMING_LIST_CHUNK_SIZE
+        )
+        extra = {}
+        if isinstance(self, FacetsMixin):
+            names = self.get_facet_names(request)
+            if names:
+                extra["facets"] = self.get_facet_counts(queryset, names)
+        return StreamingHttpResponse(
+            self.render_stream(chunks, paginator, extra),
+            content_type="application/json",
+        )
+
+    def render_stream(self, chunks, paginator, extra):
+        renderer = JSONRenderer()
+        yield b'{"results":['
+        separator = b""
+        # Cachalot would keep every row of the page in memory
+        with cachalot_disabled():
+            for chunk in chunks:
+                data = self.get_serializer(chunk, many=True).data
+                yield separator + b",".join(renderer.render(item) for item in data)
+                separator = b","
+        links = {
+            "next": paginator.get_next_link(),
+            "previous": paginator.get_previous_link(),
+        }
+        yield b"]," + renderer.render({**links, **extra})[1:]
+
+
+class ResponseCacheMixin:
+    """Cache responses of anonymous GET requests until the data changes.
+
+    ``cache_namespaces`` are labels of the models the response is built
+    from, their version stamps are bumped by signals and are part of the
+    key. Entries stay fresh for ``RESPONSE_CACHE_TIMEOUT`` and are refreshed
+    a little early at random, more likely as they age and the slower they
+    were to build (XFetch). Only one request refreshes an entry at a time;
+    the others are answered with the stale entry meanwhile, or wait for the
+    first build of a cold one. A stale entry is also served when the
+    refresh fails on the database.
+    """
+
+    cache_namespaces = ()
+    cache_header = "X-Cache"
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            request, partial(super().list, request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            request, partial(super().retrieve, request, *args, **kwargs)
+        )
+
+    def get_cached_response(self, request, build):
+        if request.method != "GET" or request.user.is_authenticated:
+            return build()
+        if isinstance(self, StreamingListMixin) and self.is_streamed(request):
+            # Written while built, there is nothing to keep
+            return build()
+        key = get_response_key(self, request, self.cache_namespaces)
+        entry = cache.get(key)
+        if entry is not None and not self.should_refresh(entry):
+            return self.cached_response(entry, "HIT")
+
+        lock_key = f"{key}:lock"
+        if not cache.add(lock_key, 1, settings.RESPONSE_CACHE_LOCK_TIMEOUT):
+            if entry is not None:
+                return self.cached_response(entry, "STALE")
+            entry = self.wait_for_entry(key)
+            if entry is not None:
+                return self.cached_response(entry, "HIT")
+            return build()
+        try:
+            return self.refresh(key, build)
+        except DatabaseError:
+            if entry is None:
+                raise
+            return self.cached_response(entry, "STALE")
+        finally:
+            cache.delete(lock_key)
+
+    def should_refresh(self, entry):
+        expires = entry["created"] + settings.RESPONSE_CACHE_TIMEOUT
+        # -log(u) is exponentially distributed, early refreshes stay rare
+        early = (
+            -entry["delta"]
+            * settings.RESPONSE_CACHE_BETA
+            * math.log(1 - random.random())
+        )
+        return time.time() + early >= expires
+
+    def refresh(self, key, build):
+        started = time.monotonic()
+        response = build()
+        if response.status_code == 200:
+            entry = {
+                "data": response.data,
+                "created": time.time(),
+                "delta": time.monotonic() - started,
+            }
+            cache.set(
+                key,
+                entry,
+                settings.RESPONSE_CACHE_TIMEOUT + settings.RESPONSE_CACHE_STALE_TIMEOUT,
+            )
+        response[self.cache_header] = "MISS"
+        return response
+
+    def wait_for_entry(self, key):
+        deadline = time.monotonic() + settings.RESPONSE_CACHE_LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry
+        return None
+
+    def cached_response(self, entry, state):
+        return Response(entry["data"], headers={self.cache_header: state})
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator taking its count from ``get_count(object_list)``"""
+
+    def __init__(self, object_list, per_page, get_count, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.get_count = get_count
+
+    @cached_property
+    def count(self):
+        return self.get_count(self.object_list)
+
+
 class TrackAPIListPagination(PageNumberPagination):
+    """Page number pagination without a ``COUNT(*)`` on every request.
+
+    Counts are cached per view and normalized filter set under the version
+    stamp of the model, bumped whenever its rows change. Unfiltered lists
+    with a big enough ``estimate_rows`` use that instead, ``count_exact``
+    tells which one the client got.
+    """
+
     page_size = 3
     page_size_query_param = "page_size"
-    max_page_size = 10000
+    max_page_size = 100
+    count_exact = True
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count_exact = True
+        self.django_paginator_class = partial(
+            CachedCountPaginator,
+            get_count=partial(self.get_count, request=request, view=view),
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_count(self, queryset, request, view):
+        params = get_filter_params(request)
+        if not params and not getattr(view, "kwargs", None):
+            estimate = estimate_rows(queryset)
+            if (
+                estimate is not None
+                and estimate >= settings.PAGINATION_ESTIMATE_THRESHOLD
+            ):
+                self.count_exact = False
+                return estimate
+        return cache.get_or_set(
+            get_list_key("count", queryset.model, view, params),
+            queryset.count,
+            settings.PAGINATION_COUNT_TIMEOUT,
+        )
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data["count_exact"] = self.count_exact
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema["properties"]["count_exact"] = {"type": "boolean"}
+        return response_schema
+
+
+class FollowCursorPagination(CursorPagination):
+    """Keyset pagination of follow relations, newest first"""
+
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering = ("-created_at", "-id")
+
+
+def iter_in_order(queryset, pks, chunk_size):
+    """Rows of ``queryset`` with primary keys ``pks``, in that order"""
+    for start in range(0, len(pks), chunk_size):
+        end = start + chunk_size
+        chunk = pks[start:end]
+        rows = queryset.in_bulk(chunk)
+        yield from (rows[pk] for pk in chunk if pk in rows)
+
+
+class KeysetPagination(BasePagination):
+    """Keyset pagination on the view ordering plus ``id`` as tie-breaker.
+
+    Pages are selected with ``WHERE (ordering) < (cursor values)`` instead of
+    ``OFFSET``, so every page costs the same and rows inserted meanwhile do
+    not shift the following pages. Cursors are signed and opaque, a cursor
+    made for another ordering is rejected. Nullable fields sort last.
+    """
+
+    cursor_query_param = "cursor"
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering = ("-id",)
+    salt = "base.classes.KeysetPagination"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.get_page_queryset(queryset, request, view)
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[: self.page_size]
+        if self.reverse:
+            self.page.reverse()
+        self.set_links(has_more)
+        return self.page
+
+    def stream_page(self, queryset, request, view=None, chunk_size=100):
+        """Rows of the page in lists of ``chunk_size``, read lazily.
+
+        Forward pages are read with ``iterator()``, prefetching relations per
+        chunk. Previous pages are read backwards, so their primary keys are
+        selected first and rows loaded chunk by chunk in page order. Links
+        are known once every chunk has been read.
+        """
+        queryset = self.get_page_queryset(queryset, request, view)
+        if self.reverse:
+            pks = list(queryset.values_list("pk", flat=True)[: self.page_size + 1])
+            return self.stream_rows(
+                iter_in_order(queryset, pks[: self.page_size][::-1], chunk_size),
+                chunk_size,
+                has_more=len(pks) > self.page_size,
+            )
+        rows = queryset[: self.page_size + 1].iterator(chunk_size=chunk_size)
+        return self.stream_rows(rows, chunk_size)
+
+    def stream_rows(self, rows, chunk_size, has_more=False):
+        first = last = None
+        chunk = []
+        for index, row in enumerate(rows):
+            if index == self.page_size:
+                has_more = True
+                break
+            if first is None:
+                first = row
+            last = row
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+        # First and last rows are all links need
+        self.page = [row for row in (first, last) if row is not None]
+        self.set_links(has_more)
+
+    def get_page_queryset(self, queryset, request, view):
+        """``queryset`` ordered by the keyset, starting after the cursor"""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.model = queryset.model
+        self.keyset = self.get_ordering(request, queryset, view)
+        self.cursor_values, self.reverse = self.decode_cursor(request)
+
+        order = [
+            (field, descending != self.reverse) for field, descending in self.keyset
+        ]
+        queryset = queryset.order_by(
+            *(self.order_expression(field, descending) for field, descending in order)
+        )
+        if self.cursor_values is not None:
+            queryset = queryset.filter(self.after_cursor(order, self.cursor_values))
+        return queryset
+
+    def set_links(self, has_more):
+        self.has_next = has_more if not self.reverse else True
+        self.has_previous = has_more if self.reverse else self.cursor_values is not None
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_ordering(self, request, queryset, view):
+        """``[(field, descending)]`` from ``OrderingFilter`` or view ordering"""
+        ordering = None
+        for backend in getattr(view, "filter_backends", ()):
+            if issubclass(backend, OrderingFilter):
+                ordering = backend().get_ordering(request, queryset, view)
+        ordering = ordering or getattr(view, "ordering", None) or self.ordering
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+
+        fields = [(term.lstrip("-"), term.startswith("-")) for term in ordering]
+        fields = [("id" if field == "pk" else field, desc) for field, desc in fields]
+        if "id" not in {field for field, _ in fields}:
+            fields.append(("id", fields[-1][1]))
+        return fields
+
+    def get_model_field(self, field):
+        """Model field ordered by, ``None`` for annotations"""
+        try:
+            return self.model._meta.get_field(field)
+        except FieldDoesNotExist:
+            return None
+
+    def order_expression(self, field, descending):
+        # Reversed order keeps nulls at the same end of the whole list
+        nulls = {"nulls_first": True} if self.reverse else {"nulls_last": True}
+        return F(field).desc(**nulls) if descending else F(field).asc(**nulls)
+
+    def after_cursor(self, order, values):
+        """Rows following cursor ``values`` in ``order``"""
+        condition = Q(pk__in=[])
+        equal = Q()
+        for (field, descending), value in zip(order, values):
+            model_field = self.get_model_field(field)
+            nullable = model_field is None or model_field.null
+            if value is None:
+                if self.reverse:
+                    condition |= equal & Q(**{f"{field}__isnull": False})
+                equal &= Q(**{f"{field}__isnull": True})
+                continue
+            beyond = Q(**{f"{field}__{'lt' if descending else 'gt'}": value})
+            if nullable and not self.reverse:
+                beyond |= Q(**{f"{field}__isnull": True})
+            condition |= equal & beyond
+            equal &= Q(**{field: value})
+        return condition
+
+    def encode_cursor(self, instance, reverse):
+        values = []
+        for field, _ in self.keyset:
+            model_field = self.get_model_field(field)
+            if model_field is None:
+                values.append(getattr(instance, field))
+                continue
+            value = getattr(instance, model_field.attname)
+            values.append(
+                None if value is None else model_field.value_to_string(instance)
+            )
+        payload = {"o": [f"{'-' * d}{f}" for f, d in self.keyset], "v": values}
+        if reverse:
+            payload["r"] = 1
+        cursor = signing.dumps(payload, salt=self.salt, compress=True)
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        """Cursor values and direction, ``(None, False)`` for the first page"""
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            payload = signing.loads(cursor, salt=self.salt)
+            if payload["o"] != [f"{'-' * d}{f}" for f, d in self.keyset]:
+                raise ValueError("Cursor of another ordering")
+            values = [
+                self.decode_value(field, value)
+                for (field, _), value in zip(self.keyset, payload["v"], strict=True)
+            ]
+        except (signing.BadSignature, KeyError, TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return values, bool(payload.get("r"))
+
+    def decode_value(self, field, value):
+        model_field = self.get_model_field(field)
+        if value is None or model_field is None:
+            # Annotation values are stored as JSON in the signed cursor
+            return value
+        return model_field.to_python(value)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+class TrackListPagination(KeysetPagination):
+    """Keyset pagination, page numbers for clients sending ``?page=``"""
+
+    page_number_class = TrackAPIListPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_number = None
+        if self.page_number_class.page_query_param in request.query_params:
+            self.page_number = self.page_number_class()
+            return self.page_number.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.page_number is not None:
+            return self.page_number.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def stream_page(self, queryset, request, view=None, chunk_size=100):
+        param = self.page_number_class.page_query_param
+        if param in request.query_params:
+            raise exceptions.ValidationError(
+                {param: "Streamed pages are selected with cursors."}
+            )
+        return super().stream_page(queryset, request, view, chunk_size)
+
+
+class MediaFileView(views.APIView):
+    """Serve image of object with ETag/Last-Modified validators"""
+
+    serializer_class = None
+    queryset = None
+    lookup_field = "id"
+    file_field = "cover"
+
+    def get_queryset(self):
+        return self.queryset.all()
+
+    def get(self, request, pk):
+        instance = get_object_or_404(self.get_queryset(), **{self.lookup_field: pk})
+        file = getattr(instance, self.file_field)
+        if not file:
+            raise Http404
+        return sendfile(request, file.path, filename=file.name)
+
+
+class CacheStatsView(views.APIView):
+    """Hit, miss and invalidation counters of caches for staff"""
+
+    serializer_class = None
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(get_cache_stats())
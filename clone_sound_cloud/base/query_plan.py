@@ -0,0 +1,134 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+
+def get_readable_fields(serializer):
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    return [field for field in serializer.fields.values() if not field.write_only]
+
+
+def reads_only_pk(field):
+    if isinstance(field, serializers.ManyRelatedField):
+        field = field.child_relation
+    return isinstance(field, serializers.PrimaryKeyRelatedField)
+
+
+def join(path, name):
+    return f"{path}__{name}" if path else name
+
+
+class QueryPlan:
+    """Relations and columns of ``model`` read by a serializer.
+
+    Forward foreign keys and one-to-one relations are joined with
+    ``select_related``, to-many relations get a ``Prefetch`` with their own
+    plan. Columns are collected for ``only()``; when a serializer reads an
+    attribute that is not a column, every column of that model is kept.
+    """
+
+    def __init__(self, model, annotations=()):
+        self.model = model
+        self.annotations = set(annotations)
+        self.select = set()
+        self.prefetch = {}
+        self.columns = {model._meta.pk.name}
+
+    def add_all_columns(self, model, path):
+        self.columns.update(
+            join(path, field.name)
+            for field in model._meta.concrete_fields
+            if not field.many_to_many
+        )
+
+    def add_serializer(self, serializer, model=None, path=""):
+        model = model or self.model
+        for field in get_readable_fields(serializer):
+            if field.source == "*":
+                self.add_all_columns(model, path)
+                continue
+            self.add_source(field, model, path, field.source_attrs)
+
+    def add_source(self, field, model, path, attrs):
+        if not attrs:
+            if isinstance(field, serializers.BaseSerializer):
+                self.add_serializer(field, model, path)
+            elif not reads_only_pk(field):
+                self.add_all_columns(model, path)
+            return
+
+        name = attrs[0]
+        try:
+            model_field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            if not (path == "" and name in self.annotations):
+                # Property or method, it may read any column
+                self.add_all_columns(model, path)
+            return
+
+        if not model_field.is_relation:
+            self.columns.add(join(path, name))
+            return
+
+        related_model = model_field.related_model
+        if model_field.many_to_many or model_field.one_to_many:
+            lookup = join(path, name)
+            plan = self.prefetch.setdefault(lookup, QueryPlan(related_model))
+            if model_field.one_to_many:
+                # Prefetched rows are matched to parents by their foreign key
+                plan.columns.add(model_field.field.name)
+            plan.add_source(field, related_model, "", attrs[1:])
+            return
+
+        if model_field.concrete:
+            self.columns.add(join(path, name))
+            if len(attrs) == 1 and reads_only_pk(field):
+                # Primary key of the related row is the foreign key column
+                return
+        self.select.add(join(path, name))
+        self.add_source(field, related_model, join(path, name), attrs[1:])
+
+    def apply(self, queryset, only=True, columns=()):
+        if self.select:
+            queryset = queryset.select_related(*sorted(self.select))
+        if self.prefetch:
+            queryset = queryset.prefetch_related(
+                *(
+                    Prefetch(
+                        lookup,
+                        queryset=plan.apply(
+                            plan.model._default_manager.all(), only=only
+                        ),
+                    )
+                    for lookup, plan in sorted(self.prefetch.items())
+                )
+            )
+        if only:
+            queryset = queryset.only(*sorted(self.columns | set(columns)))
+        return queryset
+
+
+def get_ordering_columns(queryset):
+    """Columns of the queryset model it is ordered by, cursors read them"""
+    columns = []
+    for term in queryset.query.order_by:
+        if isinstance(term, str):
+            name = term.lstrip("-")
+            if "__" not in name and name not in queryset.query.annotations:
+                columns.append(name)
+    return columns
+
+
+def plan_queryset(queryset, serializer, only=True):
+    """``queryset`` loading exactly what ``serializer`` reads"""
+    plan = QueryPlan(queryset.model, queryset.query.annotations)
+    plan.add_serializer(serializer)
+    return plan.apply(queryset, only=only, columns=get_ordering_columns(queryset))
+
+
+def plan_page(queryset, columns):
+    """``queryset`` loading ``columns`` and what pagination reads only"""
+    return queryset.only(
+        queryset.model._meta.pk.name, *columns, *get_ordering_columns(queryset)
+    )
@@ -0,0 +1,94 @@
+import mimetypes
+import os
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date
+
+from base.services import load_backend
+from base.streaming import file_validators, ranged_file_response
+
+
+class FileResponseBackend:
+    """Send file bytes from the Django worker, used in development"""
+
+    def send(
+        self, request, path, filename=None, as_attachment=False, etag=None, start=None
+    ):
+        return ranged_file_response(
+            request,
+            path,
+            filename=filename,
+            as_attachment=as_attachment,
+            etag=etag,
+            start=start,
+        )
+
+
+class NginxBackend:
+    """Hand file transfer over to nginx with ``X-Accel-Redirect``.
+
+    nginx serves the file from an ``internal`` location, including Range
+    requests, so the worker is released as soon as the headers are built.
+    nginx cannot start a response at an arbitrary offset, responses with
+    ``start`` are sent by Django.
+    """
+
+    def send(
+        self, request, path, filename=None, as_attachment=False, etag=None, start=None
+    ):
+        if start is not None:
+            return FileResponseBackend().send(
+                request, path, filename, as_attachment, etag, start
+            )
+
+        root = os.path.realpath(settings.SENDFILE_ROOT)
+        path = os.path.realpath(path)
+        if os.path.commonpath([root, path]) != root:
+            raise SuspiciousFileOperation(f"{path} is outside of SENDFILE_ROOT")
+
+        filename = os.path.basename(filename or path)
+        relative_path = os.path.relpath(path, root).replace(os.sep, "/")
+        content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = settings.SENDFILE_URL + quote(relative_path)
+        response["Content-Disposition"] = content_disposition_header(
+            as_attachment, filename
+        )
+        return response
+
+
+def get_sendfile_backend():
+    return load_backend(settings.SENDFILE_BACKEND)
+
+
+def sendfile(request, path, filename=None, as_attachment=False, start=None):
+    """Send file with configured ``SENDFILE_BACKEND``.
+
+    ``If-None-Match``/``If-Modified-Since`` are answered from ``stat()``
+    alone, the file is opened only when its bytes have to be sent.
+    ``start`` sends a 206 response from this byte offset when the client
+    did not ask for a ``Range`` itself.
+    """
+    try:
+        etag, last_modified = file_validators(path)
+    except FileNotFoundError:
+        raise Http404
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = get_sendfile_backend().send(
+            request,
+            path,
+            filename=filename,
+            as_attachment=as_attachment,
+            etag=etag,
+            start=start,
+        )
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    return response
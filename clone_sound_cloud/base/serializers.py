@@ -0,0 +1,212 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.db.models import Manager
+from django.utils.module_loading import import_string
+from rest_framework import permissions, serializers
+
+from base.cache import get_object_namespace, get_versions
+from base.query_plan import plan_queryset
+from base.tiered_cache import TieredCache
+
+FIELDS_PARAM = "fields"
+OMIT_PARAM = "omit"
+EXPAND_PARAM = "expand"
+
+fragment_cache = TieredCache("fragments", max_size=2000)
+
+
+def parse_paths(value):
+    """``"id,user.display_name"`` as ``{"id": {}, "user": {"display_name": {}}}``"""
+    tree = {}
+    for path in (value or "").split(","):
+        node = tree
+        for name in filter(None, (name.strip() for name in path.split("."))):
+            node = node.setdefault(name, {})
+    return tree
+
+
+class DynamicFieldsMixin:
+    """Sparse fieldsets and opt-in expansion of a serializer from the request.
+
+    ``?fields=`` keeps only the listed fields, ``?omit=`` drops them and
+    ``?expand=`` replaces fields named in ``Meta.expandable_fields`` by the
+    nested serializer given there, as a dotted path or the class itself,
+    with its keyword arguments. Nested fields are reached with dots, like
+    ``fields=id,user.display_name``. Writes are never affected.
+    """
+
+    def get_field_spec(self):
+        spec = getattr(self, "_field_spec", None)
+        if spec is not None:
+            return spec
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        request = self.context.get("request")
+        if (
+            parent is not None
+            or request is None
+            or request.method not in permissions.SAFE_METHODS
+        ):
+            return {}, {}, {}
+        params = request.query_params
+        return (
+            parse_paths(params.get(FIELDS_PARAM)),
+            parse_paths(params.get(OMIT_PARAM)),
+            parse_paths(params.get(EXPAND_PARAM)),
+        )
+
+    def get_fields(self):
+        fields = super().get_fields()
+        only, omit, expand = self.get_field_spec()
+
+        expandable = getattr(getattr(self, "Meta", None), "expandable_fields", {})
+        for name in expand:
+            if name in expandable:
+                serializer_class, kwargs = expandable[name]
+                if isinstance(serializer_class, str):
+                    serializer_class = import_string(serializer_class)
+                fields[name] = serializer_class(read_only=True, **kwargs)
+
+        for name in list(fields):
+            if (only and name not in only) or omit.get(name) == {}:
+                del fields[name]
+                continue
+            field = fields[name]
+            if isinstance(field, serializers.ListSerializer):
+                field = field.child
+            if isinstance(field, DynamicFieldsMixin):
+                field._field_spec = (
+                    only.get(name, {}),
+                    omit.get(name, {}),
+                    expand.get(name, {}),
+                )
+        return fields
+
+
+class FragmentCacheListSerializer(serializers.ListSerializer):
+    """List serialized from cached representations of each object.
+
+    A fragment is the child representation of one object, stored with the
+    versions of the object, of the objects its ``Meta.fragment_related``
+    foreign keys point to and of ``Meta.fragment_namespaces``, other models
+    it embeds, so a bump of any invalidates it. Versions and fragments
+    of a list are each read with one ``get_many``, from process memory for
+    hot objects; only objects without a current fragment are serialized.
+    Top level rows are expected to hold no more than ``get_page_columns``,
+    so those are loaded again by one planned query. Fields named in
+    ``Meta.fragment_live_fields``, like counters updated in bulk, are always
+    read from the row.
+    """
+
+    def to_representation(self, data):
+        instances = list(data.all() if isinstance(data, Manager) else data)
+        if not instances:
+            return []
+        meta = self.child.Meta
+        shared_namespaces = list(getattr(meta, "fragment_namespaces", ()))
+        object_namespaces = {
+            obj.pk: self.get_object_namespaces(obj) for obj in instances
+        }
+        namespaces = list(
+            dict.fromkeys(
+                shared_namespaces
+                + [ns for names in object_namespaces.values() for ns in names]
+            )
+        )
+        versions = dict(zip(namespaces, get_versions(namespaces)))
+        shared = [versions[namespace] for namespace in shared_namespaces]
+        stamps = {
+            pk: ([versions[namespace] for namespace in names], shared)
+            for pk, names in object_namespaces.items()
+        }
+        prefix = self.get_fragment_prefix()
+        keys = {obj.pk: f"{prefix}:{obj.pk}" for obj in instances}
+
+        cached = fragment_cache.get_many(keys.values())
+        fragments = {
+            pk: entry[1]
+            for pk, entry in ((pk, cached.get(key)) for pk, key in keys.items())
+            if entry is not None and entry[0] == stamps[pk]
+        }
+
+        missing = [obj for obj in instances if obj.pk not in fragments]
+        if missing:
+            serialized = self.serialize(missing)
+            # Readers check the stamps, other processes need no invalidation
+            fragment_cache.set_many(
+                {keys[pk]: (stamps[pk], fragment) for pk, fragment in serialized},
+                settings.FRAGMENT_CACHE_TIMEOUT,
+                broadcast=False,
+            )
+            fragments.update(serialized)
+        return [self.add_live_fields(fragments[obj.pk], obj) for obj in instances]
+
+    def get_object_namespaces(self, instance):
+        """Namespaces of ``instance`` and of the objects it embeds"""
+        model = self.child.Meta.model
+        namespaces = [get_object_namespace(model, instance.pk)]
+        for name in getattr(self.child.Meta, "fragment_related", ()):
+            field = model._meta.get_field(name)
+            pk = getattr(instance, field.attname)
+            if pk is not None:
+                namespaces.append(get_object_namespace(field.related_model, pk))
+        return namespaces
+
+    def get_fragment_prefix(self):
+        child = self.child
+        request = self.context.get("request")
+        spec = child.get_field_spec() if isinstance(child, DynamicFieldsMixin) else {}
+        # Hyperlinks of files are absolute, built with the request host
+        digest = hashlib.sha1(
+            json.dumps(
+                [request.get_host() if request else None, spec], sort_keys=True
+            ).encode()
+        ).hexdigest()
+        return f"fragment:{type(child).__module__}.{type(child).__qualname__}:{digest}"
+
+    def serialize(self, instances):
+        rows = {}
+        if self.parent is None:
+            queryset = self.child.Meta.model._default_manager.filter(
+                pk__in=[obj.pk for obj in instances]
+            )
+            rows = plan_queryset(queryset, self.child).in_bulk()
+        return [
+            (obj.pk, self.child.to_representation(rows.get(obj.pk, obj)))
+            for obj in instances
+        ]
+
+    def add_live_fields(self, fragment, instance):
+        live_fields = getattr(self.child.Meta, "fragment_live_fields", ())
+        if live_fields:
+            # Fragments kept in process memory are shared between requests
+            fragment = fragment.copy()
+        for name in live_fields:
+            if name in fragment:
+                field = self.child.fields[name]
+                attribute = field.get_attribute(instance)
+                fragment[name] = (
+                    None if attribute is None else field.to_representation(attribute)
+                )
+        return fragment
+
+
+def get_page_columns(serializer):
+    """Columns of top level rows of a fragment cached list, None otherwise"""
+    meta = getattr(serializer, "Meta", None)
+    list_serializer_class = getattr(meta, "list_serializer_class", None)
+    if not (
+        list_serializer_class
+        and issubclass(list_serializer_class, FragmentCacheListSerializer)
+    ):
+        return None
+    fields = serializer.fields
+    # Foreign keys of fragment_related objects key their versions
+    return [
+        fields[name].source
+        for name in getattr(meta, "fragment_live_fields", ())
+        if name in fields
+    ] + list(getattr(meta, "fragment_related", ()))
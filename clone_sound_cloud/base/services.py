@@ -1,6 +1,10 @@
 import os.path
+from functools import lru_cache
 
 from django.core.exceptions import ValidationError
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.module_loading import import_string
 
 
 def get_path_upload_avatar(instance, file):
@@ -44,3 +48,28 @@ def delete_old_file(path_file):
     """Delete old file"""
     if os.path.exists(path_file):
         os.remove(path_file)
+
+
+@lru_cache
+def load_backend(path):
+    """Instance of backend class by dotted path, shared per process"""
+    return import_string(path)()
+
+
+def incr_counter(queryset, field, amount=1):
+    """Atomically add ``amount`` to counter column, never going below zero"""
+    if amount < 0:
+        queryset = queryset.filter(**{f"{field}__gte": -amount})
+    return queryset.update(**{field: F(field) + amount})
+
+
+def count_subquery(queryset, field, outer_ref="pk"):
+    """Number of ``queryset`` rows whose ``field`` is the outer row"""
+    rows = (
+        queryset.filter(**{field: OuterRef(outer_ref)})
+        .order_by()
+        .values(field)
+        .annotate(total=Count("*"))
+        .values("total")
+    )
+    return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
@@ -0,0 +1,65 @@
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+
+BLOBS_DIR = "blobs"
+HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def get_content_hash(name):
+    """SHA-256 of a content-addressed file from its name, ``None`` otherwise"""
+    digest = os.path.splitext(os.path.basename(name))[0]
+    return digest if HASH_RE.match(digest) else None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Store files under the SHA-256 of their content.
+
+    Names look like ``blobs/ab/cd/abcd...ef.mp3``, the path built by
+    ``upload_to`` only gives the extension. Identical uploads share one file,
+    deleting it is left to reference counting of ``audio_library.blobs``.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # The name of the stored file is only known once its content is read
+        return name
+
+    def hash_name(self, digest, name):
+        extension = os.path.splitext(name)[1].lower()
+        return f"{BLOBS_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+    def _save(self, name, content):
+        tmp_dir = self.path(os.path.join(BLOBS_DIR, "tmp"))
+        os.makedirs(tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+
+        if hasattr(content, "temporary_file_path"):
+            with open(content.temporary_file_path(), "rb") as f:
+                for block in iter(lambda: f.read(64 * 1024), b""):
+                    digest.update(block)
+            tmp_path = content.temporary_file_path()
+        else:
+            fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+            with os.fdopen(fd, "wb") as f:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    f.write(chunk)
+
+        name = self.hash_name(digest.hexdigest(), name)
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            if not hasattr(content, "temporary_file_path"):
+                os.remove(tmp_path)
+            # Reused file is recent again for the orphan collection
+            os.utime(full_path)
+            return name
+
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        file_move_safe(tmp_path, full_path, allow_overwrite=True)
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+        return name
@@ -0,0 +1,232 @@
+import hashlib
+import mimetypes
+import os
+import re
+import uuid
+from collections import deque
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import FileResponse, HttpResponse
+from django.utils.http import http_date, parse_http_date_safe
+
+from base.storage import get_content_hash
+
+MAX_RANGES = 16
+RANGE_SPEC_RE = re.compile(r"^(\d*)-(\d*)$")
+
+
+def parse_range_header(header, size):
+    """Parse ``Range`` header into sorted, merged ``(start, end)`` byte pairs.
+
+    Returns ``None`` when the header is missing, malformed or uses another unit
+    (the whole file must be served) and ``[]`` when nothing is satisfiable.
+    """
+    if not header:
+        return None
+    unit, _, specs = header.partition("=")
+    if unit.strip().lower() != "bytes" or not specs.strip():
+        return None
+
+    specs = [spec.strip() for spec in specs.split(",") if spec.strip()]
+    if len(specs) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for spec in specs:
+        match = RANGE_SPEC_RE.match(spec)
+        if match is None:
+            return None
+        first, last = match.groups()
+        if not first and not last:
+            return None
+        if not first:
+            suffix = int(last)
+            if suffix == 0:
+                continue
+            ranges.append((max(size - suffix, 0), size - 1))
+            continue
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        if start >= size:
+            continue
+        end = int(last) if last else size - 1
+        ranges.append((start, min(end, size - 1)))
+
+    ranges.sort()
+    merged = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def if_range_matches(request, etag=None, last_modified=None):
+    """Check ``If-Range`` validator, a missing header always matches"""
+    value = request.headers.get("If-Range")
+    if not value:
+        return True
+    value = value.strip()
+    if value.startswith(("W/", '"')):
+        return etag is not None and value == etag
+    date = parse_http_date_safe(value)
+    return date is not None and last_modified is not None and date == last_modified
+
+
+class RangeFile:
+    """Read-only file-like object returning only selected byte ranges of a file.
+
+    Parts are raw ``bytes`` emitted as they are or inclusive ``(start, end)``
+    offsets of the file. There is no ``fileno()``/``seek()`` on purpose, so WSGI
+    servers iterate it instead of sendfile()-ing the whole underlying file.
+    """
+
+    def __init__(self, path, parts):
+        self.name = path
+        self.file = open(path, "rb")
+        self._parts = deque(parts)
+
+    def read(self, size=-1):
+        while self._parts:
+            part = self._parts[0]
+            if isinstance(part, bytes):
+                self._parts.popleft()
+                if part:
+                    return part
+                continue
+
+            start, end = part
+            length = end - start + 1
+            if size is not None and 0 <= size < length:
+                length = size
+            self.file.seek(start)
+            data = self.file.read(length)
+            if not data or start + len(data) > end:
+                self._parts.popleft()
+            else:
+                self._parts[0] = (start + len(data), end)
+            if data:
+                return data
+        return b""
+
+    def close(self):
+        self.file.close()
+
+
+class MediaFileResponse(FileResponse):
+    block_size = 64 * 1024
+
+
+def file_validators(path):
+    """Strong ETag and Last-Modified timestamp of a file from one stat call.
+
+    Content-addressed files use their hash as a permanent ETag. Others get
+    the same ``"mtime-size"`` format nginx uses, so validators stay valid
+    when the bytes are sent by nginx instead of Django.
+    """
+    etag, last_modified = stat_validators(os.stat(path))
+    digest = get_content_hash(path)
+    return (f'"{digest}"' if digest else etag), last_modified
+
+
+def stat_validators(stat):
+    last_modified = int(stat.st_mtime)
+    return f'"{last_modified:x}-{stat.st_size:x}"', last_modified
+
+
+def ranged_file_response(
+    request, path, filename=None, as_attachment=False, etag=None, start=None
+):
+    """Serve a file honouring ``Range``/``If-Range`` (RFC 7233).
+
+    ``start`` answers a request without ``Range`` as if it asked for the
+    bytes from this offset to the end of the file.
+    """
+    stat = os.stat(path)
+    size = stat.st_size
+    default_etag, last_modified = stat_validators(stat)
+    etag = etag or default_etag
+    filename = os.path.basename(filename or path)
+
+    ranges = None
+    if start is not None and "Range" not in request.headers:
+        ranges = [(start, size - 1)] if start < size else []
+    elif if_range_matches(request, etag, last_modified):
+        ranges = parse_range_header(request.headers.get("Range"), size)
+
+    if ranges == []:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+    elif not ranges:
+        response = MediaFileResponse(
+            open(path, "rb"), filename=filename, as_attachment=as_attachment
+        )
+    elif len(ranges) == 1:
+        start, end = ranges[0]
+        response = MediaFileResponse(
+            RangeFile(path, [(start, end)]),
+            filename=filename,
+            as_attachment=as_attachment,
+            status=206,
+        )
+        response["Content-Length"] = end - start + 1
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    else:
+        content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        boundary = uuid.uuid4().hex
+        parts = []
+        for start, end in ranges:
+            parts.append(
+                (
+                    f"--{boundary}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+                ).encode()
+            )
+            parts.append((start, end))
+            parts.append(b"\r\n")
+        parts.append(f"--{boundary}--\r\n".encode())
+
+        response = MediaFileResponse(
+            RangeFile(path, parts),
+            filename=filename,
+            as_attachment=as_attachment,
+            status=206,
+            content_type=f"multipart/byteranges; boundary={boundary}",
+        )
+        response["Content-Length"] = sum(
+            len(part) if isinstance(part, bytes) else part[1] - part[0] + 1
+            for part in parts
+        )
+
+    response["Accept-Ranges"] = "bytes"
+    response["Last-Modified"] = http_date(last_modified)
+    response["ETag"] = etag
+    return response
+
+
+def get_listener_id(request):
+    """Identify listener by user id or by hashed client address and agent"""
+    if request.user.is_authenticated:
+        return f"user_{request.user.id}"
+    forwarded = request.META.get("HTTP_X_FORWARDED_FOR", "")
+    address = forwarded.split(",")[0].strip() or request.META.get("REMOTE_ADDR", "")
+    agent = request.META.get("HTTP_USER_AGENT", "")
+    return hashlib.sha1(f"{address}|{agent}".encode()).hexdigest()
+
+
+def start_listening_session(request, kind, object_id):
+    """Return True only for the first request of a listening session.
+
+    Range requests made while seeking keep the session alive instead of
+    starting a new one, so plays and downloads are counted once.
+    """
+    key = f"listening:{kind}:{object_id}:{get_listener_id(request)}"
+    timeout = settings.LISTENING_SESSION_TIMEOUT
+    if cache.add(key, 1, timeout):
+        return True
+    cache.touch(key, timeout)
+    return False
@@ -0,0 +1,42 @@
+from cachalot.api import cachalot_disabled
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from base.tiered_cache import clear_local_caches
+
+
+def clear_caches():
+    """Empty the shared cache and local tiers of this process"""
+    cache.clear()
+    clear_local_caches()
+
+
+class QueryCountTestMixin:
+    """Assertions on queries run by list endpoints, for ``TestCase``"""
+
+    def assertQueryCountConstant(self, url, page_sizes=(1, 3), **params):
+        """Fail when a bigger page of ``url`` runs more queries.
+
+        There must be enough rows to fill the biggest page. Query caching is
+        disabled and the cache cleared, every request runs all of its queries.
+        """
+        counts = {}
+        with cachalot_disabled():
+            for page_size in page_sizes:
+                clear_caches()
+                with CaptureQueriesContext(connection) as queries:
+                    res = self.client.get(url, {**params, "page_size": page_size})
+                self.assertEqual(res.status_code, 200)
+                self.assertEqual(
+                    len(res.data["results"]),
+                    page_size,
+                    "Not enough rows to fill the page",
+                )
+                counts[page_size] = len(queries)
+        self.assertEqual(
+            len(set(counts.values())),
+            1,
+            f"Queries by page size grow: {counts}\n"
+            + "\n".join(query["sql"] for query in queries.captured_queries),
+        )
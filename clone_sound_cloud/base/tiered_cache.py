@@ -0,0 +1,202 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from base.cache_stats import incr_cache_stat
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "tiered_cache:invalidate"
+ORIGIN = uuid.uuid4().hex
+MISSING = object()
+
+_caches = {}
+_listener_lock = threading.Lock()
+_listener_pid = None
+
+
+class LRUCache:
+    """Size bounded, least recently used first evicted, expiring mapping"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            if entry[0] <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._data[key] = (time.monotonic() + timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TieredCache:
+    """Process-local LRU in front of the Django cache for small hot values.
+
+    Reads try the local tier first, then the shared cache, and keep what they
+    find locally for ``TIERED_CACHE_LOCAL_TIMEOUT`` seconds. Changes are
+    published on a Redis channel and every process drops its local copies
+    when it hears about them. A value read from the shared cache is kept
+    only when no invalidation arrived meanwhile; if a message is lost, the
+    local timeout bounds how long a stale copy lives.
+    """
+
+    def __init__(self, namespace, max_size=1000):
+        self.namespace = namespace
+        self.local = LRUCache(max_size)
+        self.generation = 0
+        _caches[namespace] = self
+
+    def get_many(self, keys):
+        ensure_listener()
+        found = {}
+        missing = []
+        for key in keys:
+            value = self.local.get(key)
+            if value is MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+        if found:
+            incr_cache_stat(self.namespace, "local_hit", len(found))
+        if missing:
+            generation = self.generation
+            shared = cache.get_many(missing)
+            self.keep(shared, generation)
+            found.update(shared)
+            if shared:
+                incr_cache_stat(self.namespace, "shared_hit", len(shared))
+            if len(shared) < len(missing):
+                incr_cache_stat(self.namespace, "miss", len(missing) - len(shared))
+        if found:
+            incr_cache_stat(self.namespace, "hit", len(found))
+        return found
+
+    def get(self, key, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT):
+        value = self.get(key, MISSING)
+        if value is MISSING:
+            generation = self.generation
+            value = cache.get_or_set(key, default, timeout)
+            self.keep({key: value}, generation)
+        return value
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, broadcast=True):
+        """Store ``data`` in both tiers.
+
+        Values validated by their readers, like fragments stored with the
+        versions they were built from, need no ``broadcast``.
+        """
+        cache.set_many(data, timeout)
+        if broadcast:
+            self.invalidate(list(data))
+        self.keep(data, self.generation)
+
+    def keep(self, data, generation):
+        if generation != self.generation:
+            return
+        timeout = settings.TIERED_CACHE_LOCAL_TIMEOUT
+        for key, value in data.items():
+            self.local.set(key, value, timeout)
+
+    def invalidate(self, keys):
+        """Drop local copies of ``keys`` in every process"""
+        self.drop(keys)
+        publish(self.namespace, list(keys))
+
+    def drop(self, keys=None):
+        self.generation += 1
+        if keys is None:
+            self.local.clear()
+            return
+        for key in keys:
+            self.local.delete(key)
+
+
+def publish(namespace, keys):
+    message = json.dumps(
+        {"origin": f"{ORIGIN}:{os.getpid()}", "namespace": namespace, "keys": keys}
+    )
+    try:
+        get_redis_connection("default").publish(CHANNEL, message)
+    except RedisError:
+        logger.warning("Tiered cache invalidation of %s not published", namespace)
+
+
+def handle_message(data):
+    message = json.loads(data)
+    if message["origin"] == f"{ORIGIN}:{os.getpid()}":
+        return
+    tiered_cache = _caches.get(message["namespace"])
+    if tiered_cache is not None:
+        tiered_cache.drop(message["keys"])
+
+
+def clear_local_caches():
+    for tiered_cache in _caches.values():
+        tiered_cache.drop()
+
+
+def listen():
+    while True:
+        try:
+            pubsub = get_redis_connection("default").pubsub(
+                ignore_subscribe_messages=True
+            )
+            pubsub.subscribe(CHANNEL)
+            # Messages published while not subscribed are lost
+            clear_local_caches()
+            for message in pubsub.listen():
+                handle_message(message["data"])
+        except Exception:
+            logger.exception("Tiered cache invalidation listener failed")
+            clear_local_caches()
+            time.sleep(1)
+
+
+def ensure_listener():
+    """Start the invalidation listener of this process, once after a fork"""
+    global _listener_pid
+    if _listener_pid == os.getpid():
+        return
+    with _listener_lock:
+        if _listener_pid != os.getpid():
+            threading.Thread(
+                target=listen, name="tiered-cache-listener", daemon=True
+            ).start()
+            _listener_pid = os.getpid()
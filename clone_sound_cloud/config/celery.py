@@ -14,7 +14,23 @@ app.conf.beat_schedule = {
     "send-spam-mail-every-week-at-8": {
         "task": "oauth.tasks.send_spam_email_celery_task",
         "schedule": crontab(hour="14", minute="20", day_of_week="thu"),
-    }
+    },
+    "flush-track-counters-every-10-seconds": {
+        "task": "audio_library.tasks.flush_track_counters_celery_task",
+        "schedule": 10.0,
+    },
+    "flush-play-history-every-5-seconds": {
+        "task": "audio_library.tasks.flush_play_history_celery_task",
+        "schedule": 5.0,
+    },
+    "rebuild-suggest-index-every-hour": {
+        "task": "audio_library.tasks.rebuild_suggest_index_celery_task",
+        "schedule": crontab(minute="30"),
+    },
+    "delete-expired-upload-sessions-every-hour": {
+        "task": "audio_library.tasks.delete_expired_upload_sessions_celery_task",
+        "schedule": crontab(minute="0"),
+    },
 }
 
 # Load task modules from all registered Django apps.
@@ -150,6 +150,14 @@ STATIC_ROOT = BASE_DIR / "django_static"
 MEDIA_URL = "media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Uploads are deduplicated by content, see base.storage
+STORAGES = {
+    "default": {"BACKEND": "base.storage.ContentAddressedStorage"},
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+}
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
@@ -282,3 +290,119 @@ DEBUG_TOOLBAR_PANELS = [
     "debug_toolbar.panels.signals.SignalsPanel",
     "cachalot.panels.CachalotPanel",
 ]
+
+# STREAMING
+# Range requests of one listener within this window count as a single play
+LISTENING_SESSION_TIMEOUT = config("LISTENING_SESSION_TIMEOUT", 30 * 60, cast=int)
+
+# Media bytes are sent by base.sendfile.FileResponseBackend (development) or
+# handed over to nginx by base.sendfile.NginxBackend (X-Accel-Redirect)
+SENDFILE_BACKEND = config("SENDFILE_BACKEND", "base.sendfile.FileResponseBackend")
+SENDFILE_ROOT = MEDIA_ROOT
+SENDFILE_URL = "/protected-media/"
+
+# COUNTERS
+# Play and download increments are buffered and flushed to the database in
+# batches by audio_library.tasks.flush_track_counters_celery_task
+TRACK_COUNTER_BUFFER = config(
+    "TRACK_COUNTER_BUFFER", "audio_library.counters.RedisCounterBuffer"
+)
+
+# Listen history events are queued and upserted into PlayedUserTrack in bulk
+# by audio_library.tasks.flush_play_history_celery_task
+PLAY_HISTORY_QUEUE = config(
+    "PLAY_HISTORY_QUEUE", "audio_library.history.RedisHistoryQueue"
+)
+PLAY_HISTORY_MAX_LENGTH = 100_000
+PLAY_HISTORY_BATCH_SIZE = 1000
+
+# WAVEFORM
+# MP3 is decoded by ffmpeg, PCM WAV is read directly
+FFMPEG_BINARY = config("FFMPEG_BINARY", "ffmpeg")
+WAVEFORM_SAMPLE_RATE = 8000
+WAVEFORM_CACHE_MAX_AGE = 24 * 60 * 60
+
+# UPLOADS
+# Resumable uploads are assembled here, on the media volume so finalizing a
+# track moves the file instead of copying it
+UPLOAD_SESSION_ROOT = MEDIA_ROOT / "uploads"
+UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024
+UPLOAD_CHUNK_MAX_SIZE = 16 * 1024 * 1024
+UPLOAD_SESSION_MAX_SIZE = 1024 * 1024 * 1024
+# Sessions without any chunk received for this long are garbage-collected
+UPLOAD_SESSION_TIMEOUT = config("UPLOAD_SESSION_TIMEOUT", 24 * 60 * 60, cast=int)
+# Stored files without a reference for this long are garbage-collected
+MEDIA_BLOB_ORPHAN_AGE = config("MEDIA_BLOB_ORPHAN_AGE", 24 * 60 * 60, cast=int)
+
+# PAGINATION
+# Page counts of page-number clients are cached per filter set for this long
+PAGINATION_COUNT_TIMEOUT = config("PAGINATION_COUNT_TIMEOUT", 60, cast=int)
+# Unfiltered lists of tables at least this big report an estimated count
+PAGINATION_ESTIMATE_THRESHOLD = 100_000
+
+# SEARCH
+# Track search backend by database vendor, see audio_library.search
+TRACK_SEARCH_BACKENDS = {
+    "postgresql": "audio_library.search.PostgresSearchBackend",
+    "sqlite": "audio_library.search.SQLiteSearchBackend",
+}
+# Weight of ln(1 + plays + likes) added to the text relevance of a result
+TRACK_SEARCH_POPULARITY_WEIGHT = config(
+    "TRACK_SEARCH_POPULARITY_WEIGHT", 0.1, cast=float
+)
+
+# SUGGEST
+# Typeahead prefix index, audio_library.suggest.LocalSuggestIndex keeps an
+# in-process trie for installs without Redis
+SUGGEST_INDEX = config("SUGGEST_INDEX", "audio_library.suggest.RedisSuggestIndex")
+SUGGEST_LIMIT = 10
+SUGGEST_MAX_LIMIT = 20
+
+# FACETS
+# Facet counts of track lists are cached per filter set for this long
+FACET_COUNT_TIMEOUT = config("FACET_COUNT_TIMEOUT", 60, cast=int)
+
+# RESPONSE CACHE
+# Anonymous responses of public lists are fresh for this long, then served
+# stale for up to RESPONSE_CACHE_STALE_TIMEOUT more while one request
+# refreshes them, see base.classes.ResponseCacheMixin
+RESPONSE_CACHE_TIMEOUT = config("RESPONSE_CACHE_TIMEOUT", 30, cast=int)
+RESPONSE_CACHE_STALE_TIMEOUT = config("RESPONSE_CACHE_STALE_TIMEOUT", 300, cast=int)
+RESPONSE_CACHE_LOCK_TIMEOUT = 10
+# Seconds a request waits for another one building a missing entry
+RESPONSE_CACHE_LOCK_WAIT = 2
+# Above 1 early refreshes are more likely, below 1 less
+RESPONSE_CACHE_BETA = 1.0
+
+# FRAGMENT CACHE
+# Serialized tracks and authors of lists are cached per object for this long,
+# see base.serializers.FragmentCacheListSerializer
+FRAGMENT_CACHE_TIMEOUT = config("FRAGMENT_CACHE_TIMEOUT", 10 * 60, cast=int)
+
+# CACHALOT
+# Tables written on every play, like or uploaded chunk are not cached by
+# cachalot, each write would drop every cached query reading them. Track
+# lists are served by the response and fragment caches instead
+CACHALOT_UNCACHABLE_TABLES = (
+    "django_migrations",
+    "audio_library_track",
+    "audio_library_track_user_of_likes",
+    "audio_library_playedusertrack",
+    "audio_library_uploadsession",
+    "audio_library_uploadchunk",
+)
+# Hit, miss and invalidation counters of caches are added to Redis this
+# often, see base.cache_stats
+CACHE_STATS_FLUSH_INTERVAL = 10
+
+# TIERED CACHE
+# Hot values like version stamps and fragments are kept in process memory
+# this long at most, invalidations are broadcast over Redis pub/sub, see
+# base.tiered_cache
+TIERED_CACHE_LOCAL_TIMEOUT = config("TIERED_CACHE_LOCAL_TIMEOUT", 30, cast=int)
+
+# STREAMING LISTS
+# ?stream=1 list pages are written while rows are read in chunks of this
+# size, see base.classes.StreamingListMixin
+STREAMING_LIST_CHUNK_SIZE = 200
+STREAMING_LIST_MAX_PAGE_SIZE = 10_000
@@ -3,6 +3,8 @@ from django.urls import path, include
 from django.views.generic import TemplateView
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 
+from base.classes import CacheStatsView
+
 urlpatterns = [
     path(r'jet/', include('jet.urls', 'jet')),  # New Admin Panel for prod
     path("admin/", admin.site.urls),
@@ -15,6 +17,7 @@ urlpatterns = [
             template_name="assetlinks.json", content_type="application/json"
         ),
     ),
+    path("api/cache-stats/", CacheStatsView.as_view(), name="cache_stats"),
     path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
     path(
         "api/docs/",
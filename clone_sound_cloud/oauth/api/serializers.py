@@ -1,6 +1,7 @@
-from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 
+from base.serializers import DynamicFieldsMixin, FragmentCacheListSerializer
+
 from oauth.models import UserProfile, SocialLink, UserFollowing
 
 from djoser.serializers import UserCreateSerializer
@@ -13,7 +14,7 @@ class CustomUserCreateSerializer(UserCreateSerializer):
         fields = ("id", "email", "first_name", "last_name", "password")
 
 
-class SocialLinkSerializer(serializers.ModelSerializer):
+class SocialLinkSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = SocialLink
         fields = (
@@ -22,30 +23,41 @@ class SocialLinkSerializer(serializers.ModelSerializer):
         )
 
 
-class FollowingSerializer(serializers.ModelSerializer):
+class FollowersSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Card of user following the author"""
+
+    id = serializers.IntegerField(source="user.id", read_only=True)
+    display_name = serializers.CharField(
+        source="user.user_profile.display_name", read_only=True
+    )
+    avatar = serializers.ImageField(source="user.user_profile.avatar", read_only=True)
+    followed_at = serializers.DateTimeField(source="created_at", read_only=True)
+    is_followed = serializers.BooleanField(read_only=True)
+
     class Meta:
         model = UserFollowing
-        fields = (
-            "id",
-            "following_user",
-            "created_at",
-        )
+        fields = ("id", "display_name", "avatar", "followed_at", "is_followed")
 
 
-class FollowersSerializer(serializers.ModelSerializer):
+class FollowingSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Card of user followed by the author"""
+
+    id = serializers.IntegerField(source="following_user.id", read_only=True)
+    display_name = serializers.CharField(
+        source="following_user.user_profile.display_name", read_only=True
+    )
+    avatar = serializers.ImageField(
+        source="following_user.user_profile.avatar", read_only=True
+    )
+    followed_at = serializers.DateTimeField(source="created_at", read_only=True)
+    is_followed = serializers.BooleanField(read_only=True)
+
     class Meta:
         model = UserFollowing
-        fields = (
-            "id",
-            "user",
-            "created_at",
-        )
+        fields = ("id", "display_name", "avatar", "followed_at", "is_followed")
 
 
-class UserProfileSerializer(serializers.ModelSerializer):
-    following = serializers.SerializerMethodField()
-    followers = serializers.SerializerMethodField()
-
+class UserProfileSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = UserProfile
         fields = (
@@ -55,20 +67,40 @@ class UserProfileSerializer(serializers.ModelSerializer):
             "city",
             "bio",
             "display_name",
-            "following",
-            "followers",
+            "followers_count",
+            "following_count",
+            "tracks_count",
         )
+        read_only_fields = ("followers_count", "following_count", "tracks_count")
+
+
+class AuthorSummarySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Compact author embedded in tracks, comments and playlists"""
 
-    @extend_schema_field(FollowingSerializer)
-    def get_following(self, obj):
-        return FollowingSerializer(obj.user.following.all(), many=True).data
+    display_name = serializers.CharField(
+        source="user_profile.display_name", read_only=True
+    )
+    avatar = serializers.ImageField(source="user_profile.avatar", read_only=True)
+    followers_count = serializers.IntegerField(
+        source="user_profile.followers_count", read_only=True
+    )
+    following_count = serializers.IntegerField(
+        source="user_profile.following_count", read_only=True
+    )
 
-    @extend_schema_field(FollowersSerializer)
-    def get_followers(self, obj):
-        return FollowersSerializer(obj.user.followers.all(), many=True).data
+    class Meta:
+        model = get_user_model()
+        fields = (
+            "id",
+            "display_name",
+            "avatar",
+            "followers_count",
+            "following_count",
+        )
+        expandable_fields = {"social_links": (SocialLinkSerializer, {"many": True})}
 
 
-class AuthorSerializer(serializers.ModelSerializer):
+class AuthorSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user_profile = UserProfileSerializer(many=False)
     social_links = SocialLinkSerializer(many=True)
 
@@ -81,3 +113,6 @@ class AuthorSerializer(serializers.ModelSerializer):
             "user_profile",
             "social_links",
         )
+        # Versions of authors are bumped on changes of profiles, links and
+        # follows, see oauth.api.signals
+        list_serializer_class = FragmentCacheListSerializer
@@ -2,7 +2,25 @@ from django.contrib.auth import get_user_model
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
-from oauth.models import UserProfile
+from audio_library.blobs import track_media_fields
+from audio_library.suggest import track_suggestions
+from base.cache import bump_object_version_on_change, bump_version_on_change
+from oauth.models import SocialLink, UserFollowing, UserProfile
+
+track_media_fields(UserProfile, "avatar")
+track_suggestions(UserProfile, "author", "user_id")
+# Cached responses of author lists are keyed with these versions
+bump_version_on_change(get_user_model())
+bump_version_on_change(UserProfile)
+bump_version_on_change(UserFollowing)
+bump_version_on_change(SocialLink)
+# Cached fragments of authors are keyed with these
+bump_object_version_on_change(get_user_model())
+bump_object_version_on_change(UserProfile, get_user_model(), ("user_id",))
+bump_object_version_on_change(SocialLink, get_user_model(), ("user_id",))
+bump_object_version_on_change(
+    UserFollowing, get_user_model(), ("user_id", "following_user_id")
+)
 
 
 @receiver(post_save, sender=get_user_model())
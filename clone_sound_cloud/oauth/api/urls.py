@@ -16,6 +16,21 @@ urlpatterns = [
     ),
     path("author/", views.AuthorView.as_view({"get": "list"}), name="author"),
     path("author/<int:pk>/", views.AuthorView.as_view({"get": "retrieve"})),
+    path(
+        "author/<int:pk>/avatar/",
+        views.AuthorAvatarView.as_view(),
+        name="author_avatar",
+    ),
+    path(
+        "author/<int:pk>/followers/",
+        views.AuthorFollowersView.as_view(),
+        name="author_followers",
+    ),
+    path(
+        "author/<int:pk>/following/",
+        views.AuthorFollowingView.as_view(),
+        name="author_following",
+    ),
     path(
         "author/<int:pk>/follow-unfollow/",
         views.FollowAuthorView.as_view(),
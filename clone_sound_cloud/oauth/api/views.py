@@ -3,6 +3,8 @@ from django.contrib.auth import (
     update_session_auth_hash,
     authenticate,
 )
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Value
 from django.utils.timezone import now
 from django.shortcuts import render
 
@@ -11,7 +13,7 @@ from djoser.compat import get_user_email
 from djoser.conf import settings
 from djoser.views import UserViewSet
 
-from rest_framework import parsers, permissions, status, views, viewsets
+from rest_framework import generics, parsers, permissions, status, views, viewsets
 from rest_framework.generics import get_object_or_404
 from rest_framework.decorators import action
 from rest_framework.request import Request
@@ -21,7 +23,16 @@ from rest_framework_simplejwt.views import TokenObtainPairView
 
 from oauth.models import UserProfile, UserFollowing
 from oauth.tasks import send_email_celery_task
+from base.cache import bump_object_version
+from base.classes import (
+    FollowCursorPagination,
+    KeysetPagination,
+    MediaFileView,
+    QueryPlanMixin,
+    ResponseCacheMixin,
+)
 from base.permissions import IsAuthor
+from base.services import incr_counter
 from . import serializers
 
 User = get_user_model()
@@ -314,15 +325,68 @@ class UserProfileView(viewsets.ModelViewSet):
         return self.get_queryset()
 
 
-class AuthorView(viewsets.ReadOnlyModelViewSet):
+class AuthorView(ResponseCacheMixin, QueryPlanMixin, viewsets.ReadOnlyModelViewSet):
     """List authors"""
 
-    queryset = (
-        User.objects.all()
-        .prefetch_related("social_links", "user_profile", "following", "followers")
-        .select_related("user_profile")
-    )
+    queryset = User.objects.all()
     serializer_class = serializers.AuthorSerializer
+    pagination_class = KeysetPagination
+    ordering = ("-id",)
+    cache_namespaces = (
+        "oauth.user",
+        "oauth.userprofile",
+        "oauth.userfollowing",
+        "oauth.sociallink",
+    )
+
+
+class AuthorFollowListView(QueryPlanMixin, generics.ListAPIView):
+    """Base of followers/following lists of author.
+
+    ``is_followed`` tells whether the current user follows the listed user,
+    answered by the same query as the page.
+    """
+
+    pagination_class = FollowCursorPagination
+    author_field = None
+    user_field = None
+
+    def get_queryset(self):
+        author = get_object_or_404(User.objects.only("id"), id=self.kwargs["pk"])
+        queryset = UserFollowing.objects.filter(**{self.author_field: author})
+        if not self.request.user.is_authenticated:
+            return queryset.annotate(is_followed=Value(False))
+        return queryset.annotate(
+            is_followed=Exists(
+                UserFollowing.objects.filter(
+                    user=self.request.user, following_user=OuterRef(self.user_field)
+                )
+            )
+        )
+
+
+class AuthorFollowersView(AuthorFollowListView):
+    """Users following author"""
+
+    serializer_class = serializers.FollowersSerializer
+    author_field = "following_user"
+    user_field = "user"
+
+
+class AuthorFollowingView(AuthorFollowListView):
+    """Users followed by author"""
+
+    serializer_class = serializers.FollowingSerializer
+    author_field = "user"
+    user_field = "following_user"
+
+
+class AuthorAvatarView(MediaFileView):
+    """Avatar of author"""
+
+    queryset = UserProfile.objects.only("user_id", "avatar")
+    lookup_field = "user_id"
+    file_field = "avatar"
 
 
 class SocialLinkView(viewsets.ModelViewSet):
@@ -338,6 +402,14 @@ class SocialLinkView(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
 
+def update_follow_counters(user_id, author_id, amount):
+    incr_counter(UserProfile.objects.filter(user=user_id), "following_count", amount)
+    incr_counter(UserProfile.objects.filter(user=author_id), "followers_count", amount)
+    # Cached author fragments embed the counters
+    bump_object_version(User, user_id)
+    bump_object_version(User, author_id)
+
+
 class FollowAuthorView(views.APIView):
     """Follow author"""
 
@@ -350,23 +422,28 @@ class FollowAuthorView(views.APIView):
         if request.user == author:
             return Response({"message": "You can not follow yourself"}, status=200)
 
-        following_instance, created = UserFollowing.objects.get_or_create(
-            user=request.user, following_user=author
-        )
+        with transaction.atomic():
+            following_instance, created = UserFollowing.objects.get_or_create(
+                user=request.user, following_user=author
+            )
+            if created:
+                update_follow_counters(request.user.id, author.id, 1)
         if not created:
             return Response({"message": "Already following this user"}, status=200)
         return Response({"message": "Now following this user"}, status=201)
 
     def delete(self, request, pk):
         author = get_object_or_404(User, id=pk)
-        try:
-            following_instance = UserFollowing.objects.get(
+        with transaction.atomic():
+            # Concurrent unfollows delete the row once, only one counts it
+            deleted, _ = UserFollowing.objects.filter(
                 user=request.user, following_user=author
-            )
-            following_instance.delete()
-            return Response({"message": "Unfollowed successfully"}, status=204)
-        except UserFollowing.DoesNotExist:
+            ).delete()
+            if deleted:
+                update_follow_counters(request.user.id, author.id, -1)
+        if not deleted:
             return Response({"error": "You were not following this user"}, status=404)
+        return Response({"message": "Unfollowed successfully"}, status=204)
 
 
 class SpamEmailOnceWeek(views.APIView):
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("oauth", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="userfollowing",
+            index=models.Index(
+                fields=["following_user", "-created_at"],
+                name="followers_created_at_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="userfollowing",
+            index=models.Index(
+                fields=["user", "-created_at"], name="following_created_at_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:55
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(queryset, field, outer_ref="pk"):
+    """Number of ``queryset`` rows whose ``field`` is the outer row"""
+    rows = (
+        queryset.filter(**{field: OuterRef(outer_ref)})
+        .order_by()
+        .values(field)
+        .annotate(total=Count("*"))
+        .values("total")
+    )
+    return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+
+def fill_profile_counters(apps, schema_editor):
+    UserProfile = apps.get_model("oauth", "UserProfile")
+    UserFollowing = apps.get_model("oauth", "UserFollowing")
+    Track = apps.get_model("audio_library", "Track")
+    UserProfile.objects.update(
+        followers_count=count_subquery(
+            UserFollowing.objects.all(), "following_user", "user_id"
+        ),
+        following_count=count_subquery(UserFollowing.objects.all(), "user", "user_id"),
+        tracks_count=count_subquery(Track.objects.all(), "user", "user_id"),
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("oauth", "0002_follow_created_at_indexes"),
+        ("audio_library", "0007_track_comments_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userprofile",
+            name="followers_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="userprofile",
+            name="following_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="userprofile",
+            name="tracks_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_profile_counters, migrations.RunPython.noop),
+    ]
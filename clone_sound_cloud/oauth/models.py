@@ -66,6 +66,9 @@ class UserProfile(models.Model):
     city = models.CharField(max_length=30, blank=True, null=True)
     bio = models.TextField(max_length=2000, blank=True, null=True)
     display_name = models.CharField(max_length=30, blank=True, null=True)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    tracks_count = models.PositiveIntegerField(default=0)
     avatar = models.ImageField(
         upload_to=get_path_upload_avatar,
         blank=True,
@@ -105,6 +108,15 @@ class UserFollowing(models.Model):
                 fields=["user", "following_user"], name="unique_followers"
             )
         ]
+        indexes = [
+            models.Index(
+                fields=["following_user", "-created_at"],
+                name="followers_created_at_idx",
+            ),
+            models.Index(
+                fields=["user", "-created_at"], name="following_created_at_idx"
+            ),
+        ]
 
         ordering = ["-created_at"]
 
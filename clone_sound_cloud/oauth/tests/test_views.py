@@ -1,9 +1,11 @@
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
 
 from rest_framework.reverse import reverse
 from rest_framework.test import APIClient
 
+from base.testing import QueryCountTestMixin, clear_caches
 from oauth import models
 
 USERS_URL = reverse("oauth:user-list")
@@ -55,6 +57,8 @@ def create_superuser(
 
 class PublicTestAuthenticationViews(TestCase):
     def setUp(self):
+        # Cached responses of earlier tests outlive their rows
+        clear_caches()
         self.client = APIClient()
         self.user1 = create_user(is_active=True)
 
@@ -137,6 +141,7 @@ class PublicTestAuthenticationViews(TestCase):
 
 class PrivateTestAuthenticationViews(TestCase):
     def setUp(self):
+        clear_caches()
         self.client = APIClient()
         self.user1 = create_user()
         self.user2 = create_user(email="test2@gmail.com")
@@ -179,9 +184,23 @@ class PrivateTestAuthenticationViews(TestCase):
     def test_follow_unfollow_user(self):
         res = self.client.post(detail_author_follow_url(self.user2.id))
         self.assertEqual(res.status_code, 201)
+        profile = models.UserProfile.objects.get(user=self.user2)
+        self.assertEqual(profile.followers_count, 1)
 
         res = self.client.delete(detail_author_follow_url(self.user2.id))
         self.assertEqual(res.status_code, 204)
+        profile.refresh_from_db()
+        self.assertEqual(profile.followers_count, 0)
+
+    def test_repeated_unfollow_counts_once(self):
+        self.client.post(detail_author_follow_url(self.user2.id))
+        self.client.delete(detail_author_follow_url(self.user2.id))
+
+        res = self.client.delete(detail_author_follow_url(self.user2.id))
+        profile = models.UserProfile.objects.get(user=self.user2)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(profile.followers_count, 0)
 
     def test_mark_spam_email_once_week_user(self):
         res = self.client.post(reverse("oauth:spam_email_once_week"))
@@ -190,3 +209,86 @@ class PrivateTestAuthenticationViews(TestCase):
 
         res = self.client.delete(reverse("oauth:spam_email_once_week"))
         self.assertEqual(res.status_code, 200)
+
+
+class FollowListViewsTests(QueryCountTestMixin, TestCase):
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+        self.author = create_user(is_active=True)
+        self.followers = [
+            create_user(is_active=True, email=f"follower{i}@gmail.com")
+            for i in range(3)
+        ]
+        for follower in self.followers:
+            models.UserFollowing.objects.create(
+                user=follower, following_user=self.author
+            )
+
+    def test_followers_cursor_pages(self):
+        url = reverse("oauth:author_followers", args=[self.author.id])
+        res = self.client.get(url, {"page_size": 2})
+        next_res = self.client.get(res.data["next"])
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(
+            [card["id"] for card in res.data["results"] + next_res.data["results"]],
+            [follower.id for follower in reversed(self.followers)],
+        )
+        self.assertIsNone(next_res.data["next"])
+
+    def test_follow_lists_query_count(self):
+        self.client.force_authenticate(self.followers[0])
+        for user in self.followers:
+            models.SocialLink.objects.create(user=user, link="https://a.com")
+
+        self.assertQueryCountConstant(
+            reverse("oauth:author_followers", args=[self.author.id])
+        )
+        self.assertQueryCountConstant(reverse("oauth:author"))
+
+    def test_followers_is_followed_flag(self):
+        models.UserFollowing.objects.create(
+            user=self.followers[0], following_user=self.followers[1]
+        )
+        self.client.force_authenticate(self.followers[0])
+
+        res = self.client.get(reverse("oauth:author_followers", args=[self.author.id]))
+        flags = {card["id"]: card["is_followed"] for card in res.data["results"]}
+
+        self.assertEqual(
+            flags,
+            {
+                self.followers[0].id: False,
+                self.followers[1].id: True,
+                self.followers[2].id: False,
+            },
+        )
+
+    def test_following_list(self):
+        res = self.client.get(
+            reverse("oauth:author_following", args=[self.followers[0].id])
+        )
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["results"][0]["id"], self.author.id)
+        self.assertFalse(res.data["results"][0]["is_followed"])
+
+    def test_author_list_fragments_follow_changes(self):
+        self.client.force_authenticate(self.followers[0])
+        self.client.get(reverse("oauth:author"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(detail_author_follow_url(self.followers[1].id))
+        res = self.client.get(reverse("oauth:author"))
+
+        profiles = {
+            author["id"]: author["user_profile"] for author in res.data["results"]
+        }
+        self.assertEqual(profiles[self.followers[0].id]["following_count"], 1)
+        self.assertEqual(profiles[self.followers[1].id]["followers_count"], 1)
+
+    def test_followers_of_unknown_author(self):
+        res = self.client.get(reverse("oauth:author_followers", args=[0]))
+
+        self.assertEqual(res.status_code, 404)